@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import json
+import time
+import array
+import platform
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Callable, Iterable
+
+from .hashing import DEFAULT_ALGORITHM, available_algorithms
+from .review import accept, find_new_snaps
+from .serializers import as_buffer, canonical
+from .snapshot import Snapshot, _load_snapshot
+from .suite import TestSuite
+from .test import Test
+
+
+CONTENT_SIZES = (1024, 1024 * 1024, 16 * 1024 * 1024)
+SUITE_SIZES = (1_000, 10_000, 100_000)
+
+
+def _best_of(repeat: int, function: Callable[[], None], number: int = 1) -> float:
+    # The fastest of several runs is the least disturbed by whatever else the machine is doing
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def _label(size: int) -> str:
+    for unit, scale in [("MiB", 1024 * 1024), ("KiB", 1024)]:
+        if size >= scale:
+            return f"{size // scale}{unit}"
+    return f"{size}B"
+
+
+def _discard(*args, **kwargs) -> None:
+    _, _ = args, kwargs
+
+
+def _content(size: int) -> str:
+    line = "the quick brown fox jumps over the lazy dog 0123456789\n"
+    return (line * (size // len(line) + 1))[:size]
+
+
+def _bench_hashing(sizes: Iterable[int], repeat: int) -> dict[str, dict]:
+    # The default algorithm keeps the plain name, so results compare with those saved before
+    results = {}
+    for algorithm in available_algorithms():
+        name = "hash" if algorithm == DEFAULT_ALGORITHM else f"hash_{algorithm}"
+        for size in sizes:
+            content = _content(size)
+            seconds = _best_of(repeat, lambda: Snapshot.new("test", "snap", content, algorithm))
+            results[f"{name}/{_label(size)}"] = {"seconds": seconds, "bytes": size}
+    return results
+
+
+def _bench_arrays(sizes: Iterable[int], repeat: int) -> dict[str, dict]:
+    # Array snapshots hash the raw buffer, so should keep up with hashing a string of the same size
+    results = {}
+    for size in sizes:
+        values = array.array("d", range(size // 8))
+        seconds = _best_of(repeat, lambda: Snapshot.array("test", "snap", *as_buffer(values)))
+        results[f"hash_array/{_label(size)}"] = {"seconds": seconds, "bytes": size}
+    return results
+
+
+def _bench_canonical(repeat: int, number: int = 10) -> dict[str, dict]:
+    value = {f"key_{index}": [index, index / 3, None, f"value {index}"] for index in range(1_000)}
+    return {"canonical": {"seconds": _best_of(repeat, lambda: canonical(value), number)}}
+
+
+def _bench_header_parsing(repeat: int, number: int = 10_000) -> dict[str, dict]:
+    text = str(Snapshot.new("test", "snap", _content(64 * 1024)))
+    seconds = _best_of(repeat, lambda: _load_snapshot(StringIO(text), load_content=False), number)
+    return {"load_header": {"seconds": seconds}}
+
+
+def _bench_saving(directory: Path, sizes: Iterable[int], repeat: int) -> dict[str, dict]:
+    results = {}
+    for size in sizes:
+        snapshot = Snapshot.new("test", "snap", _content(size))
+        seconds = _best_of(repeat, lambda: snapshot.save_to(directory / "save.snap"))
+        results[f"save/{_label(size)}"] = {"seconds": seconds, "bytes": size}
+    return results
+
+
+def _bench_snapping(directory: Path, repeat: int, number: int = 1_000) -> dict[str, dict]:
+    test = Test("bench", _discard, directory)
+    (directory / "bench").mkdir(exist_ok=True)
+    Snapshot.new("bench", "match", "hello, world!").save_to(directory / "bench" / "match.snap")
+
+    def mismatch() -> None:
+        test.snap("goodbye, moon!", "mismatch")
+        test._new_snaps.clear()
+
+    return {
+        "snap/match": {"seconds": _best_of(repeat, lambda: test.snap("hello, world!", "match"), number)},
+        "snap/mismatch": {"seconds": _best_of(repeat, mismatch, number)},
+    }
+
+
+def _bench_suites(directory: Path, sizes: Iterable[int]) -> dict[str, dict]:
+    results = {}
+    for size in sizes:
+        snaps = directory / f"suite_{size}"
+
+        def snap_case(test: Test) -> None:
+            test.snap(test._name, "snap")
+
+        # Registration, a first run that creates every snap, and a run once they're accepted
+        start = time.perf_counter()
+        suite = TestSuite(snaps)
+        for index in range(size):
+            snap_case.__name__ = f"case_{index}"
+            suite.test_case(snap_case)
+        results[f"suite/{size}/register"] = {"seconds": time.perf_counter() - start, "tests": size}
+
+        start = time.perf_counter()
+        suite.run_tests(display_func=_discard)
+        results[f"suite/{size}/first_run"] = {"seconds": time.perf_counter() - start, "tests": size}
+
+        accept(find_new_snaps(snaps))
+
+        start = time.perf_counter()
+        suite.run_tests(display_func=_discard)
+        results[f"suite/{size}/rerun"] = {"seconds": time.perf_counter() - start, "tests": size}
+
+    return results
+
+
+def run_benchmarks(
+    content_sizes: Iterable[int] = CONTENT_SIZES,
+    suite_sizes: Iterable[int] = SUITE_SIZES,
+    repeat: int = 5
+) -> dict:
+    """
+    Measures the hot paths of snapshot testing: hashing strings and arrays, encoding values,
+    header parsing, saving, snapping and whole suite runs. Everything is written to a temporary
+    directory that is removed afterwards.
+
+    Args:
+        content_sizes: the sizes, in bytes, of content to hash and save.
+        suite_sizes: the numbers of tests in the synthetic suites to run.
+        repeat: the number of times each micro benchmark is repeated, keeping the fastest.
+    Returns:
+        The results, ready to be dumped as JSON, with each benchmark's time under `seconds`.
+    """
+    benchmarks: dict[str, dict] = {}
+    with TemporaryDirectory() as temp:
+        directory = Path(temp)
+        benchmarks.update(_bench_hashing(content_sizes, repeat))
+        benchmarks.update(_bench_arrays(content_sizes, repeat))
+        benchmarks.update(_bench_canonical(repeat))
+        benchmarks.update(_bench_header_parsing(repeat))
+        benchmarks.update(_bench_saving(directory, content_sizes, repeat))
+        benchmarks.update(_bench_snapping(directory, repeat))
+        benchmarks.update(_bench_suites(directory, suite_sizes))
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "benchmarks": benchmarks,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.1) -> list[str]:
+    """
+    Finds the benchmarks that got slower between two runs.
+
+    Args:
+        baseline: the results of the earlier run.
+        current: the results of the later run.
+        threshold: the fraction a benchmark may slow down by before it counts as a regression.
+    Returns:
+        A description of each regression, empty if there were none.
+    """
+    regressions = []
+    for name, result in current["benchmarks"].items():
+        before = baseline["benchmarks"].get(name)
+        if before is None or before["seconds"] <= 0:
+            continue
+
+        ratio = result["seconds"] / before["seconds"]
+        if ratio > 1 + threshold:
+            regressions.append(
+                f"{name}: {before['seconds']:.6f}s -> {result['seconds']:.6f}s ({ratio:.2f}x)"
+            )
+    return regressions
+
+
+def format_results(results: dict) -> Iterable[str]:
+    """
+    Renders benchmark results one line at a time, with throughput where it makes sense.
+    """
+    for name, result in results["benchmarks"].items():
+        seconds = result["seconds"]
+        if "bytes" in result:
+            rate = f"{result['bytes'] / seconds / (1024 * 1024):.1f} MiB/s"
+        elif "tests" in result:
+            rate = f"{seconds / result['tests'] * 1e6:.1f} us/test"
+        else:
+            rate = f"{seconds * 1e6:.2f} us/op"
+        yield f"{name:<28} {seconds:>12.6f}s  {rate}"
+
+
+def load_results(path: Path) -> dict:
+    """
+    Reads results previously dumped with `save_results`.
+    """
+    with path.open("r") as file:
+        return json.load(file)
+
+
+def save_results(results: dict, path: Path) -> None:
+    """
+    Dumps results as JSON, for comparison with a later run.
+    """
+    with path.open("w") as file:
+        json.dump(results, file, indent=2)
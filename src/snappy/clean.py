@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Iterable
+
+from .suite import TestSuite
+from .test import Parametrized
+
+
+def _registered(suites: list[TestSuite]) -> tuple[set[str], tuple[str, ...]]:
+    # The names of every registered test, along with the name prefixes of parametrized tests
+    # whose cases couldn't be gone through again, e.g. an iterator already used by a run. Their
+    # cases are all treated as registered, rather than all being removed.
+    names, prefixes = set(), []
+    for suite in suites:
+        for test in suite._tests:
+            if not isinstance(test, Parametrized):
+                names.add(test._name)
+                continue
+
+            cases = {case._name for case in test.tests()}
+            if not cases:
+                prefixes.append(f"{test._name}[")
+            names.update(cases)
+
+    return names, tuple(prefixes)
+
+
+def prune(suites: Iterable[TestSuite], dry_run: bool = False) -> list[Path]:
+    """
+    Removes the snapshots no test takes any more, along with test directories left empty. A
+    snapshot is unused if its test is no longer registered with any suite sharing its snapshot
+    directory, or if its test didn't take it the last time it was run. Snapshots of tests that
+    haven't been run, or whose last run timed out, are kept, as which they take isn't known.
+
+    Object store content is left alone, as it may still be shared with other snapshots.
+
+    Args:
+        suites: the suites to prune, which should be every suite using their snapshot directories.
+        dry_run: only find the unused snapshots, leaving them in place.
+    Returns:
+        The path of each snapshot or directory removed.
+    """
+    # Suites may share a snapshot directory, in which case they're pruned together
+    groups: dict[Path, list[TestSuite]] = {}
+    for suite in suites:
+        groups.setdefault(suite._snaps_dir.resolve(), []).append(suite)
+
+    removed = []
+    for group in groups.values():
+        names, prefixes = _registered(group)
+        history, storage = group[0]._history, group[0]._storage
+        history.load()
+
+        def keep(test_name: str, snap_name: str) -> bool:
+            if test_name.startswith(prefixes):
+                return True
+            if test_name not in names:
+                return False
+
+            snaps = history.snaps(test_name)
+            return snaps is None or snap_name in snaps
+
+        storage.load()
+        removed.extend(group[0]._snaps_dir / item for item in storage.prune(keep, dry_run))
+        if dry_run:
+            continue
+
+        storage.flush()
+        history.retain(names | {name for name in history._entries if name.startswith(prefixes)})
+        history.save()
+
+    return removed
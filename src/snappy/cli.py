@@ -1,7 +1,11 @@
 from argparse import ArgumentParser
 from pathlib import Path
 
-from .core import run_tests, review_snaps
+from .core import (
+    run_tests, merge_results, review_snaps, clean_snaps, rehash_snaps, verify_snaps, import_snaps,
+    export_snaps, run_benchmarks
+)
+from .benchmark import CONTENT_SIZES, SUITE_SIZES
 
 
 def main() -> None:
@@ -12,13 +16,108 @@ def main() -> None:
     # Test mode, to discover and execute tests
     test = mode.add_parser("test", help="Select a directory to discover tests.")
     test.add_argument("directory", type=Path, help="Path to test directory.")
+    test.add_argument("-j", "--workers", type=int, default=1, help="Number of tests to run at once.")
+    test.add_argument("--threads", action="store_true", help="Use a thread pool instead of processes.")
+    test.add_argument("--changed", action="store_true", help="Skip tests whose dependencies are unchanged.")
+    test.add_argument("--concurrency", type=int, default=64, help="Number of async tests to run at once.")
+    test.add_argument("--durations", type=int, default=0, help="Report the N slowest tests.")
+    test.add_argument("--profile", type=Path, default=None, help="Dump per-test cProfile stats here.")
+    test.add_argument("--shard", default=None, help="Only run shard `i/N` of the tests, e.g. `2/8`.")
+    test.add_argument("--shard-weights", type=Path, default=None,
+                      help="Balance shards by the durations in an earlier results file.")
+    test.add_argument("--results", type=Path, default=None, help="Save the results as JSON here.")
+    test.add_argument("--watch", action="store_true", help="Rerun affected suites whenever files change.")
+    test.add_argument("--fail-fast", action="store_true", help="Stop starting tests after the first failure.")
+    test.add_argument("--prune", action="store_true", help="Remove snaps no test took once the run is over.")
+    test.add_argument("--report", choices=["terminal", "dots", "none"], default="terminal",
+                      help="How to report progress on the terminal.")
+    test.add_argument("--junit", type=Path, default=None, help="Write a JUnit XML report here.")
+    test.add_argument("--jsonl", type=Path, default=None, help="Write every test event as JSON Lines here.")
+
+    # Merge mode, to combine the results of sharded test runs
+    merge = mode.add_parser("merge", help="Combine the results and new snaps of sharded runs.")
+    merge.add_argument("results", type=Path, nargs="+", help="Paths to each shard's results.")
+    merge.add_argument("-o", "--output", type=Path, help="Save the merged results as JSON here.")
+    merge.add_argument("--durations", type=int, default=0, help="Report the N slowest tests.")
 
     # Review mode, to discover and review snapshots
     review = mode.add_parser("review", help="Select a directory to review.")
     review.add_argument("directory", type=Path, help="Path to review.")
+    verdict = review.add_mutually_exclusive_group()
+    verdict.add_argument("--accept", dest="action", action="store_const", const="accept",
+                         help="Accept the selected snaps.")
+    verdict.add_argument("--reject", dest="action", action="store_const", const="reject",
+                         help="Reject the selected snaps.")
+    review.add_argument("-t", "--test", dest="tests", action="append", default=[],
+                        help="Only select snaps of the given test, may be repeated.")
+    review.add_argument("-m", "--match", dest="patterns", action="append", default=[],
+                        help="Only select snaps matching a `test/snap` glob, may be repeated.")
+    review.add_argument("--no-diff", dest="show_diff", action="store_false",
+                        help="Don't show the diff of each selected snap.")
+
+    # Clean mode, to remove snaps that tests no longer take
+    clean = mode.add_parser("clean", help="Remove snaps of removed tests and snaps no test took.")
+    clean.add_argument("directory", type=Path, help="Path to test directory.")
+    clean.add_argument("--dry-run", action="store_true", help="List the unused snaps without removing them.")
+
+    # Rehash mode, to move snapshots over to their suite's hash algorithm
+    rehash = mode.add_parser("rehash", help="Rewrite snapshots hashed with other than their suite's algorithm.")
+    rehash.add_argument("directory", type=Path, help="Path to test directory.")
+
+    # Verify mode, to check stored snapshots still match their hashes
+    verify = mode.add_parser("verify", help="Check every snapshot file under a directory matches its hash.")
+    verify.add_argument("directory", type=Path, help="Path to search for snapshot files.")
+    verify.add_argument("-j", "--workers", type=int, default=None, help="Number of processes, one per core by default.")
+
+    # Import mode, to move a directory of snapshots into a database
+    import_ = mode.add_parser("import", help="Copy a snapshot directory into a database.")
+    import_.add_argument("directory", type=Path, help="Path to snapshot directory.")
+    import_.add_argument("database", type=Path, help="Path to database.")
+
+    # Export mode, to move a database of snapshots out into a directory
+    export = mode.add_parser("export", help="Copy a snapshot database into a directory.")
+    export.add_argument("database", type=Path, help="Path to database.")
+    export.add_argument("directory", type=Path, help="Path to snapshot directory.")
+
+    # Bench mode, to measure the performance of snappy itself
+    bench = mode.add_parser("bench", help="Benchmark snapshot hot paths and suite runs.")
+    bench.add_argument("-o", "--output", type=Path, help="Save the results as JSON here.")
+    bench.add_argument("--compare", type=Path, help="Compare against results saved earlier.")
+    bench.add_argument("--threshold", type=float, default=0.1, help="Slowdown allowed before failing.")
+    bench.add_argument("--sizes", type=int, nargs="+", default=CONTENT_SIZES, help="Content sizes in bytes.")
+    bench.add_argument("--suite-sizes", type=int, nargs="+", default=SUITE_SIZES, help="Synthetic suite sizes.")
+    bench.add_argument("--repeat", type=int, default=5, help="Repeats of each micro benchmark.")
 
     # Delegate actual functionality
     match (args := parser.parse_args()).mode:
-        case "test":   run_tests(args.directory)
-        case "review": review_snaps(args.directory)
+        case "test":
+            if args.watch and args.prune:
+                test.error("--prune can't be used with --watch")
+            executor = "thread" if args.threads else "process"
+            passed = run_tests(
+                args.directory, args.workers, executor, args.changed,
+                args.concurrency, args.durations, args.profile,
+                args.shard, args.shard_weights, args.results, args.watch, args.fail_fast,
+                args.prune, args.report, args.junit, args.jsonl
+            )
+            if not passed:
+                raise SystemExit(1)
+        case "merge":
+            if not merge_results(args.results, args.output, args.durations):
+                raise SystemExit(1)
+        case "review": review_snaps(args.directory, args.action, args.tests, args.patterns, args.show_diff)
+        case "clean":  clean_snaps(args.directory, args.dry_run)
+        case "rehash": rehash_snaps(args.directory)
+        case "verify":
+            if not verify_snaps(args.directory, args.workers):
+                raise SystemExit(1)
+        case "import": import_snaps(args.directory, args.database)
+        case "export": export_snaps(args.database, args.directory)
+        case "bench":
+            passed = run_benchmarks(
+                args.output, args.compare, args.threshold,
+                args.sizes, args.suite_sizes, args.repeat
+            )
+            if not passed:
+                raise SystemExit(1)
 
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import mmap
+from array import array
+from typing import Iterator, Optional, Union
+
+
+Buffer = Union[mmap.mmap, bytes]
+
+
+class ContentView:
+    """
+    A read-only view over the content section of a snapshot, which is decoded only as it is
+    asked for. Views are usually backed by a memory map of the snapshot file, so looking at a
+    few lines of a huge snapshot never loads the rest of it into memory.
+    """
+
+
+    def __init__(self, buffer: Buffer, start: int = 0, end: Optional[int] = None) -> None:
+        """
+        Creates a view over a region of a buffer.
+
+        Args:
+            buffer: the memory map or bytes the content lives in.
+            start: the byte offset the content starts at.
+            end: the byte offset the content ends at, defaulting to the end of the buffer.
+        """
+        self._buffer = buffer
+        self._start = start
+        self._end = len(buffer) if end is None else end
+
+        # Offsets of the start of each line, built the first time lines are asked for
+        self._lines: Optional[array] = None
+
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+
+    def tobytes(self, start: int = 0, end: Optional[int] = None) -> bytes:
+        """
+        Copies out a range of the content as bytes, by byte offsets into the content.
+        """
+        end = len(self) if end is None else min(end, len(self))
+        return self._buffer[self._start + start : self._start + end]
+
+
+    def __str__(self) -> str:
+        return self.tobytes().decode("utf-8")
+
+
+    def _line_offsets(self) -> array:
+        if self._lines is None:
+            offsets = array("Q", [self._start])
+            position = self._buffer.find(b"\n", self._start, self._end)
+            while position != -1:
+                offsets.append(position + 1)
+                position = self._buffer.find(b"\n", position + 1, self._end)
+            self._lines = offsets
+        return self._lines
+
+
+    def line_count(self) -> int:
+        """
+        The number of lines in the content, where a trailing newline starts a final empty line.
+        """
+        return len(self._line_offsets())
+
+
+    def lines(self, start: int = 0, stop: Optional[int] = None) -> list[str]:
+        """
+        Decodes a range of lines, without their line endings.
+
+        Args:
+            start: the index of the first line.
+            stop: the index after the last line, defaulting to the last line.
+        """
+        offsets = self._line_offsets()
+        start, stop, _ = slice(start, stop).indices(len(offsets))
+
+        lines = []
+        for index in range(start, stop):
+            end = offsets[index + 1] - 1 if index + 1 < len(offsets) else self._end
+            lines.append(self._buffer[offsets[index]:end].decode("utf-8"))
+        return lines
+
+
+    def iter_lines(self) -> Iterator[str]:
+        """
+        Decodes each line in turn, without their line endings. Unlike `lines`, this never builds
+        an index of the whole content.
+        """
+        position = self._start
+        while (newline := self._buffer.find(b"\n", position, self._end)) != -1:
+            yield self._buffer[position:newline].decode("utf-8")
+            position = newline + 1
+        yield self._buffer[position:self._end].decode("utf-8")
+
+
+    def close(self) -> None:
+        """
+        Releases the underlying memory map, if there is one. The view can't be used afterwards.
+        """
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
@@ -1,10 +1,298 @@
 from pathlib import Path
+from typing import Iterable, Optional
 
+from . import review, benchmark, clean, shards, verify, watch as watching
+from .storage import DirectoryStorage, SqliteStorage, Storage
+from .discovery import discover
+from .fixtures import teardown_session
+from .hashing import split
+from .results import SuiteResults
+from .shards import Shard
+from .reporters import (
+    DotsReporter, JUnitReporter, JsonLinesReporter, MultiReporter, Reporter, TerminalReporter,
+    plural, report_result
+)
+from .suite import TestSuite
 
-def run_tests(path: Path) -> None:
-    print(f"Running tests found in {str(path)}...")
 
+# Snapshots are written out in batches of this many when converting between storage
+CONVERT_BATCH = 1000
 
-def review_snaps(path: Path) -> None:
-    print(f"Reviewing snaps found in {str(path)}...")
 
+def run_tests(
+    path: Path,
+    workers: int = 1,
+    executor: str = "process",
+    changed: bool = False,
+    concurrency: int = 64,
+    durations: int = 0,
+    profile: Optional[Path] = None,
+    shard: Optional[str] = None,
+    weights: Optional[Path] = None,
+    output: Optional[Path] = None,
+    watch: bool = False,
+    fail_fast: bool = False,
+    prune: bool = False,
+    report: str = "terminal",
+    junit: Optional[Path] = None,
+    jsonl: Optional[Path] = None
+) -> bool:
+    def run(suites: list[TestSuite]) -> bool:
+        # Reports are started afresh for every run, so watching keeps them for the latest one
+        reporter = _make_reporter(report, durations, junit, jsonl)
+        try:
+            return _run_suites(
+                suites, workers, executor, changed, concurrency, profile, shard, weights,
+                output, fail_fast, reporter
+            )
+        finally:
+            reporter.close()
+
+    # Watching only reruns the suites a change affects, which doesn't show what's unused
+    if watch and prune:
+        raise ValueError("Can't prune snaps while watching.")
+
+    # Watching only stops once interrupted
+    if watch:
+        try:
+            watching.watch(path, run, workers)
+        except KeyboardInterrupt:
+            return True
+
+    suites = discover(path, workers)
+    passed = run(suites)
+    if prune:
+        _report_pruned(clean.prune(suites), dry_run=False)
+    return passed
+
+
+def _make_reporter(
+    report: str, durations: int, junit: Optional[Path], jsonl: Optional[Path]
+) -> Reporter:
+    reporters: list[Reporter] = []
+    match report:
+        case "terminal": reporters.append(TerminalReporter(durations=durations))
+        case "dots":     reporters.append(DotsReporter())
+        case "none":     pass
+        case _:
+            raise ValueError(f"Unknown report `{report}`: expected 'terminal', 'dots' or 'none'.")
+
+    if junit is not None:
+        reporters.append(JUnitReporter(junit))
+    if jsonl is not None:
+        reporters.append(JsonLinesReporter(jsonl))
+    return MultiReporter(reporters)
+
+
+def _run_suites(
+    suites: list[TestSuite],
+    workers: int,
+    executor: str,
+    changed: bool,
+    concurrency: int,
+    profile: Optional[Path],
+    shard: Optional[str],
+    weights: Optional[Path],
+    output: Optional[Path],
+    fail_fast: bool,
+    reporter: Reporter
+) -> bool:
+    # Every suite is dealt from the one shard, so that weighted shards balance across suites
+    selected = None
+    if shard is not None:
+        selected = Shard.parse(shard, shards.load_durations(weights) if weights else None)
+
+    # Session scoped fixtures are shared by every suite, so only torn down once they're all run
+    runs = []
+    try:
+        for position, suite in enumerate(suites):
+            runs.append(SuiteResults(
+                snapshot_directory = suite._snaps_dir,
+                backend = suite._backend,
+                compression = suite._compression,
+                results = suite._run(
+                    reporter, workers, executor, changed, concurrency, profile, selected, fail_fast
+                )
+            ))
+
+            failed = any(not result.passed for result in runs[-1].results)
+            if fail_fast and failed and position + 1 < len(suites):
+                not_run = len(suites) - position - 1
+                reporter.message(f"Stopped after a failure, {plural(not_run, 'suite')} not run.")
+                break
+    finally:
+        teardown_session()
+
+    if output is not None:
+        shards.save_results(output, runs, selected)
+
+    results = [result for run in runs for result in run.results]
+    reporter.summary(results)
+    return all(result.passed for result in results)
+
+
+def merge_results(paths: Iterable[Path], output: Optional[Path] = None, durations: int = 0) -> bool:
+    runs = shards.merge_results(paths)
+    if output is not None:
+        shards.save_results(output, runs)
+
+    reporter = TerminalReporter(durations=durations)
+    for run in runs:
+        reporter.start_suite(str(run.snapshot_directory))
+        for result in run.results:
+            reporter.start_test(result.name)
+            report_result(reporter, result)
+        reporter.finish_suite()
+
+    results = [result for run in runs for result in run.results]
+    reporter.summary(results)
+    return all(result.passed for result in results)
+
+
+def _report_pruned(removed: list[Path], dry_run: bool) -> None:
+    for path in removed:
+        print(f"  {str(path)}")
+
+    snaps = sum(path.name.endswith((".snap", ".snap.new")) for path in removed)
+    print(
+        f"{'Found' if dry_run else 'Removed'} {plural(snaps, 'unused snap')} "
+        f"and {plural(len(removed) - snaps, 'empty test dir')}."
+    )
+
+
+def clean_snaps(path: Path, dry_run: bool = False) -> None:
+    _report_pruned(clean.prune(discover(path), dry_run), dry_run)
+
+
+def review_snaps(
+    path: Path,
+    action: Optional[str] = None,
+    tests: Iterable[str] = (),
+    patterns: Iterable[str] = (),
+    show_diff: bool = True
+) -> None:
+    new_snaps = review.find_new_snaps(path, tests, patterns)
+
+    # Suites using the 'sqlite' backend keep their new snaps in a database, reviewed through it
+    stored = [
+        (storage, review.find_stored_snaps(storage, tests, patterns))
+        for storage in map(SqliteStorage, review.find_databases(path))
+    ]
+
+    if show_diff:
+        for new_snap in new_snaps:
+            print(f"{new_snap.parent.name}/{new_snap.name.removesuffix('.snap.new')}:")
+            for line in review.diff_snap(new_snap):
+                print(f"  {line}")
+
+        for storage, names in stored:
+            for test_name, snap_name in names:
+                print(f"{test_name}/{snap_name}:")
+                for line in review.diff_stored(storage, test_name, snap_name):
+                    print(f"  {line}")
+
+    match action:
+        case "accept":
+            accepted = review.accept(new_snaps)
+            accepted += sum(storage.accept(names) for storage, names in stored)
+            print(f"Accepted {accepted} snaps.")
+        case "reject":
+            rejected = review.reject(new_snaps)
+            rejected += sum(storage.reject(names) for storage, names in stored)
+            print(f"Rejected {rejected} snaps.")
+        case _:
+            print(f"{len(new_snaps) + sum(len(names) for _, names in stored)} snaps to review.")
+
+
+def verify_snaps(directory: Path, workers: Optional[int] = None) -> bool:
+    checked, problems = 0, 0
+    for path, problem in verify.verify(directory, workers):
+        checked = checked + 1
+        if problem is not None:
+            problems = problems + 1
+            print(f"  x {str(path)}: {problem}")
+
+    print(f"Verified {plural(checked, 'snap')}, {plural(problems, 'problem')} found.")
+    return problems == 0
+
+
+def _copy_snaps(source: Storage, destination: Storage) -> int:
+    copied = 0
+    accepted, new_snaps = set(), set()
+    for snapshot, new in source.snapshots():
+        (new_snaps if new else accepted).add((snapshot._test, snapshot._snap))
+        destination.save(snapshot, new)
+        copied = copied + 1
+        if copied % CONVERT_BATCH == 0:
+            destination.flush()
+
+    destination.flush()
+
+    # A snap reviewed since it was last copied has no new snapshot any more, so neither should
+    # the copy, e.g. when exporting, reviewing and importing back again
+    destination.reject(sorted(accepted - new_snaps))
+    return copied
+
+
+def import_snaps(directory: Path, database: Path) -> None:
+    copied = _copy_snaps(DirectoryStorage(directory), SqliteStorage(database))
+    print(f"Imported {copied} snaps from {str(directory)} into {str(database)}.")
+
+
+def export_snaps(database: Path, directory: Path) -> None:
+    copied = _copy_snaps(SqliteStorage(database), DirectoryStorage(directory))
+    print(f"Exported {copied} snaps from {str(database)} into {str(directory)}.")
+
+
+def _rehash(storage: Storage, algorithm: str) -> int:
+    rehashed = 0
+    for snapshot, new in storage.snapshots():
+        if split(snapshot._hash)[0] == algorithm:
+            snapshot.close()
+            continue
+
+        snapshot._hash = snapshot._rehash(algorithm)
+        storage.save(snapshot, new)
+        rehashed = rehashed + 1
+        if rehashed % CONVERT_BATCH == 0:
+            storage.flush()
+
+    storage.flush()
+    return rehashed
+
+
+def rehash_snaps(path: Path) -> None:
+    # Suites sharing a snapshot directory are only rehashed once, with the first one's algorithm
+    seen = set()
+    for suite in discover(path):
+        if (directory := suite._snaps_dir.resolve()) in seen:
+            continue
+        seen.add(directory)
+
+        rehashed = _rehash(suite._storage, suite._algorithm)
+        print(f"Rehashed {plural(rehashed, 'snap')} in {str(suite._snaps_dir)} with {suite._algorithm}.")
+
+
+def run_benchmarks(
+    output: Optional[Path] = None,
+    baseline: Optional[Path] = None,
+    threshold: float = 0.1,
+    content_sizes: Iterable[int] = benchmark.CONTENT_SIZES,
+    suite_sizes: Iterable[int] = benchmark.SUITE_SIZES,
+    repeat: int = 5
+) -> bool:
+    results = benchmark.run_benchmarks(content_sizes, suite_sizes, repeat)
+    for line in benchmark.format_results(results):
+        print(line)
+
+    if output is not None:
+        benchmark.save_results(results, output)
+
+    if baseline is None:
+        return True
+
+    regressions = benchmark.compare(benchmark.load_results(baseline), results, threshold)
+    for regression in regressions:
+        print(f"  x {regression}")
+    print(f"{len(regressions)} regressions beyond {threshold:.0%}.")
+    return regressions == []
@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import os
+import sys
+import json
+import sysconfig
+from hashlib import sha256
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+
+from .storage import Storage
+
+
+DEPS_NAME = ".snappy-deps.json"
+
+# Code run from the standard library or installed packages isn't tracked as a dependency
+_IGNORED_PREFIXES = tuple({
+    path for name in ("stdlib", "platstdlib", "purelib", "platlib")
+    if (path := sysconfig.get_paths().get(name))
+})
+
+
+def _is_source(filename: str) -> bool:
+    return not filename.startswith("<") and not filename.startswith(_IGNORED_PREFIXES)
+
+
+def _hash_file(filename: str) -> Optional[str]:
+    try:
+        with open(filename, "rb") as file:
+            return sha256(file.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def trace_sources(function: Callable[[], None]) -> set[str]:
+    """
+    Calls a function, recording the source file of every Python function called along the way
+    on the current thread. Only calls are traced, not lines, to keep the overhead down.
+
+    Args:
+        function: the function to call.
+    Returns:
+        The source files of the functions called, excluding the standard library and installed
+        packages.
+    """
+    files: set[str] = set()
+
+    def tracer(frame, event, arg):
+        files.add(frame.f_code.co_filename)
+
+    previous = sys.gettrace()
+    sys.settrace(tracer)
+    try:
+        function()
+    finally:
+        sys.settrace(previous)
+
+    return {file for file in files if _is_source(file)}
+
+
+def fingerprint(sources: Iterable[str]) -> dict[str, Optional[str]]:
+    """
+    Hashes the content of each source file, for comparison on later runs.
+    """
+    return {source: _hash_file(source) for source in sorted(sources)}
+
+
+class DependencyRecord:
+    """
+    A persistent record, kept in a suite's snapshot directory, of what each passing test depended
+    on: the source files it ran, and the snapshots it produced. A test is fresh, and can safely be
+    skipped, while none of its sources have changed and every snapshot it produced is still the
+    accepted one.
+    """
+
+
+    def __init__(self, snap_directory: Path) -> None:
+        """
+        Creates an empty record for a snapshot directory. Use `load` to read in the persisted
+        entries, and `save` to write them back out.
+
+        Args:
+            snap_directory: the suite's snapshot directory, where the record file lives.
+        """
+        self._directory = snap_directory
+        self._path = snap_directory / DEPS_NAME
+        self._entries: dict[str, dict] = {}
+        self._dirty = False
+
+        # Source hashes are worked out once per run, however many tests share the source
+        self._current: dict[str, Optional[str]] = {}
+
+
+    def load(self) -> None:
+        """
+        Reads the persisted entries from disk, and forgets the source hashes of any previous run.
+        A missing or unreadable record is treated as empty.
+        """
+        self._current = {}
+        try:
+            with self._path.open("r") as file:
+                entries = json.load(file)
+        except (OSError, ValueError):
+            return
+
+        if isinstance(entries, dict):
+            self._entries = entries
+
+
+    def save(self) -> None:
+        """
+        Writes the record to disk if it has changed, replacing the old record in one step.
+        """
+        if not self._dirty:
+            return
+
+        self._directory.mkdir(parents=True, exist_ok=True)
+        temp = self._path.with_name(f"{DEPS_NAME}.{os.getpid()}.tmp")
+        with temp.open("w") as file:
+            json.dump(self._entries, file, separators=(",", ":"))
+        os.replace(temp, self._path)
+        self._dirty = False
+
+
+    def update(self, test_name: str, sources: dict[str, Optional[str]], snaps: dict[str, str]) -> None:
+        """
+        Records what a passing test depended on.
+
+        Args:
+            test_name: the name of the test.
+            sources: the hash of each source file the test ran, see `fingerprint`.
+            snaps: the hash of each snapshot the test produced, by snap name.
+        """
+        entry = {"sources": sources, "snaps": snaps}
+        if self._entries.get(test_name) != entry:
+            self._entries[test_name] = entry
+            self._dirty = True
+
+
+    def forget(self, test_name: str) -> None:
+        """
+        Removes a test's record, so that it can't be skipped.
+        """
+        if self._entries.pop(test_name, None) is not None:
+            self._dirty = True
+
+
+    def is_fresh(self, test_name: str, storage: Storage) -> bool:
+        """
+        Whether a test's recorded dependencies are all unchanged.
+
+        Args:
+            test_name: the name of the test.
+            storage: where the test's accepted snapshots are stored.
+        """
+        entry = self._entries.get(test_name)
+        if entry is None:
+            return False
+
+        for source, hash in entry["sources"].items():
+            if source not in self._current:
+                self._current[source] = _hash_file(source)
+            if self._current[source] != hash:
+                return False
+
+        return all(
+            storage.hash_of(test_name, snap_name) == hash
+            for snap_name, hash in entry["snaps"].items()
+        )
@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import os
+import sys
+import json
+import importlib.util
+from pathlib import Path
+from types import ModuleType
+from concurrent.futures import ProcessPoolExecutor
+
+from .suite import TestSuite
+
+
+# The cache is kept with the test directory's bytecode, which source trees already ignore
+CACHE_DIR = "__pycache__"
+CACHE_NAME = "snappy-discovery.json"
+TEST_PATTERNS = ("test*.py", "*_test.py")
+
+
+def _module_name(path: Path, directory: Path) -> str:
+    # Named after the path from the test directory's parent, e.g. `tests.api.test_routes`, so
+    # that modules in different directories with the same file name don't collide
+    return '.'.join(path.relative_to(directory.parent).with_suffix("").parts)
+
+
+def _import(path: Path, directory: Path) -> ModuleType:
+    name = _module_name(path, directory)
+    if (module := sys.modules.get(name)) is not None and module.__file__ == str(path):
+        return module
+
+    # Test modules are free to import their neighbours, as they would under unittest. The test
+    # directory's parent makes the module importable by its name too, which worker processes
+    # need to unpickle its test functions. They inherit the path, whether forked or spawned.
+    for entry in (directory.parent, directory):
+        if str(entry) not in sys.path:
+            sys.path.insert(0, str(entry))
+
+    spec = importlib.util.spec_from_file_location(name, path)
+    if spec is None or spec.loader is None:
+        raise ImportError(f"Can't import test module `{path}`.")
+
+    # The module is registered before it runs so that its test functions can be pickled by name
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        del sys.modules[name]
+        raise
+
+    return module
+
+
+def _suites_in(module: ModuleType) -> list[TestSuite]:
+    return [value for value in vars(module).values() if isinstance(value, TestSuite)]
+
+
+def _defines_suites(path: Path, directory: Path) -> bool:
+    # Module level so it can be run in worker processes
+    return _suites_in(_import(path, directory)) != []
+
+
+def find_test_files(directory: Path) -> list[Path]:
+    """
+    Finds every file under a directory that looks like a test module, in a stable order.
+
+    Args:
+        directory: the directory to search.
+    """
+    files = {path for pattern in TEST_PATTERNS for path in directory.rglob(pattern)}
+    return sorted(path for path in files if path.is_file())
+
+
+class DiscoveryCache:
+    """
+    A persistent record of which test modules in a directory define suites, keyed by the path,
+    modification time and size of each module. Modules that haven't changed since they were last
+    found not to define any suites can be skipped without being imported.
+    """
+
+
+    def __init__(self, directory: Path) -> None:
+        """
+        Creates an empty cache for a test directory. Use `load` to read in the persisted
+        entries, and `save` to write them back out.
+
+        Args:
+            directory: the test directory, whose `__pycache__` the cache file lives in.
+        """
+        self._path = directory / CACHE_DIR / CACHE_NAME
+        self._entries: dict[str, list] = {}
+        self._dirty = False
+
+
+    def load(self) -> None:
+        """
+        Reads the persisted entries from disk. A missing or unreadable cache is treated as empty.
+        """
+        try:
+            with self._path.open("r") as file:
+                entries = json.load(file)
+        except (OSError, ValueError):
+            return
+
+        if isinstance(entries, dict):
+            self._entries = entries
+
+
+    def save(self) -> None:
+        """
+        Writes the cache to disk if it has changed, replacing the old cache in one step.
+        """
+        if not self._dirty:
+            return
+
+        self._path.parent.mkdir(exist_ok=True)
+        temp = self._path.with_name(f"{CACHE_NAME}.{os.getpid()}.tmp")
+        with temp.open("w") as file:
+            json.dump(self._entries, file, separators=(",", ":"))
+        os.replace(temp, self._path)
+        self._dirty = False
+
+
+    def lookup(self, path: Path) -> bool | None:
+        """
+        Whether a module defines suites, or None if the module is unknown or has changed.
+        """
+        entry = self._entries.get(str(path))
+        stat = path.stat()
+        if entry is not None and entry[:2] == [stat.st_mtime_ns, stat.st_size]:
+            return entry[2]
+        return None
+
+
+    def record(self, path: Path, defines_suites: bool) -> None:
+        """
+        Records whether a module defines suites, against its current modification time and size.
+        """
+        stat = path.stat()
+        entry = [stat.st_mtime_ns, stat.st_size, defines_suites]
+        if self._entries.get(str(path)) != entry:
+            self._entries[str(path)] = entry
+            self._dirty = True
+
+
+    def retain(self, paths: list[Path]) -> None:
+        """
+        Forgets every module not in the given list, i.e. those that have been deleted.
+        """
+        keep = {str(path) for path in paths}
+        for key in [key for key in self._entries if key not in keep]:
+            del self._entries[key]
+            self._dirty = True
+
+
+def discover(directory: Path, workers: int = 1) -> list[TestSuite]:
+    """
+    Finds every test suite defined in the test modules under a directory. Modules are only
+    imported if they are new, have changed, or are known to define suites.
+
+    Args:
+        directory: the directory to search.
+        workers: the number of processes to scan new or changed modules with. By default they
+            are scanned by importing them directly.
+    Returns:
+        Each suite found, once, in the order of the modules defining them.
+    """
+    directory = directory.resolve()
+    cache = DiscoveryCache(directory)
+    cache.load()
+
+    files = find_test_files(directory)
+    cache.retain(files)
+
+    # Scanning in separate processes only tells us which modules define suites, which still
+    # need importing here to be run. It pays off when most changed modules don't define any.
+    unknown = [path for path in files if cache.lookup(path) is None]
+    if workers > 1 and len(unknown) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            scanned = pool.map(_defines_suites, unknown, [directory] * len(unknown))
+            for path, defines_suites in zip(unknown, scanned):
+                cache.record(path, defines_suites)
+
+    suites: list[TestSuite] = []
+    for path in files:
+        if cache.lookup(path) is False:
+            continue
+
+        found = _suites_in(_import(path, directory))
+        cache.record(path, found != [])
+        suites.extend(suite for suite in found if all(suite is not other for other in suites))
+
+    cache.save()
+    return suites
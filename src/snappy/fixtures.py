@@ -0,0 +1,285 @@
+from __future__ import annotations
+
+import os
+import inspect
+import threading
+import multiprocessing
+from multiprocessing.util import Finalize
+from typing import Any, Callable, Iterator, Optional
+from uuid import uuid4
+
+
+# From narrowest to widest. A fixture can only use fixtures of its own scope or wider.
+SCOPES = ("test", "suite", "session")
+
+
+# Worker processes each keep one copy of a suite's fixtures, see `FixtureSet.__reduce__`
+_worker_fixtures: dict[str, FixtureSet] = {}
+
+# Session fixtures are shared by every suite run in a process
+_session: Optional[FixtureCache] = None
+_session_pid: Optional[int] = None
+_session_lock = threading.Lock()
+
+
+def _shared_fixtures(key: str, fixtures: dict[str, Fixture]) -> FixtureSet:
+    if key not in _worker_fixtures:
+        fixture_set = FixtureSet(fixtures, key)
+        Finalize(None, fixture_set.teardown, exitpriority=10)
+        _worker_fixtures[key] = fixture_set
+    return _worker_fixtures[key]
+
+
+def _session_cache() -> FixtureCache:
+    global _session, _session_pid
+
+    # A forked worker inherits the parent's session values, which it must not use or tear down
+    with _session_lock:
+        if _session is None or _session_pid != os.getpid():
+            _session, _session_pid = FixtureCache(), os.getpid()
+            if multiprocessing.parent_process() is not None:
+                Finalize(None, _session.teardown, exitpriority=10)
+        return _session
+
+
+def teardown_session() -> None:
+    """
+    Tears down every session scoped fixture created so far in this process, so that the next
+    suite run creates them afresh.
+    """
+    with _session_lock:
+        session = _session if _session_pid == os.getpid() else None
+    if session is not None:
+        session.teardown()
+
+
+def _finish(name: str, generator: Iterator[Any]) -> None:
+    for _ in generator:
+        raise ValueError(f"Fixture `{name}` yielded more than once.")
+
+
+class Fixture:
+    """
+    A function that sets up a value for tests to use, registered with a suite by
+    `TestSuite.fixture`. Fixtures may themselves use other fixtures, named by their parameters.
+    A fixture written as a generator yields its value, and is resumed to tear it down.
+    """
+
+    __slots__ = ("_name", "_function", "_scope", "_params")
+
+
+    def __init__(self, name: str, function: Callable[..., Any], scope: str = "test") -> None:
+        """
+        Creates a fixture.
+
+        Args:
+            name: the name tests request the fixture by, most likely the function name.
+            function: the callable that creates the fixture's value.
+            scope: how long a value is kept for: a 'test', a 'suite' run or a whole 'session'.
+        Raises:
+            ValueError: if the scope is unknown.
+        """
+        if scope not in SCOPES:
+            raise ValueError(f"Unknown scope `{scope}`: expected one of {', '.join(SCOPES)}.")
+
+        self._name = name
+        self._function = function
+        self._scope = scope
+        self._params = tuple(inspect.signature(function).parameters)
+
+
+    def _create(self, arguments: dict[str, Any]) -> tuple[Any, Optional[Callable[[], None]]]:
+        # Returns the value, along with how to tear it down if there is anything to do
+        if inspect.isgeneratorfunction(self._function):
+            generator = self._function(**arguments)
+            return next(generator), lambda: _finish(self._name, generator)
+
+        return self._function(**arguments), None
+
+
+class FixtureCache:
+    """
+    The fixture values created within one scope, kept so that each fixture is only created once
+    per scope, even when several threads ask for it at the same time.
+    """
+
+
+    def __init__(self) -> None:
+        self._values: dict[Callable[..., Any], Any] = {}
+        self._teardowns: list[Callable[[], None]] = []
+
+        # Re-entrant, as creating one fixture may create others of the same scope
+        self._lock = threading.RLock()
+
+
+    def get(self, fixture: Fixture, create: Callable[[], tuple]) -> Any:
+        """
+        Returns a fixture's value, creating it first if it doesn't exist yet in this scope.
+
+        Args:
+            fixture: the fixture to get the value of.
+            create: makes the value and its teardown, see `Fixture._create`.
+        """
+        with self._lock:
+            if fixture._function not in self._values:
+                value, teardown = create()
+                self._values[fixture._function] = value
+                if teardown is not None:
+                    self._teardowns.append(teardown)
+            return self._values[fixture._function]
+
+
+    def teardown(self) -> None:
+        """
+        Tears down every value in the scope, in the reverse order they were created in. Every
+        teardown is run even if one fails, after which the first failure is raised.
+        """
+        with self._lock:
+            teardowns, self._teardowns = self._teardowns, []
+            self._values = {}
+
+        error: Optional[Exception] = None
+        for teardown in reversed(teardowns):
+            try:
+                teardown()
+            except Exception as exception:
+                error = error or exception
+
+        if error is not None:
+            raise error
+
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+
+class FixtureSet:
+    """
+    The fixtures registered with a suite, along with the values of its suite scoped fixtures.
+    Tests are given fixtures by naming them as parameters after the `Test` itself.
+
+    Worker threads share the one set of values. Worker processes can't share live values, so
+    each process creates its own the first time they are needed, and tears them down on exit.
+    """
+
+
+    def __init__(self,
+        fixtures: Optional[dict[str, Fixture]] = None,
+        key: Optional[str] = None
+    ) -> None:
+        """
+        Creates a set of fixtures.
+
+        Args:
+            fixtures: the fixtures in the set, by name.
+            key: identifies the set across worker processes, by default a fresh one.
+        """
+        self._fixtures: dict[str, Fixture] = fixtures or {}
+        self._key = key or uuid4().hex
+        self._cache = FixtureCache()
+
+        # Working out what a test requests is only done once per function
+        self._requests: dict[Callable[..., Any], tuple[str, ...]] = {}
+
+
+    def add(self, fixture: Fixture) -> None:
+        """
+        Registers a fixture, replacing any other of the same name.
+        """
+        self._fixtures[fixture._name] = fixture
+
+
+    def resolve(self, function: Callable[..., Any], scope: FixtureCache) -> dict[str, Any]:
+        """
+        Gets the value of every fixture a test function requests, creating them as needed.
+
+        Args:
+            function: the test function, whose first parameter is the `Test`.
+            scope: where test scoped values are kept, to be torn down once the test is done.
+        Returns:
+            The values, by parameter name.
+        Raises:
+            ValueError: if a fixture is unknown, depends on itself, or depends on a fixture with
+                a narrower scope.
+        """
+        return {name: self._value(name, scope, "test", ()) for name in self._requested(function)}
+
+
+    def sources(self, function: Callable[..., Any]) -> set[str]:
+        """
+        The source files of every fixture a test function requests, directly or not.
+        """
+        files, seen = set(), set()
+        pending = list(self._requested(function))
+        while pending:
+            name = pending.pop()
+            if name in seen or name not in self._fixtures:
+                continue
+
+            seen.add(name)
+            fixture = self._fixtures[name]
+            if (code := getattr(fixture._function, "__code__", None)) is not None:
+                files.add(code.co_filename)
+            pending.extend(fixture._params)
+
+        return files
+
+
+    def teardown(self) -> None:
+        """
+        Tears down the suite scoped fixtures, see `FixtureCache.teardown`.
+        """
+        self._cache.teardown()
+
+
+    def _requested(self, function: Callable[..., Any]) -> tuple[str, ...]:
+        if not self._fixtures:
+            return ()
+
+        if function not in self._requests:
+            # Parameters with defaults are left be, unless they name a fixture. Arguments already
+            # bound, as for parametrized tests, always are.
+            parameters = list(inspect.signature(function).parameters.values())[1:]
+            bound = getattr(function, "keywords", {})
+            self._requests[function] = tuple(
+                parameter.name for parameter in parameters
+                if parameter.kind not in (parameter.VAR_POSITIONAL, parameter.VAR_KEYWORD)
+                and (parameter.default is parameter.empty or parameter.name in self._fixtures)
+                and parameter.name not in bound
+            )
+        return self._requests[function]
+
+
+    def _value(self, name: str, scope: FixtureCache, requester: str, chain: tuple[str, ...]) -> Any:
+        if name in chain:
+            raise ValueError(f"Fixture `{name}` depends on itself: {' -> '.join((*chain, name))}.")
+
+        fixture = self._fixtures.get(name)
+        if fixture is None:
+            raise ValueError(f"Unknown fixture `{name}`.")
+
+        if SCOPES.index(fixture._scope) < SCOPES.index(requester):
+            raise ValueError(
+                f"Fixture `{chain[-1]}` with {requester} scope can't use `{name}` with "
+                f"{fixture._scope} scope."
+            )
+
+        cache: FixtureCache
+        match fixture._scope:
+            case "test":  cache = scope
+            case "suite": cache = self._cache
+            case _:       cache = _session_cache()
+
+        return cache.get(fixture, lambda: fixture._create({
+            dependency: self._value(dependency, scope, fixture._scope, (*chain, name))
+            for dependency in fixture._params
+        }))
+
+
+    def __len__(self) -> int:
+        return len(self._fixtures)
+
+
+    def __reduce__(self) -> tuple:
+        # Tests are pickled in batches to worker processes, each of which should share one copy
+        return _shared_fixtures, (self._key, self._fixtures)
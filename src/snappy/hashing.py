@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+from functools import partial
+from hashlib import sha256, blake2b
+from typing import Any, Callable
+
+
+# Hashes are only compared for equality, so need not be cryptographic. sha256 stays the default
+# so that existing snapshots keep matching without being rehashed.
+DEFAULT_ALGORITHM = "sha256"
+HASH_ALGORITHMS = ("sha256", "blake2b", "xxh3")
+
+_hashers: dict[str, Callable[..., Any]] = {
+    "sha256": sha256,
+    "blake2b": partial(blake2b, digest_size=32),
+}
+
+# The fastest of them needs the optional `xxhash` package
+try:
+    import xxhash
+    _hashers["xxh3"] = xxhash.xxh3_128
+except ImportError:
+    pass
+
+
+def available_algorithms() -> tuple[str, ...]:
+    """
+    The hash algorithms that can be used here, in the order of `HASH_ALGORITHMS`.
+    """
+    return tuple(algorithm for algorithm in HASH_ALGORITHMS if algorithm in _hashers)
+
+
+def hasher(algorithm: str = DEFAULT_ALGORITHM, data: bytes = b"") -> Any:
+    """
+    Starts a hash of the given algorithm, which is fed with `update` like a `hashlib` hash.
+
+    Args:
+        algorithm: one of `HASH_ALGORITHMS`.
+        data: the first bytes to hash.
+    Raises:
+        ValueError: if the algorithm is unknown, or needs a package that isn't installed.
+    """
+    if algorithm not in _hashers:
+        if algorithm in HASH_ALGORITHMS:
+            raise ValueError(f"Hash algorithm `{algorithm}` needs the `xxhash` package installing.")
+        raise ValueError(f"Unknown hash algorithm `{algorithm}`: expected one of {HASH_ALGORITHMS}.")
+    return _hashers[algorithm](data)
+
+
+def qualify(algorithm: str, digest: str) -> str:
+    """
+    Names the algorithm a hex digest was made with, as in `blake2b:<digest>`. Hashes made with
+    the default algorithm are left as they are, as they were before the algorithm was recorded.
+    """
+    return digest if algorithm == DEFAULT_ALGORITHM else f"{algorithm}:{digest}"
+
+
+def split(hash: str) -> tuple[str, str]:
+    """
+    Splits a hash made by `qualify` back into its algorithm and hex digest.
+    """
+    algorithm, _, digest = hash.rpartition(":")
+    return algorithm or DEFAULT_ALGORITHM, digest
@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import os
+import json
+from pathlib import Path
+from statistics import median
+from typing import Iterable, Iterator, Optional
+
+from .test import Test
+from .results import TestResult
+
+
+HISTORY_NAME = ".snappy-history.json"
+
+
+class TestHistory:
+    """
+    A persistent record, kept in a suite's snapshot directory, of how long each test took,
+    whether it failed and which snaps it took the last time it was run. Tests are scheduled by
+    it: those that failed last time are run first, so that a broken change shows itself as soon
+    as it can, and when running in parallel the longest tests are started first, so that none
+    is left running on its own at the end. The snaps each test took tell apart the snapshots
+    still in use from those left behind by renamed or removed snaps, see `clean`.
+    """
+
+
+    def __init__(self, snap_directory: Path) -> None:
+        """
+        Creates an empty history for a snapshot directory. Use `load` to read in the persisted
+        entries, and `save` to write them back out.
+
+        Args:
+            snap_directory: the suite's snapshot directory, where the history file lives.
+        """
+        self._directory = snap_directory
+        self._path = snap_directory / HISTORY_NAME
+        self._entries: dict[str, list] = {}
+        self._dirty = False
+
+
+    def load(self) -> None:
+        """
+        Reads the persisted entries from disk. A missing or unreadable history is treated as
+        empty.
+        """
+        try:
+            with self._path.open("r") as file:
+                entries = json.load(file)
+        except (OSError, ValueError):
+            return
+
+        if isinstance(entries, dict):
+            self._entries = entries
+
+
+    def save(self) -> None:
+        """
+        Writes the history to disk if it has changed, replacing the old history in one step.
+        """
+        if not self._dirty:
+            return
+
+        self._directory.mkdir(parents=True, exist_ok=True)
+        temp = self._path.with_name(f"{HISTORY_NAME}.{os.getpid()}.tmp")
+        with temp.open("w") as file:
+            json.dump(self._entries, file, separators=(",", ":"))
+        os.replace(temp, self._path)
+        self._dirty = False
+
+
+    def record(self, result: TestResult) -> None:
+        """
+        Records how long a test took, whether it failed and the snaps it took. Cached tests
+        weren't run, so leave the history as it was. Tests that timed out may not have taken
+        all their snaps, so which they took is left unknown.
+        """
+        if result.cached:
+            return
+
+        snaps = None if result.timed_out else sorted(result.snaps)
+        self._entries[result.name] = [round(result.wall_time, 6), not result.passed, snaps]
+        self._dirty = True
+
+
+    def duration(self, test_name: str) -> Optional[float]:
+        """
+        The seconds a test took when it was last run, or None if it has never been run.
+        """
+        entry = self._entries.get(test_name)
+        return entry[0] if entry is not None else None
+
+
+    def failed(self, test_name: str) -> bool:
+        """
+        Whether a test failed when it was last run.
+        """
+        entry = self._entries.get(test_name)
+        return entry is not None and entry[1]
+
+
+    def snaps(self, test_name: str) -> Optional[list[str]]:
+        """
+        The names of the snaps a test took when it was last run, or None if it isn't known.
+        """
+        entry = self._entries.get(test_name)
+        return entry[2] if entry is not None and len(entry) > 2 else None
+
+
+    def retain(self, test_names: set[str]) -> None:
+        """
+        Forgets every test not in the given set, i.e. those that have been removed or renamed.
+        """
+        for name in [name for name in self._entries if name not in test_names]:
+            del self._entries[name]
+            self._dirty = True
+
+
+    def schedule(self, tests: list[Test], longest_first: bool = False) -> list[Test]:
+        """
+        Orders tests to be run, with those that failed last time first and the rest kept in
+        order.
+
+        Args:
+            tests: the tests to run.
+            longest_first: flag that orders the tests by how long they took last time, longest
+                first, after the failures. Tests never run before are taken to be of median
+                length.
+        """
+        if not longest_first:
+            return sorted(tests, key=lambda test: not self.failed(test._name))
+
+        durations = [entry[0] for entry in self._entries.values()]
+        default = median(durations) if durations else 0.0
+        return sorted(tests, key=lambda test: (
+            not self.failed(test._name),
+            -(duration if (duration := self.duration(test._name)) is not None else default)
+        ))
+
+
+    def order(self,
+        tests: Iterable[Test],
+        names: set[str],
+        prefixes: tuple[str, ...] = ()
+    ) -> Iterator[Test]:
+        """
+        Orders tests to be run like `schedule`, but yields each as soon as it can rather than
+        sorting them all first. Tests are only held back while one that failed last time may
+        still be to come. Failures left over from tests no longer drawn, such as removed rows of
+        a table, are forgotten once the tests run out, so they hold nothing back next time.
+
+        Args:
+            tests: every test to run, which may be generated as they are drawn.
+            names: the names of the tests that may be drawn. Other tests, such as those renamed
+                or kept by another suite sharing the history, can't hold any back.
+            prefixes: the name prefixes of the tests that may be drawn, i.e. those of tables.
+        """
+        failing = {
+            name for name, entry in self._entries.items()
+            if entry[1] and (name in names or name.startswith(prefixes))
+        }
+        held: list[Test] = []
+        for test in tests:
+            if test._name in failing:
+                failing.discard(test._name)
+                yield test
+            elif failing:
+                held.append(test)
+            else:
+                yield from held
+                held.clear()
+                yield test
+
+        yield from held
+        for name in failing:
+            self._entries[name][1] = False
+            self._dirty = True
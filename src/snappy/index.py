@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import os
+import json
+from pathlib import Path
+from typing import Optional
+
+from .snapshot import Snapshot
+
+
+INDEX_NAME = ".snappy-index.json"
+
+
+# Worker processes each keep one copy of an index per snapshot directory, see `__reduce__`
+_worker_indexes: dict[Path, SnapshotIndex] = {}
+
+
+def _shared_index(snap_directory: Path) -> SnapshotIndex:
+    if snap_directory not in _worker_indexes:
+        index = SnapshotIndex(snap_directory)
+        index.load()
+        _worker_indexes[snap_directory] = index
+    return _worker_indexes[snap_directory]
+
+
+class SnapshotIndex:
+    """
+    A persistent record of the accepted snapshots in a suite's snapshot directory, mapping each
+    test and snap name to the snapshot's hash along with the size and modification time of its
+    file. This lets a test compare against an existing snapshot with a single `stat` call, rather
+    than opening and parsing the file.
+
+    Entries are checked against the file's size and modification time before being trusted, so
+    a snapshot that has been changed since it was indexed is simply re-read and re-indexed.
+    """
+
+
+    def __init__(self, snap_directory: Path) -> None:
+        """
+        Creates an empty index for a snapshot directory. Use `load` to read in the persisted
+        entries, and `save` to write them back out.
+
+        Args:
+            snap_directory: the suite's snapshot directory, where the index file lives.
+        """
+        self._directory = snap_directory
+        self._path = snap_directory / INDEX_NAME
+        self._entries: dict[str, list] = {}
+
+        # Changes are tracked separately so they can be shipped back from worker processes
+        self._changes: dict[str, Optional[list]] = {}
+        self._loaded = False
+        self._dirty = False
+
+
+    def load(self) -> None:
+        """
+        Reads the persisted entries from disk, if they haven't been already. A missing or
+        unreadable index is treated as empty, and will be rebuilt as snapshots are looked up.
+        """
+        if self._loaded:
+            return
+        self._loaded = True
+
+        try:
+            with self._path.open("r") as file:
+                entries = json.load(file)
+        except (OSError, ValueError):
+            return
+
+        if isinstance(entries, dict):
+            self._entries = entries
+
+
+    def save(self) -> None:
+        """
+        Writes the index to disk if it has changed. The index is written to a temporary file which
+        then replaces the old one, so an interrupted save never leaves a partial index behind.
+        """
+        if not self._dirty:
+            return
+
+        self._directory.mkdir(parents=True, exist_ok=True)
+        temp = self._path.with_name(f"{INDEX_NAME}.{os.getpid()}.tmp")
+        with temp.open("w") as file:
+            json.dump(self._entries, file, separators=(",", ":"))
+        os.replace(temp, self._path)
+        self._dirty = False
+
+
+    def hash_of(self, test_name: str, snap_name: str, path: Path) -> Optional[str]:
+        """
+        Finds the hash of an accepted snapshot, reading the snapshot file only if it isn't
+        indexed or has changed since it was.
+
+        Args:
+            test_name: the name of the test the snapshot belongs to.
+            snap_name: the name of the snapshot.
+            path: the location of the snapshot file.
+        Returns:
+            The hash of the snapshot, or None if the snapshot file doesn't exist.
+        """
+        key = f"{test_name}/{snap_name}"
+
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            if key in self._entries:
+                self._update(key, None)
+            return None
+
+        entry = self._entries.get(key)
+        if entry is not None and entry[1:] == [stat.st_size, stat.st_mtime_ns]:
+            return entry[0]
+
+        hash = Snapshot.load_from(path)._hash
+        self._update(key, [hash, stat.st_size, stat.st_mtime_ns])
+        return hash
+
+
+    def pop_changes(self) -> dict[str, Optional[list]]:
+        """
+        Returns the entries changed since the last call, with None marking removed entries.
+        """
+        changes, self._changes = self._changes, {}
+        return changes
+
+
+    def merge(self, changes: dict[str, Optional[list]]) -> None:
+        """
+        Applies changes made to another copy of the index, as returned by `pop_changes`.
+        """
+        for key, entry in changes.items():
+            if self._entries.get(key) != entry:
+                self._update(key, entry)
+        self._changes.clear()
+
+
+    def _update(self, key: str, entry: Optional[list]) -> None:
+        if entry is None:
+            self._entries.pop(key, None)
+        else:
+            self._entries[key] = entry
+        self._changes[key] = entry
+        self._dirty = True
+
+
+    def __reduce__(self):
+        # Tests carry a reference to their suite's index. Rather than copying the whole index
+        # into every pickled test, worker processes load their own copy once and share it.
+        return (_shared_index, (self._directory,))
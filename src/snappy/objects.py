@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import os
+import lzma
+import zlib
+import threading
+from pathlib import Path
+from typing import Iterable
+
+from .hashing import DEFAULT_ALGORITHM, split
+
+
+OBJECTS_DIR = ".objects"
+COMPRESSIONS = ("zlib", "lzma")
+
+
+def _compressor(compression: str):
+    match compression:
+        case "zlib": return zlib.compressobj()
+        case "lzma": return lzma.LZMACompressor()
+        case _:
+            raise ValueError(f"Unknown compression `{compression}`: expected one of {COMPRESSIONS}.")
+
+
+def read_object(path: Path) -> bytes:
+    """
+    Reads and decompresses a stored object, using its suffix to pick the decompressor.
+
+    Args:
+        path: the location of the object file.
+    Raises:
+        ValueError: if the object's compression is unknown.
+    """
+    match path.suffix:
+        case ".zlib": return zlib.decompress(path.read_bytes())
+        case ".lzma": return lzma.decompress(path.read_bytes())
+        case _:
+            raise ValueError(f"Unknown object compression `{path.suffix}`.")
+
+
+class ObjectStore:
+    """
+    A content-addressed store of compressed snapshot content, kept in an `.objects` directory
+    alongside a suite's snapshots, a name no test can have. Objects are keyed by the hash of
+    their content, so snapshots with identical content share a single object.
+    """
+
+
+    def __init__(self, snap_directory: Path, compression: str = "zlib") -> None:
+        """
+        Creates an object store in a snapshot directory. No directories are created until the
+        first object is stored.
+
+        Args:
+            snap_directory: the suite's snapshot directory.
+            compression: the compression to store new objects with, either 'zlib' or 'lzma'.
+        Raises:
+            ValueError: if the compression is unknown.
+        """
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression `{compression}`: expected one of {COMPRESSIONS}.")
+
+        self._root = snap_directory / OBJECTS_DIR
+        self._compression = compression
+
+
+    def path_of(self, hash: str) -> Path:
+        """
+        The location an object with the given hash is stored at. Objects are fanned out into
+        sub-directories by the first two characters of the hash, to keep directories small, with
+        those hashed by other than the default algorithm kept under a directory of their own.
+        """
+        algorithm, digest = split(hash)
+        root = self._root if algorithm == DEFAULT_ALGORITHM else self._root / algorithm
+        return root / digest[:2] / f"{digest[2:]}.{self._compression}"
+
+
+    def put(self, hash: str, chunks: Iterable[bytes]) -> Path:
+        """
+        Stores content under its hash, unless an object with that hash already exists. Content
+        is compressed as it's written, and only moved into place once complete.
+
+        Args:
+            hash: the hash of the content.
+            chunks: the content, as encoded chunks.
+        Returns:
+            The location of the stored object.
+        """
+        path = self.path_of(hash)
+        if path.exists():
+            return path
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+        compressor = _compressor(self._compression)
+        with temp.open("wb") as file:
+            for chunk in chunks:
+                file.write(compressor.compress(chunk))
+            file.write(compressor.flush())
+
+        os.replace(temp, path)
+        return path
@@ -0,0 +1,496 @@
+from __future__ import annotations
+
+import sys
+import json
+from dataclasses import asdict
+from pathlib import Path
+from typing import IO, Callable, Iterable, List, Optional
+from xml.sax.saxutils import escape, quoteattr
+
+from .results import TestResult
+
+
+# Buffered output is written out once this many lines have built up
+BUFFER_LINES = 1000
+
+# Dots wrap onto a new line after this many tests
+DOTS_PER_LINE = 80
+
+
+class Reporter:
+    """
+    Reports a test run as it happens, from a stream of events: each suite and test starting and
+    finishing, new snaps being created, and the summary once the run is over. Every event does
+    nothing by default, so reporters need only handle those they care about.
+
+    Events all come from the thread running the suites, in the order tests are reported in. When
+    tests run in parallel, a test is only reported as started once it's ready to be reported
+    as finished.
+    """
+
+
+    def start_suite(self, name: str) -> None:
+        """
+        A suite is starting, named after its snapshot directory.
+        """
+
+
+    def start_test(self, test_name: str) -> None:
+        """
+        A test is starting.
+        """
+
+
+    def snap_created(self, test_name: str, snap_name: str) -> None:
+        """
+        A test created a new snap, which is waiting for review.
+        """
+
+
+    def finish_test(self, result: TestResult) -> None:
+        """
+        A test has finished, after any snaps it created have been reported.
+        """
+
+
+    def finish_suite(self) -> None:
+        """
+        The suite started last has finished.
+        """
+
+
+    def message(self, text: str) -> None:
+        """
+        A note about the run, such as it being stopped early.
+        """
+
+
+    def summary(self, results: List[TestResult]) -> None:
+        """
+        The run is over. Reporters finish their output here.
+
+        Args:
+            results: the results of every test run, across every suite.
+        """
+
+
+    def close(self) -> None:
+        """
+        Releases anything the reporter holds on to, such as an open file.
+        """
+
+
+class MultiReporter(Reporter):
+    """
+    Passes every event on to several reporters, in turn.
+    """
+
+
+    def __init__(self, reporters: Iterable[Reporter]) -> None:
+        self._reporters = list(reporters)
+
+
+    def start_suite(self, name: str) -> None:
+        for reporter in self._reporters:
+            reporter.start_suite(name)
+
+
+    def start_test(self, test_name: str) -> None:
+        for reporter in self._reporters:
+            reporter.start_test(test_name)
+
+
+    def snap_created(self, test_name: str, snap_name: str) -> None:
+        for reporter in self._reporters:
+            reporter.snap_created(test_name, snap_name)
+
+
+    def finish_test(self, result: TestResult) -> None:
+        for reporter in self._reporters:
+            reporter.finish_test(result)
+
+
+    def finish_suite(self) -> None:
+        for reporter in self._reporters:
+            reporter.finish_suite()
+
+
+    def message(self, text: str) -> None:
+        for reporter in self._reporters:
+            reporter.message(text)
+
+
+    def summary(self, results: List[TestResult]) -> None:
+        for reporter in self._reporters:
+            reporter.summary(results)
+
+
+    def close(self) -> None:
+        for reporter in self._reporters:
+            reporter.close()
+
+
+class TerminalReporter(Reporter):
+    """
+    Reports each test by name as it runs, with its outcome and the new snaps it made, followed
+    by the slowest tests and the totals of the run.
+
+    Written to a stream, output is gathered up and written a block of lines at a time unless the
+    stream is a terminal. Anything tests print themselves may then come out ahead of their names.
+    """
+
+
+    def __init__(self,
+        display_func: Optional[Callable] = None,
+        durations: int = 0,
+        stream: Optional[IO[str]] = None,
+        buffered: Optional[bool] = None
+    ) -> None:
+        """
+        Creates a terminal reporter.
+
+        Args:
+            display_func: a callable like `print` to push each line to, as it comes. If given,
+                the stream is unused.
+            durations: the number of slowest tests to report, none by default.
+            stream: the stream to write to, by default standard output.
+            buffered: whether to gather up output, by default only if the stream isn't a
+                terminal.
+        """
+        self._stream = stream if stream is not None else sys.stdout
+        self._durations = durations
+        self._lines: list[str] = []
+
+        if buffered is None:
+            buffered = display_func is None and not self._stream.isatty()
+
+        self._display: Callable
+        if display_func is not None:
+            self._display = display_func
+        elif buffered:
+            self._display = self._buffer
+        else:
+            self._display = lambda *args, **kwargs: print(*args, **kwargs, file=self._stream)
+
+
+    def _buffer(self, *values: object, sep: str = " ", end: str = "\n") -> None:
+        # Takes the place of `print`
+        self._lines.append(sep.join(str(value) for value in values) + end)
+        if len(self._lines) >= BUFFER_LINES:
+            self.flush()
+
+
+    def flush(self) -> None:
+        """
+        Writes out any buffered output.
+        """
+        if self._lines:
+            self._stream.write("".join(self._lines))
+            self._lines = []
+        self._stream.flush()
+
+
+    def start_test(self, test_name: str) -> None:
+        self._display(f"{test_name}:", end=" \t")
+
+
+    def finish_test(self, result: TestResult) -> None:
+        display_outcome(self._display, result)
+
+
+    def message(self, text: str) -> None:
+        self._display(text)
+
+
+    def summary(self, results: List[TestResult]) -> None:
+        display_durations(self._display, results, self._durations)
+        display_summary(self._display, results)
+        self.flush()
+
+
+    def close(self) -> None:
+        self.flush()
+
+
+class DotsReporter(Reporter):
+    """
+    Reports each test as a single character: `.` for a pass, `c` for a cached pass, `F` for a
+    failure and `T` for a timeout. Failures are listed with their new snaps once the run is
+    over, followed by the totals of the run.
+    """
+
+
+    def __init__(self, stream: Optional[IO[str]] = None) -> None:
+        """
+        Creates a dots reporter.
+
+        Args:
+            stream: the stream to write to, by default standard output.
+        """
+        self._stream = stream if stream is not None else sys.stdout
+        self._interactive = self._stream.isatty()
+        self._count = 0
+
+
+    def finish_test(self, result: TestResult) -> None:
+        if result.cached:
+            dot = "c"
+        elif result.timed_out:
+            dot = "T"
+        else:
+            dot = "." if result.passed else "F"
+
+        self._count = self._count + 1
+        self._stream.write(dot if self._count % DOTS_PER_LINE else f"{dot}\n")
+        if self._interactive:
+            self._stream.flush()
+
+
+    def message(self, text: str) -> None:
+        self._stream.write(f"\n{text}\n" if self._count % DOTS_PER_LINE else f"{text}\n")
+        self._count = 0
+
+
+    def summary(self, results: List[TestResult]) -> None:
+        lines = [""] if self._count % DOTS_PER_LINE else []
+        for result in results:
+            if not result.passed:
+                outcome: list[str] = []
+                display_outcome(lambda text, **_: outcome.append(text), result)
+                lines.append(f"{result.name}: {outcome[0]}")
+                lines.extend(outcome[1:])
+
+        display_summary(lines.append, results)
+        self._stream.write("".join(f"{line}\n" for line in lines))
+        self._stream.flush()
+        self._count = 0
+
+
+class JUnitReporter(Reporter):
+    """
+    Writes a JUnit XML report, as understood by most CI services. Each suite is a `testsuite`
+    and each test a `testcase`, with new snaps reported as a `failure` and timeouts as an
+    `error`. Tests are written out as they finish, so the report is never held in memory, and
+    the totals usually given on each `testsuite` are left off, as they aren't known until after.
+    """
+
+
+    def __init__(self, path: Path) -> None:
+        """
+        Creates a JUnit reporter. The file is created, or emptied, once the first suite starts.
+
+        Args:
+            path: the location to write the report to.
+        """
+        self._path = path
+        self._file: Optional[IO[str]] = None
+        self._suite = ""
+
+
+    def _write(self, text: str) -> None:
+        if self._file is None:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = self._path.open("w", encoding="utf-8")
+            self._file.write('<?xml version="1.0" encoding="utf-8"?>\n<testsuites>\n')
+        self._file.write(text)
+
+
+    def start_suite(self, name: str) -> None:
+        self._suite = name
+        self._write(f"  <testsuite name={quoteattr(name)}>\n")
+
+
+    def finish_test(self, result: TestResult) -> None:
+        attributes = (
+            f"classname={quoteattr(self._suite)} name={quoteattr(result.name)} "
+            f'time="{result.wall_time:.6f}"'
+        )
+        snaps = escape("\n".join(f"x {snap}" for snap in result.new_snaps))
+
+        if result.timed_out:
+            message = f"ran for longer than {result.wall_time:g}s"
+            self._write(
+                f"    <testcase {attributes}>\n"
+                f'      <error type="timeout" message={quoteattr(message)}>{snaps}</error>\n'
+                f"    </testcase>\n"
+            )
+        elif not result.passed:
+            message = f"{plural(len(result.new_snaps), 'new snap')} to review"
+            self._write(
+                f"    <testcase {attributes}>\n"
+                f'      <failure type="snapshot" message={quoteattr(message)}>{snaps}</failure>\n'
+                f"    </testcase>\n"
+            )
+        else:
+            self._write(f"    <testcase {attributes}/>\n")
+
+
+    def finish_suite(self) -> None:
+        self._write("  </testsuite>\n")
+
+
+    def summary(self, results: List[TestResult]) -> None:
+        self._write("</testsuites>\n")
+        self.close()
+
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class JsonLinesReporter(Reporter):
+    """
+    Writes every event as a line of JSON, as it happens, for tooling to follow along with or
+    read back afterwards. Each line has an `event` key naming it: 'suite_started',
+    'test_started', 'snap_created', 'test_finished' with the test's result, 'suite_finished',
+    'message' or 'summary' with the totals of the run.
+    """
+
+
+    def __init__(self, path: Path) -> None:
+        """
+        Creates a JSON Lines reporter. The file is created, or emptied, on the first event.
+
+        Args:
+            path: the location to write the events to.
+        """
+        self._path = path
+        self._file: Optional[IO[str]] = None
+
+
+    def _event(self, event: str, **data: object) -> None:
+        if self._file is None:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = self._path.open("w", encoding="utf-8")
+        self._file.write(json.dumps({"event": event, **data}, separators=(",", ":")) + "\n")
+
+
+    def start_suite(self, name: str) -> None:
+        self._event("suite_started", suite=name)
+
+
+    def start_test(self, test_name: str) -> None:
+        self._event("test_started", test=test_name)
+
+
+    def snap_created(self, test_name: str, snap_name: str) -> None:
+        self._event("snap_created", test=test_name, snap=snap_name)
+
+
+    def finish_test(self, result: TestResult) -> None:
+        self._event("test_finished", **asdict(result))
+
+
+    def finish_suite(self) -> None:
+        self._event("suite_finished")
+
+
+    def message(self, text: str) -> None:
+        self._event("message", text=text)
+
+
+    def summary(self, results: List[TestResult]) -> None:
+        self._event(
+            "summary",
+            tests = len(results),
+            passed = sum(result.passed for result in results),
+            failed = sum(not result.passed for result in results),
+            timed_out = sum(result.timed_out for result in results),
+            new_snaps = sum(len(result.new_snaps) for result in results)
+        )
+        self.close()
+
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def report_result(reporter: Reporter, result: TestResult) -> None:
+    """
+    Reports a finished test, along with each new snap it created.
+    """
+    for snap in result.new_snaps:
+        reporter.snap_created(result.name, snap)
+    reporter.finish_test(result)
+
+
+
+def display_outcome(display_func: Callable, result: TestResult) -> None:
+    """
+    Reports how a test went, following its name, along with any new snaps it made.
+
+    Args:
+        display_func: The callable that the outcome will be pushed to.
+        result: the result of the test.
+    """
+    if result.cached:
+        display_func("cached.")
+
+    elif result.timed_out:
+        display_func("timed out!")
+        display_func('\n'.join([
+            f"  x {snap}" for snap in result.new_snaps
+        ] + [f"  x ran for longer than {result.wall_time:g}s"]))
+
+    elif result.passed:
+        display_func("ok.")
+
+    else:
+        display_func('err!')
+        display_func('\n'.join([
+            f"  x {snap}" for snap in result.new_snaps
+        ]))
+
+
+def display_durations(display_func: Callable, results: List[TestResult], count: int) -> None:
+    """
+    Reports the slowest tests of a test run, with the time spent in each phase of snapping.
+
+    Args:
+        display_func: The callable that the durations will be pushed to.
+        results: the results of the tests ran.
+        count: the number of tests to report, where zero reports none.
+    """
+    if count <= 0:
+        return
+
+    slowest = sorted(results, key=lambda result: result.wall_time, reverse=True)[:count]
+
+    display_func("-----------------------------------")
+    display_func(f"slowest {len(slowest)} durations:")
+    for result in slowest:
+        details = [] if result.cpu_time is None else [f"cpu {result.cpu_time:.3f}s"]
+        details += [f"{phase} {seconds:.3f}s" for phase, seconds in result.phases.items()]
+        suffix = f" ({', '.join(details)})" if details else ""
+        display_func(f"  {result.wall_time:.3f}s  {result.name}{suffix}")
+
+
+def plural(n: int, word: str) -> str:
+    return f"1 {word}" if n == 1 else f"{n} {word}s"
+
+
+def display_summary(display_func: Callable, results: List[TestResult]) -> None:
+    """
+    Reports the totals of a test run.
+
+    Args:
+        display_func: The callable that the summary will be pushed to.
+        results: the results of the tests ran.
+    """
+    n_tests = len(results)
+    tests_failed = sum(not result.passed for result in results)
+    tests_passed = n_tests - tests_failed
+    tests_timed_out = sum(result.timed_out for result in results)
+    snaps_for_review = sum(len(result.new_snaps) for result in results)
+
+    display_func("-----------------------------------")
+    display_func(f"{plural(n_tests, 'test')} ran:")
+    display_func(f"  {plural(tests_passed, 'test')} passed")
+    display_func(f"  {plural(tests_failed, 'test')} failed")
+    if tests_timed_out:
+        display_func(f"  {plural(tests_timed_out, 'test')} timed out")
+    display_func(f"  {plural(snaps_for_review, 'new snap')} to review")
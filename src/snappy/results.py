@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+
+@dataclass
+class TestResult:
+    """
+    The outcome of running a single test, along with how long it took.
+
+    Attributes:
+        name: the name of the test.
+        passed: whether the test created no new snaps.
+        new_snaps: the names of the new snaps the test created.
+        cached: whether the test was skipped because its dependencies were unchanged.
+        timed_out: whether the test was stopped for running past its timeout.
+        wall_time: seconds taken to run the test.
+        cpu_time: CPU seconds spent running the test, or None where it can't be told apart from
+            other tests, such as for async tests sharing an event loop.
+        phases: seconds spent in each phase of snapping: 'hash' for hashing the new content,
+            'load' for looking up the accepted snapshot and 'write' for saving new snapshots,
+            along with 'fixtures' for setting up and tearing down the fixtures the test used.
+        snaps: the names of every snap the test took, new or not.
+    """
+    name: str
+    passed: bool
+    new_snaps: list[str] = field(default_factory=list)
+    cached: bool = False
+    timed_out: bool = False
+    wall_time: float = 0.0
+    cpu_time: Optional[float] = None
+    phases: dict[str, float] = field(default_factory=dict)
+    snaps: list[str] = field(default_factory=list)
+
+
+@dataclass
+class SuiteResults:
+    """
+    The results of running a suite, along with where it keeps its snapshots, so that the new
+    snapshots its tests made can be found again.
+
+    Attributes:
+        snapshot_directory: the suite's snapshot directory.
+        backend: the suite's storage backend, either 'directory' or 'sqlite'.
+        compression: the compression of the suite's object store, if it has one.
+        results: the result of each test run.
+    """
+    snapshot_directory: Path
+    backend: str = "directory"
+    compression: Optional[str] = None
+    results: list[TestResult] = field(default_factory=list)
@@ -0,0 +1,352 @@
+from __future__ import annotations
+
+import os
+from fnmatch import fnmatchcase
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Sequence
+
+from .snapshot import Snapshot
+from .storage import DATABASE_NAME, Storage
+
+
+Opcode = tuple[str, int, int, int, int]
+
+
+# The edit distance searched for the middle of a difference, past which the search settles for
+# splitting it wherever the furthest path reached, as GNU diff's `--speed-large-files` does.
+# Dissimilar snapshots then diff in time linear in their length, rather than quadratic.
+DIFF_MAX_COST = 128
+
+
+def _bisect(a: Sequence, b: Sequence, alo: int, ahi: int, blo: int, bhi: int) -> tuple[int, int]:
+    # Finds the middle snake of the shortest edit script between two ranges, searching forwards
+    # and backwards at once (Myers, 1986). Only two diagonal vectors are kept, so space is linear.
+    n, m = ahi - alo, bhi - blo
+    max_d = min((n + m + 1) // 2, DIFF_MAX_COST)
+    offset = max_d
+    forward = [-1] * (2 * max_d + 2)
+    reverse = [-1] * (2 * max_d + 2)
+    forward[offset + 1] = 0
+    reverse[offset + 1] = 0
+
+    delta = n - m
+    odd = delta % 2 != 0
+    k1_start = k1_end = k2_start = k2_end = 0
+
+    for d in range(max_d):
+        for k1 in range(-d + k1_start, d + 1 - k1_end, 2):
+            index = offset + k1
+            if k1 == -d or (k1 != d and forward[index - 1] < forward[index + 1]):
+                x1 = forward[index + 1]
+            else:
+                x1 = forward[index - 1] + 1
+            y1 = x1 - k1
+            while x1 < n and y1 < m and a[alo + x1] == b[blo + y1]:
+                x1, y1 = x1 + 1, y1 + 1
+            forward[index] = x1
+
+            if x1 > n:
+                k1_end += 2
+            elif y1 > m:
+                k1_start += 2
+            elif odd:
+                other = offset + delta - k1
+                if 0 <= other < len(reverse) and reverse[other] != -1 and x1 >= n - reverse[other]:
+                    return x1, y1
+
+        for k2 in range(-d + k2_start, d + 1 - k2_end, 2):
+            index = offset + k2
+            if k2 == -d or (k2 != d and reverse[index - 1] < reverse[index + 1]):
+                x2 = reverse[index + 1]
+            else:
+                x2 = reverse[index - 1] + 1
+            y2 = x2 - k2
+            while x2 < n and y2 < m and a[ahi - x2 - 1] == b[bhi - y2 - 1]:
+                x2, y2 = x2 + 1, y2 + 1
+            reverse[index] = x2
+
+            if x2 > n:
+                k2_end += 2
+            elif y2 > m:
+                k2_start += 2
+            elif not odd:
+                other = offset + delta - k2
+                if 0 <= other < len(forward) and forward[other] != -1:
+                    x1 = forward[other]
+                    if x1 >= n - x2:
+                        return x1, offset + x1 - other
+
+    # Too costly to find the middle, so split at the point furthest along either search, which
+    # leaves the rest to be diffed on its own
+    best, split = 0, (n, 0)
+    for k in range(-max_d, max_d + 1):
+        x1, x2 = forward[offset + k], reverse[offset + k]
+        if 0 <= x1 <= n and 0 <= x1 - k <= m and x1 + x1 - k > best:
+            best, split = x1 + x1 - k, (x1, x1 - k)
+        if 0 <= x2 <= n and 0 <= x2 - k <= m and x2 + x2 - k > best:
+            best, split = x2 + x2 - k, (n - x2, m - x2 + k)
+    return split
+
+
+def _diff(
+    a: Sequence, b: Sequence, alo: int, ahi: int, blo: int, bhi: int, out: list[Opcode]
+) -> None:
+    # Ranges are worked through in order off a stack rather than recursively, as splits made
+    # past `DIFF_MAX_COST` can be many and lopsided. Unchanged suffixes wait on it their turn.
+    stack: list[Opcode] = [("diff", alo, ahi, blo, bhi)]
+    while stack:
+        tag, alo, ahi, blo, bhi = stack.pop()
+        if tag == "equal":
+            _emit(out, tag, alo, ahi, blo, bhi)
+            continue
+
+        # Common prefixes and suffixes are trimmed off first, as they're cheap to find and
+        # usually make up most of a snapshot
+        start = 0
+        while alo + start < ahi and blo + start < bhi and a[alo + start] == b[blo + start]:
+            start += 1
+        if start:
+            _emit(out, "equal", alo, alo + start, blo, blo + start)
+            alo, blo = alo + start, blo + start
+
+        end = 0
+        while alo < ahi - end and blo < bhi - end and a[ahi - end - 1] == b[bhi - end - 1]:
+            end += 1
+        ahi, bhi = ahi - end, bhi - end
+        if end:
+            stack.append(("equal", ahi, ahi + end, bhi, bhi + end))
+
+        if alo == ahi and blo != bhi:
+            _emit(out, "insert", alo, alo, blo, bhi)
+        elif blo == bhi and alo != ahi:
+            _emit(out, "delete", alo, ahi, blo, blo)
+        elif alo != ahi:
+            x, y = _bisect(a, b, alo, ahi, blo, bhi)
+            if (x, y) in [(0, 0), (ahi - alo, bhi - blo)]:
+                _emit(out, "delete", alo, ahi, blo, blo)
+                _emit(out, "insert", ahi, ahi, blo, bhi)
+            else:
+                stack.append(("diff", alo + x, ahi, blo + y, bhi))
+                stack.append(("diff", alo, alo + x, blo, blo + y))
+
+
+def _emit(out: list[Opcode], tag: str, alo: int, ahi: int, blo: int, bhi: int) -> None:
+    # Deletions are kept ahead of insertions in a run of changes, so that a change split up
+    # by `_bisect` still reads as its old lines followed by its new
+    if tag == "delete" and out and out[-1][0] == "insert":
+        _, _, _, ilo, ihi = out.pop()
+        _emit(out, tag, alo, ahi, ilo, ilo)
+        out.append(("insert", ahi, ahi, ilo, ihi))
+        return
+
+    # Neighbouring opcodes of the same kind are merged together
+    if out and out[-1][0] == tag:
+        out[-1] = (tag, out[-1][1], ahi, out[-1][3], bhi)
+    else:
+        out.append((tag, alo, ahi, blo, bhi))
+
+
+def diff_lines(a: Sequence[str], b: Sequence[str]) -> list[Opcode]:
+    """
+    Finds a short set of line insertions and deletions that turns `a` into `b`. Runs in time
+    proportional to the length of the inputs times the size of the difference, and in space
+    linear in the length of the inputs, so large but similar snapshots diff quickly. Differences
+    costing more than `DIFF_MAX_COST` to search are split up heuristically, so dissimilar inputs
+    also diff in linear time, though their set may not be the shortest.
+
+    Args:
+        a: the old lines.
+        b: the new lines.
+    Returns:
+        Opcodes in the style of `difflib.SequenceMatcher.get_opcodes`, each a tag of 'equal',
+        'delete' or 'insert' along with the ranges of `a` and `b` it covers.
+    """
+    # Lines only one side has can't be matched, so are set aside before searching, as GNU diff
+    # does. Dissimilar snapshots, such as regenerated ones, then leave little to search.
+    in_a, in_b = set(a), set(b)
+    a_kept = [i for i, line in enumerate(a) if line in in_b]
+    b_kept = [j for j, line in enumerate(b) if line in in_a]
+
+    matched: list[Opcode] = []
+    a_rest, b_rest = [a[i] for i in a_kept], [b[j] for j in b_kept]
+    _diff(a_rest, b_rest, 0, len(a_rest), 0, len(b_rest), matched)
+
+    # Lines matched among those kept are mapped back, with whatever lies between them changed
+    out: list[Opcode] = []
+    x = y = 0
+    for tag, alo, ahi, blo, bhi in matched:
+        if tag != "equal":
+            continue
+        for i, j in zip(a_kept[alo:ahi], b_kept[blo:bhi]):
+            if x < i:
+                _emit(out, "delete", x, i, y, y)
+            if y < j:
+                _emit(out, "insert", i, i, y, j)
+            _emit(out, "equal", i, i + 1, j, j + 1)
+            x, y = i + 1, j + 1
+
+    if x < len(a):
+        _emit(out, "delete", x, len(a), y, y)
+    if y < len(b):
+        _emit(out, "insert", len(a), len(a), y, len(b))
+    return out
+
+
+def format_diff(a: Sequence[str], b: Sequence[str], context: int = 3) -> Iterator[str]:
+    """
+    Renders the difference between two lists of lines, one line at a time. Unchanged runs longer
+    than the context on either side of a change are elided.
+
+    Args:
+        a: the old lines.
+        b: the new lines.
+        context: the number of unchanged lines to show around each change.
+    """
+    opcodes = diff_lines(a, b)
+    for position, (tag, alo, ahi, blo, bhi) in enumerate(opcodes):
+        match tag:
+            case "delete":
+                yield from (f"- {line}" for line in a[alo:ahi])
+            case "insert":
+                yield from (f"+ {line}" for line in b[blo:bhi])
+            case _:
+                head = context if position > 0 else 0
+                tail = context if position < len(opcodes) - 1 else 0
+                if ahi - alo <= head + tail:
+                    yield from (f"  {line}" for line in a[alo:ahi])
+                    continue
+
+                yield from (f"  {line}" for line in a[alo:alo + head])
+                yield f"@@ {ahi - alo - head - tail} unchanged lines @@"
+                yield from (f"  {line}" for line in a[ahi - tail:ahi])
+
+
+def _lines(snapshot: Optional[Snapshot]) -> list[str]:
+    if snapshot is None:
+        return []
+
+    try:
+        # Binary content has no lines to speak of, so is summed up in one
+        if snapshot._is_binary():
+            meta = "".join(f"{key} {value}, " for key, value in snapshot._meta.items())
+            return [f"<{meta}{snapshot._size()} bytes, hash {snapshot._hash[:12]}>"]
+        if snapshot._view is None:
+            return (snapshot._content or "").split("\n")
+        return list(snapshot._view.iter_lines())
+    finally:
+        snapshot.close()
+
+
+def _load_lines(path: Path) -> list[str]:
+    return _lines(Snapshot.load_from(path, lazy=True) if path.exists() else None)
+
+
+def diff_snap(new_path: Path, context: int = 3) -> Iterator[str]:
+    """
+    Renders the difference between a new snapshot and the accepted snapshot it would replace.
+    Both are memory mapped and split into lines, which are all held in memory while diffing, as
+    the diff needs to look back and forth through them. Binary content is summed up in a line.
+
+    Args:
+        new_path: the location of the `.snap.new` file.
+        context: the number of unchanged lines to show around each change.
+    """
+    return format_diff(_load_lines(new_path.with_suffix("")), _load_lines(new_path), context)
+
+
+def diff_stored(storage: Storage, test_name: str, snap_name: str, context: int = 3) -> Iterator[str]:
+    """
+    Renders the difference between a new snapshot kept in storage, such as a database, and the
+    accepted snapshot it would replace. See `diff_snap`.
+
+    Args:
+        storage: the storage keeping the snapshots.
+        test_name: the name of the test the snapshot belongs to.
+        snap_name: the name of the snapshot.
+        context: the number of unchanged lines to show around each change.
+    """
+    old = _lines(storage.snapshot_of(test_name, snap_name))
+    new = _lines(storage.snapshot_of(test_name, snap_name, new=True))
+    return format_diff(old, new, context)
+
+
+def _selected(test_name: str, snap_name: str, tests: set[str], patterns: list[str]) -> bool:
+    # Parametrized tests are named `<function>[<case>]`, and can be picked out by either
+    if not tests and not patterns:
+        return True
+    return test_name in tests or test_name.split("[")[0] in tests or any(
+        fnmatchcase(f"{test_name}/{snap_name}", pattern) for pattern in patterns
+    )
+
+
+def find_new_snaps(
+    directory: Path, tests: Iterable[str] = (), patterns: Iterable[str] = ()
+) -> list[Path]:
+    """
+    Finds the new snapshots under a directory, optionally narrowed down by test or glob. With
+    both tests and patterns given, snapshots matching either are found.
+
+    Args:
+        directory: the directory to search.
+        tests: the names of tests to find new snapshots for. The function name of a
+            parametrized test finds the new snapshots of every case.
+        patterns: globs matched against `<test>/<snap>`, for example `parser_*/*`.
+    """
+    tests, patterns = set(tests), list(patterns)
+
+    found = []
+    for path in directory.rglob("*.snap.new"):
+        if _selected(path.parent.name, path.name.removesuffix(".snap.new"), tests, patterns):
+            found.append(path)
+
+    return sorted(found)
+
+
+def find_databases(directory: Path) -> list[Path]:
+    """
+    Finds the snapshot databases of suites using the 'sqlite' backend under a directory, whose
+    new snapshots are reviewed through their storage rather than as files.
+    """
+    return sorted(directory.rglob(DATABASE_NAME))
+
+
+def find_stored_snaps(
+    storage: Storage, tests: Iterable[str] = (), patterns: Iterable[str] = ()
+) -> list[tuple[str, str]]:
+    """
+    Finds the new snapshots kept in storage, optionally narrowed down by test or glob, as with
+    `find_new_snaps`.
+
+    Returns:
+        The test and snap name of each new snapshot found.
+    """
+    tests, patterns = set(tests), list(patterns)
+    return [name for name in storage.new_snaps() if _selected(*name, tests, patterns)]
+
+
+def accept(paths: Iterable[Path]) -> int:
+    """
+    Accepts new snapshots, each replacing its accepted snapshot in a single atomic rename.
+
+    Returns:
+        The number of snapshots accepted.
+    """
+    accepted = 0
+    for path in paths:
+        os.replace(path, path.with_suffix(""))
+        accepted = accepted + 1
+    return accepted
+
+
+def reject(paths: Iterable[Path]) -> int:
+    """
+    Rejects new snapshots, deleting them and leaving the accepted snapshots as they are.
+
+    Returns:
+        The number of snapshots rejected.
+    """
+    rejected = 0
+    for path in paths:
+        path.unlink(missing_ok=True)
+        rejected = rejected + 1
+    return rejected
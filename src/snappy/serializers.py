@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+from json.encoder import encode_basestring
+import dataclasses
+from enum import Enum
+from typing import Any, Callable, Mapping, Optional
+
+
+# How to snapshot types that can't be as they are, by type, see `register`
+_serializers: dict[type, Callable[[Any], Any]] = {}
+
+INDENT = "  "
+
+# The most common types are encoded straight away, unless they have a registered serializer
+_SCALARS: dict[type, Callable[[Any], str]] = {
+    type(None): repr, bool: repr, int: repr, float: repr, str: encode_basestring,
+}
+
+
+def register(cls: type, serializer: Callable[[Any], Any]) -> None:
+    """
+    Registers how to snapshot values of a type, and of its subclasses. The serializer turns a
+    value into one that can be snapshot, such as a string, a dict of its fields or an array,
+    which is then encoded as normal. Registered serializers take precedence over the built in
+    encoding of a type.
+
+    Args:
+        cls: the type to serialize.
+        serializer: a function from a value of the type to a value that can be snapshot.
+    """
+    _serializers[cls] = serializer
+
+
+def serialize(value: Any) -> Any:
+    """
+    Applies the serializer registered for a value's type, if there is one.
+    """
+    for cls in type(value).__mro__:
+        if cls in _serializers:
+            return _serializers[cls](value)
+    return value
+
+
+def as_buffer(value: Any) -> Optional[tuple[memoryview, dict[str, str]]]:
+    """
+    Gets the raw bytes of a NumPy array, or of another object supporting the buffer protocol,
+    along with its element type and shape. Contiguous arrays aren't copied.
+
+    Strings and bytes are left alone, as are arrays of Python objects, which have no raw bytes
+    to speak of.
+
+    Args:
+        value: the value to get the bytes of.
+    Returns:
+        A byte view of the value and its `dtype` and `shape`, or None if it has no buffer.
+    """
+    if isinstance(value, (str, bytes, bytearray, memoryview)):
+        return None
+
+    # NumPy arrays are duck typed, so that NumPy needn't be installed
+    if hasattr(value, "dtype") and hasattr(value, "shape") and hasattr(value, "tobytes"):
+        if value.dtype.hasobject:
+            return None
+
+        meta = {"dtype": value.dtype.str, "shape": str(tuple(value.shape))}
+        try:
+            view = memoryview(value)
+        except (TypeError, ValueError):
+            # Some element types, such as dates, can't be exported and have to be copied out
+            return memoryview(value.tobytes()), meta
+
+    else:
+        try:
+            view = memoryview(value)
+        except TypeError:
+            return None
+        meta = {"dtype": view.format, "shape": str(view.shape)}
+
+    if not view.c_contiguous:
+        view = memoryview(view.tobytes())
+    return view.cast("B"), meta
+
+
+def canonical(value: Any) -> str:
+    """
+    Encodes a value as text the same way every time, so that equal values always make equal
+    snapshots: dicts and sets are sorted, and floats are written as the shortest text that
+    reads back as the same float. Containers are laid out one item to a line, so that a
+    change to one item is a change to one line when reviewing.
+
+    Handles None, bools, numbers, strings, bytes, enums, lists, tuples, named tuples, dicts,
+    sets, dataclasses and NumPy arrays, along with any type with a registered serializer.
+
+    Args:
+        value: the value to encode.
+    Raises:
+        TypeError: if the value, or anything in it, can't be encoded.
+        ValueError: if the value contains itself.
+    """
+    out: list[str] = []
+    _encode(value, out, "\n", set())
+    return "".join(out)
+
+
+def _inline(value: Any) -> str:
+    encode = _SCALARS.get(type(value))
+    if encode is not None and type(value) not in _serializers:
+        return encode(value)
+
+    out: list[str] = []
+    _encode(value, out, None, set())
+    return "".join(out)
+
+
+def _encode(value: Any, out: list[str], newline: Optional[str], parents: set[int]) -> None:
+    # Containers are written one item per line, unless `newline` is None in which case they are
+    # written on a single line, as they are when used as dict keys
+    encode = _SCALARS.get(type(value))
+    if encode is not None and type(value) not in _serializers:
+        out.append(encode(value))
+        return
+
+    value = serialize(value)
+
+    if value is None or isinstance(value, bool):
+        out.append(repr(value))
+    elif isinstance(value, str):
+        out.append(encode_basestring(value))
+    elif isinstance(value, Enum):
+        out.append(f"{type(value).__name__}.{value.name}")
+    elif isinstance(value, int):
+        out.append(repr(int(value)))
+    elif isinstance(value, float):
+        out.append(repr(float(value)))
+    elif isinstance(value, complex):
+        out.append(repr(complex(value)))
+    elif isinstance(value, (bytes, bytearray)):
+        out.append(repr(bytes(value)))
+    elif isinstance(value, memoryview) or hasattr(value, "dtype") and hasattr(value, "tolist"):
+        _encode(value.tolist(), out, newline, parents)
+    else:
+        if id(value) in parents:
+            raise ValueError(f"Can't snapshot a `{type(value).__name__}` that contains itself.")
+
+        parents.add(id(value))
+        _encode_container(value, out, newline, parents)
+        parents.discard(id(value))
+
+
+def _encode_container(
+    value: Any, out: list[str], newline: Optional[str], parents: set[int]
+) -> None:
+    name = type(value).__name__
+
+    # Each item is written after its prefix, such as its key or field name. The most common
+    # containers are checked for first.
+    items: list[tuple[str, Any]]
+    if isinstance(value, list):
+        start, end = "[", "]"
+        items = [("", item) for item in value]
+    elif isinstance(value, (dict, Mapping)):
+        start, end = "{", "}"
+        items = sorted(
+            ((f"{_inline(key)}: ", item) for key, item in value.items()),
+            key=lambda item: item[0]
+        )
+    elif isinstance(value, tuple) and hasattr(value, "_fields"):
+        start, end = f"{name}(", ")"
+        items = [(f"{field}=", item) for field, item in zip(value._fields, value)]
+    elif isinstance(value, tuple):
+        start, end = "(", ")"
+        items = [("", item) for item in value]
+    elif isinstance(value, (set, frozenset)):
+        encoded = sorted(((_inline(item), item) for item in value), key=lambda pair: pair[0])
+        items = [("", item) for _, item in encoded]
+        if not items:
+            start, end = f"{name}(", ")"
+        elif isinstance(value, set):
+            start, end = "{", "}"
+        else:
+            start, end = f"{name}({{", "})"
+    elif dataclasses.is_dataclass(value) and not isinstance(value, type):
+        start, end = f"{name}(", ")"
+        items = [
+            (f"{field.name}=", getattr(value, field.name))
+            for field in dataclasses.fields(value) if field.repr
+        ]
+    else:
+        raise TypeError(
+            f"Can't snapshot a `{name}`: register a serializer for it with "
+            f"`snappy.serializers.register`."
+        )
+
+    out.append(start)
+    if newline is None:
+        for position, (prefix, item) in enumerate(items):
+            out.append(", " if position else "")
+            out.append(prefix)
+            _encode(item, out, None, parents)
+
+    elif items:
+        inner = newline + INDENT
+        for prefix, item in items:
+            out.append(inner)
+            out.append(prefix)
+            _encode(item, out, inner, parents)
+            out.append(",")
+        out.append(newline)
+    out.append(end)
@@ -0,0 +1,245 @@
+from __future__ import annotations
+
+import os
+import json
+import hashlib
+from dataclasses import asdict
+from pathlib import Path
+from statistics import median
+from typing import Iterable, Optional
+
+from .test import Test
+from .results import SuiteResults, TestResult
+from .storage import open_storage
+
+
+# Tests that took no measurable time still cost something to run
+MIN_WEIGHT = 0.001
+
+
+def _position(name: str) -> int:
+    # Python's own `hash` differs between processes, so can't be used to agree across machines
+    return int.from_bytes(hashlib.sha256(name.encode("utf-8")).digest()[:8], "big")
+
+
+class Shard:
+    """
+    One of several slices of a test run, so that a run can be split across machines with each
+    running its own shard. Every machine works out the same split, without talking to any other.
+
+    By default tests are spread by a hash of their name, which keeps each test on the same shard
+    from run to run. Given the durations of an earlier run, tests are instead dealt out longest
+    first to whichever shard has the least to do, so that the shards take about as long as each
+    other. Tests without a recorded duration are taken to be of median length.
+    """
+
+
+    def __init__(self,
+        index: int,
+        count: int,
+        durations: Optional[dict[str, float]] = None
+    ) -> None:
+        """
+        Creates a shard.
+
+        Args:
+            index: which shard this is, counting from one.
+            count: the number of shards in all.
+            durations: seconds each test took in an earlier run, by name, to balance shards by.
+        Raises:
+            ValueError: if the index isn't between one and the count.
+        """
+        if not 1 <= index <= count:
+            raise ValueError(f"Shard {index}/{count} doesn't exist: expected 1 to {count}.")
+
+        self._index, self._count = index, count
+        self._durations = durations or {}
+
+        # The work dealt to each shard so far, carried across suites so that they balance overall
+        self._loads = [0.0] * count
+
+
+    @classmethod
+    def parse(cls, text: str, durations: Optional[dict[str, float]] = None) -> Shard:
+        """
+        Creates a shard from text of the form `<index>/<count>`, such as `2/8`.
+
+        Raises:
+            ValueError: if the text isn't of that form, or names a shard that doesn't exist.
+        """
+        index, _, count = text.partition("/")
+        if not (index.isdigit() and count.isdigit()):
+            raise ValueError(f"Can't read shard `{text}`: expected `<index>/<count>`, e.g. `2/8`.")
+        return cls(int(index), int(count), durations)
+
+
+    def select(self, tests: list[Test]) -> list[Test]:
+        """
+        Picks out the tests belonging to this shard, keeping them in order. Weighted shards must
+        be given each suite's tests in the same order on every machine.
+        """
+        if not self._durations:
+            return [test for test in tests if _position(test._name) % self._count == self._index - 1]
+
+        default = median(self._durations.values())
+        weights = {
+            test._name: max(self._durations.get(test._name, default), MIN_WEIGHT) for test in tests
+        }
+
+        chosen = set()
+        for name in sorted(weights, key=lambda name: (-weights[name], _position(name))):
+            shard = min(range(self._count), key=lambda shard: (self._loads[shard], shard))
+            self._loads[shard] += weights[name]
+            if shard == self._index - 1:
+                chosen.add(name)
+
+        return [test for test in tests if test._name in chosen]
+
+
+    def __str__(self) -> str:
+        return f"{self._index}/{self._count}"
+
+
+def save_results(path: Path, suites: Iterable[SuiteResults], shard: Optional[Shard] = None) -> None:
+    """
+    Dumps the results of a test run as JSON, to be merged with those of other shards by
+    `merge_results`. Snapshot directories are recorded relative to the working directory, with
+    the way back to it from the results file, so the results can be merged wherever they and the
+    snapshots they refer to are copied.
+
+    Args:
+        path: the location of the results file.
+        suites: the results of each suite run.
+        shard: the shard that was run, if the run was sharded.
+    """
+    results = {
+        "shard": None if shard is None else [shard._index, shard._count],
+        "root": Path(os.path.relpath(Path.cwd(), path.absolute().parent)).as_posix(),
+        "suites": [
+            {
+                "snapshot_directory": Path(os.path.relpath(suite.snapshot_directory)).as_posix(),
+                "backend": suite.backend,
+                "compression": suite.compression,
+                "results": [asdict(result) for result in suite.results]
+            }
+            for suite in suites
+        ]
+    }
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w") as file:
+        json.dump(results, file, indent=2)
+
+
+def _read(path: Path) -> tuple[Optional[tuple[int, int]], Path, list[SuiteResults]]:
+    # Snapshot directories are left relative to the returned working directory
+    with path.open("r") as file:
+        data = json.load(file)
+
+    try:
+        suites = [
+            SuiteResults(
+                snapshot_directory = Path(suite["snapshot_directory"]),
+                backend = suite["backend"],
+                compression = suite["compression"],
+                results = [TestResult(**result) for result in suite["results"]]
+            )
+            for suite in data["suites"]
+        ]
+        shard = (data["shard"][0], data["shard"][1]) if data["shard"] else None
+        return shard, path.parent / data["root"], suites
+    except (KeyError, TypeError, IndexError) as error:
+        raise ValueError(f"`{path}` isn't a snappy results file.") from error
+
+
+def load_results(path: Path) -> tuple[Optional[tuple[int, int]], list[SuiteResults]]:
+    """
+    Reads the results saved by `save_results`, with snapshot directories resolved against the
+    results file.
+
+    Returns:
+        The index and count of the shard run, or None if the run wasn't sharded, along with the
+        results of each suite.
+    Raises:
+        ValueError: if the file isn't a results file.
+    """
+    shard, root, suites = _read(path)
+    for suite in suites:
+        suite.snapshot_directory = root / suite.snapshot_directory
+    return shard, suites
+
+
+def load_durations(path: Path) -> dict[str, float]:
+    """
+    Reads how long each test took from a results file, to balance shards by.
+    """
+    _, suites = load_results(path)
+    return {result.name: result.wall_time for suite in suites for result in suite.results}
+
+
+def merge_results(paths: Iterable[Path], directory: Optional[Path] = None) -> list[SuiteResults]:
+    """
+    Combines the results of every shard of a run. The new snapshots made on each shard are
+    copied from beside its results file into the snapshot directories under `directory`, ready
+    to be reviewed as if the run had happened there.
+
+    Args:
+        paths: the results file of each shard.
+        directory: the working directory the run was made from, by default the current one.
+    Returns:
+        The results of each suite, with the results of every shard of it together.
+    Raises:
+        ValueError: if the files are from runs split different ways, if any shard is missing or
+            given twice, or if a new snapshot is missing.
+    """
+    directory = directory or Path.cwd()
+
+    loaded: dict[int, Path] = {}
+    count = None
+    for path in paths:
+        index, shard_count = _read(path)[0] or (1, 1)
+        if count is not None and shard_count != count:
+            raise ValueError(f"Can't merge runs split {count} ways with one split {shard_count} ways.")
+        if index in loaded:
+            raise ValueError(f"Shard {index}/{shard_count} is given more than once.")
+        count = shard_count
+        loaded[index] = path
+
+    missing = [str(index) for index in range(1, (count or 0) + 1) if index not in loaded]
+    if missing:
+        raise ValueError(f"Missing results for shards {', '.join(missing)} of {count}.")
+
+    merged: dict[tuple, SuiteResults] = {}
+    for index in sorted(loaded):
+        _, root, suites = _read(loaded[index])
+        for suite in suites:
+            target = directory / suite.snapshot_directory
+            _copy_new_snaps(suite, root / suite.snapshot_directory, target)
+
+            key = (suite.snapshot_directory, suite.backend, suite.compression)
+            if key not in merged:
+                merged[key] = SuiteResults(target, suite.backend, suite.compression)
+            merged[key].results.extend(suite.results)
+
+    return list(merged.values())
+
+
+def _copy_new_snaps(suite: SuiteResults, source: Path, target: Path) -> None:
+    # Shards that ran where they are being merged have nothing to copy
+    if source.resolve() == target.resolve():
+        return
+
+    tests = [result for result in suite.results if result.new_snaps]
+    if not tests:
+        return
+
+    source_storage = open_storage(source, suite.compression, suite.backend)
+    target_storage = open_storage(target, suite.compression, suite.backend)
+    for result in tests:
+        for snap in result.new_snaps:
+            snapshot = source_storage.snapshot_of(result.name, snap, new=True)
+            if snapshot is None:
+                raise ValueError(f"New snap `{result.name}/{snap}` is missing from `{source}`.")
+            target_storage.save(snapshot, new=True)
+
+    target_storage.flush()
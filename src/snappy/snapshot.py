@@ -1,16 +1,101 @@
 from __future__ import annotations
 
 from pathlib import Path
-from typing import Optional, TextIO
+from typing import IO, Any, Iterable, Iterator, Optional, Union
 from datetime import datetime, timezone
-from hashlib import sha256
+from tempfile import SpooledTemporaryFile
+import os
+import mmap
+import time
+import codecs
 
+from .objects import ObjectStore, read_object
+from .content import ContentView
+from .hashing import DEFAULT_ALGORITHM, hasher, qualify, split
 
-def _hash_content(content: str) -> str:
-    return sha256(content.encode("utf-8")).hexdigest()
 
+# Anything `Test.snap` can capture: a string, a stream of string / bytes chunks, an array, or
+# any other value with a serializer, see `serializers.canonical`.
+Capturable = Union[str, bytes, Iterable[Union[str, bytes]], IO, Any]
 
-def _load_snapshot(file: TextIO, load_content: bool) -> dict[str, str]:
+# Streamed content is held in memory up to this size, and spills over to a temporary file after.
+SPOOL_SIZE = 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+
+# Any other header keys describe the content, such as the `dtype` and `shape` of an array or
+# the `content-type` of bytes
+HEADER_KEYS = ("test", "snap", "hash", "algorithm", "date", "length", "blob", "content")
+
+# Bytes are snapped as this unless given a content type of their own
+OCTET_STREAM = "application/octet-stream"
+
+
+def _hash_content(content: str, algorithm: str = DEFAULT_ALGORITHM) -> str:
+    return qualify(algorithm, hasher(algorithm, content.encode("utf-8")).hexdigest())
+
+
+def _hash_buffer(
+    buffer: memoryview, meta: dict[str, str], algorithm: str = DEFAULT_ALGORITHM
+) -> str:
+    # What the bytes mean is hashed along with them, so that equal bytes with a different type or
+    # shape don't make a match
+    hashing = hasher(algorithm, _meta_text(meta).encode("utf-8"))
+    hashing.update(buffer)
+    return qualify(algorithm, hashing.hexdigest())
+
+
+def _meta_text(meta: dict[str, str]) -> str:
+    return "".join(f"{key}: {value}\n" for key, value in sorted(meta.items()))
+
+
+def _hash_of(data: dict[str, str]) -> str:
+    return qualify(data.get("algorithm", DEFAULT_ALGORITHM), data["hash"])
+
+
+def _meta_of(data: dict[str, str]) -> dict[str, str]:
+    return {key: value for key, value in data.items() if key not in HEADER_KEYS}
+
+
+def _is_binary_data(data: dict[str, str]) -> bool:
+    # Arrays and bytes are stored as they are, and never read as text
+    return "dtype" in data or "content-type" in data
+
+
+def _read_binary(file: IO[bytes], data: dict[str, str]) -> memoryview:
+    # Reads the content following a binary snapshot's header. Its length is given in the header,
+    # so the content is read straight into place, rather than looked through for the delimiter.
+    if "length" not in data:
+        raise ValueError("Poorly Formatted snapshot file.")
+
+    length = int(data["length"])
+    if length != os.fstat(file.fileno()).st_size - file.tell() - 4:
+        raise ValueError("Poorly Formatted snapshot file.")
+
+    content = bytearray(length)
+    if file.readinto(content) != length or file.read() != b"\n---":
+        raise ValueError("Poorly Formatted snapshot file.")
+    return memoryview(content)
+
+
+def _encode_chunks(content: Capturable) -> Iterator[tuple[bytes, bool]]:
+    # Yields each chunk as bytes, along with whether it was text to begin with. Bytes are
+    # themselves iterable, so need catching before the generic iterable case.
+    if isinstance(content, str):
+        yield content.encode("utf-8"), True
+
+    elif isinstance(content, (bytes, bytearray, memoryview)):
+        yield bytes(content), False
+
+    elif hasattr(content, "read"):
+        while chunk := content.read(CHUNK_SIZE):
+            yield (chunk.encode("utf-8"), True) if isinstance(chunk, str) else (chunk, False)
+
+    else:
+        for chunk in content:
+            yield (chunk.encode("utf-8"), True) if isinstance(chunk, str) else (bytes(chunk), False)
+
+
+def _load_snapshot(file: Iterable[str], load_content: bool) -> dict[str, str]:
     data = {}
     state = "start"
     content = []
@@ -26,18 +111,20 @@ def _load_snapshot(file: TextIO, load_content: bool) -> dict[str, str]:
             case "header":
                 line = line.rstrip()
                 if line == '---':
-                    if not load_content:
+                    # Binary content isn't read as text, see `Snapshot.load_from`
+                    if not load_content or _is_binary_data(data):
                         return data
                     else:
                         state = "content"
                         continue
 
-                key, value = line.split(": ")
+                key, value = line.split(": ", 1)
                 data[key] = value
 
             case "content":
                 if line == '---':
-                    # Need to remove hash so __init__ doesn't get angry.
+                    # Need to remove hash so __init__ doesn't get angry. The content is hashed
+                    # again with the algorithm the header names.
                     data.pop("hash")
                     data["content"] = ( ''.join(content) ).removesuffix('\n')
                     return data
@@ -57,12 +144,20 @@ class Snapshot:
     filepath.
     """
 
+    # Suites can create a great many snapshots, so they are kept compact
+    __slots__ = (
+        "_test", "_snap", "_timestamp", "_date_text", "_content", "_hash", "_meta",
+        "_spool", "_view", "_buffer"
+    )
+
 
     def __init__(self,
         test_name: str, snap_name: str,
         content: Optional[str] = None,
         hash: Optional[str] = None,
-        date: Optional[str] = None
+        date: Optional[str] = None,
+        meta: Optional[dict[str, str]] = None,
+        algorithm: str = DEFAULT_ALGORITHM
     ) -> None:
         """
         Avoid using this initializer. Prefer instead to use `Snapshot.new` or
@@ -75,30 +170,61 @@ class Snapshot:
             test_name: the name of the test creating the snapshot.
             snap_name: the name associated with the snapshot.
             content: the value to be stored as the body of the snapshot.
-            hash: sha256 representation of content.
+            hash: the hash of the content, see `hashing.qualify`.
             date: the date of creation, defaulting to the current time.
+            meta: any other header fields describing the content, such as the `dtype` and
+                `shape` of an array.
+            algorithm: the algorithm to hash `content` with, see `hashing.HASH_ALGORITHMS`.
         Raises:
-            ValueError: if an incorrect combination of `hash` and `content` is provided.
+            ValueError: if an incorrect combination of `hash` and `content` is provided, or the
+                hash algorithm is unknown.
         """
         self._test, self._snap = test_name, snap_name
-        self._date = date or datetime.now(timezone.utc).isoformat()
+        self._meta = meta or {}
+
+        # Formatting the date is put off until it's needed, which usually it won't be
+        self._timestamp = time.time()
+        self._date_text = date
 
         # We need exactly one of hash or content, anything else is a mistake
         if (hash is None) == (content is None):
-            message = "both" if content else "none"
+            message = "both" if content is not None else "none"
             raise ValueError(f"Expected exactly one of either `content` or `hash`: got {message}.")
 
-        elif content:
+        elif content is not None:
             self._content = content
-            self._hash = _hash_content(content)
+            self._hash = _hash_content(content, algorithm)
 
         else:
             self._content = None
             self._hash = hash
 
+        # Only set for streamed snapshots, see `Snapshot.stream`
+        self._spool: Optional[IO[bytes]] = None
+
+        # Only set for lazily loaded snapshots, see `Snapshot.load_from`
+        self._view: Optional[ContentView] = None
+
+        # Only set for binary snapshots, see `Snapshot.array`
+        self._buffer: Optional[memoryview] = None
+
+
+    @property
+    def _date(self) -> str:
+        if self._date_text is None:
+            self._date_text = datetime.fromtimestamp(self._timestamp, timezone.utc).isoformat()
+        return self._date_text
+
+
+    @_date.setter
+    def _date(self, date: str) -> None:
+        self._date_text = date
+
 
     @classmethod
-    def new(cls, test_name: str, snap_name: str, content: str) -> Snapshot:
+    def new(cls,
+        test_name: str, snap_name: str, content: str, algorithm: str = DEFAULT_ALGORITHM
+    ) -> Snapshot:
         """
         Constructs a new snapshot.
 
@@ -106,47 +232,318 @@ class Snapshot:
             test_name: the name of the test creating the snapshot.
             snap_name: the name associated with the snapshot.
             content: the value to be stored as the body of the snapshot.
+            algorithm: the algorithm to hash the content with.
+        """
+        return cls(test_name, snap_name, content, algorithm=algorithm)
+
+
+    @classmethod
+    def stream(cls,
+        test_name: str, snap_name: str, content: Capturable, algorithm: str = DEFAULT_ALGORITHM
+    ) -> Snapshot:
+        """
+        Constructs a new snapshot from content that may be too large to hold in memory, such as a
+        generator of chunks or an open file. The content is hashed as it is read and spooled
+        aside, in memory while small and on disk once large, so it can still be saved if needed.
+
+        Bytes that aren't UTF-8 text, such as an image file opened in binary mode, are saved as
+        binary, see `Snapshot.binary`, so that they're never read back as text. They hash the
+        same either way.
+
+        Call `close` once finished with the snapshot to release the spooled content.
+
+        Args:
+            test_name: the name of the test creating the snapshot.
+            snap_name: the name associated with the snapshot.
+            content: a string, bytes, iterable of string or bytes chunks, or file-like object.
+            algorithm: the algorithm to hash the content with.
+        """
+        hashing = hasher(algorithm)
+        spool = SpooledTemporaryFile(max_size=SPOOL_SIZE)
+
+        # Encoded strings are text already, so only once bytes turn up does what follows need
+        # decoding to check it still is
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        text, checking = True, False
+        for chunk, encoded in _encode_chunks(content):
+            hashing.update(chunk)
+            spool.write(chunk)
+
+            checking = checking or not encoded
+            if text and checking:
+                try:
+                    decoder.decode(chunk)
+                except UnicodeDecodeError:
+                    text = False
+
+        if text and checking:
+            try:
+                decoder.decode(b"", final=True)
+            except UnicodeDecodeError:
+                text = False
+
+        snapshot = cls(
+            test_name, snap_name,
+            hash = qualify(algorithm, hashing.hexdigest()),
+            meta = None if text else {"content-type": OCTET_STREAM}
+        )
+        snapshot._spool = spool
+        return snapshot
+
+
+    @classmethod
+    def array(cls,
+        test_name: str, snap_name: str, buffer: memoryview, meta: dict[str, str],
+        algorithm: str = DEFAULT_ALGORITHM
+    ) -> Snapshot:
+        """
+        Constructs a new snapshot of the raw bytes of an array, such as a NumPy array. The bytes
+        are hashed where they are, along with the meta data saying what they mean, and are only
+        copied if the snapshot is saved.
+
+        The snapshot holds on to the buffer, so the array shouldn't be changed until the snapshot
+        is saved or closed. Storage copies the bytes before saving them in the background, see
+        `_detach`. See `serializers.as_buffer` for getting the buffer and meta data of an array.
+
+        Args:
+            test_name: the name of the test creating the snapshot.
+            snap_name: the name associated with the snapshot.
+            buffer: the bytes of the array.
+            meta: the `dtype` and `shape` of the array, kept in the snapshot header.
+            algorithm: the algorithm to hash the bytes with.
         """
-        return cls(test_name, snap_name, content)
+        snapshot = cls(test_name, snap_name, hash=_hash_buffer(buffer, meta, algorithm), meta=meta)
+        snapshot._buffer = buffer
+        return snapshot
 
 
     @classmethod
-    def load_from(cls, path: Path, load_content: bool = False) -> Snapshot:
+    def binary(cls,
+        test_name: str, snap_name: str,
+        content: bytes | bytearray | memoryview,
+        content_type: str = OCTET_STREAM,
+        algorithm: str = DEFAULT_ALGORITHM
+    ) -> Snapshot:
         """
-        Loads an existing snapshot from a file path.
+        Constructs a new snapshot of raw bytes, such as a rendered image or an encoded message.
+        The bytes are hashed where they are, and saved as they are, without being encoded.
+
+        Only the bytes are hashed, and not their content type, so they hash the same as they
+        would streamed. The snapshot holds on to the content until it is closed, so mutable
+        content shouldn't be changed until the snapshot is saved, as with `Snapshot.array`.
+
+        Args:
+            test_name: the name of the test creating the snapshot.
+            snap_name: the name associated with the snapshot.
+            content: the bytes to snap.
+            content_type: the media type of the bytes, kept in the snapshot header.
+            algorithm: the algorithm to hash the bytes with.
+        """
+        buffer = memoryview(content)
+        if not buffer.c_contiguous:
+            buffer = memoryview(buffer.tobytes())
+        buffer = buffer.cast("B")
+
+        snapshot = cls(
+            test_name, snap_name,
+            hash = qualify(algorithm, hasher(algorithm, buffer).hexdigest()),
+            meta = {"content-type": content_type}
+        )
+        snapshot._buffer = buffer
+        return snapshot
+
+
+    def _detach(self) -> None:
+        # Copies a buffer its owner could still change, so the snapshot can outlive the test that
+        # made it, e.g. on a background writer. Immutable bytes are kept as they are.
+        if self._buffer is not None and not isinstance(self._buffer.obj, bytes):
+            self._buffer = memoryview(self._buffer.tobytes())
+
+
+    def _is_binary(self) -> bool:
+        return _is_binary_data(self._meta)
+
+
+    def _rehash(self, algorithm: str) -> str:
+        # The hash the content would have with another algorithm, for comparing against
+        # snapshots saved with it. Only snapshots holding their content can be rehashed.
+        meta = _meta_text(self._meta).encode("utf-8") if "dtype" in self._meta else b""
+        hashing = hasher(algorithm, meta)
+        for chunk in self._chunks():
+            hashing.update(chunk)
+        return qualify(algorithm, hashing.hexdigest())
+
+
+    @classmethod
+    def load_from(cls, path: Path, load_content: bool = False, lazy: bool = False) -> Snapshot:
+        """
+        Loads an existing snapshot from a file path. Snapshots whose content lives in an object
+        store have it read and decompressed from there.
 
         Args:
             path: the location of the snapshot file.
             load_content: flag that determines if file content will be loaded, or just the hash.
+            lazy: flag that maps the content into memory rather than loading it, exposing it as a
+                `ContentView` in `_view`. Takes precedence over `load_content`. Call `close`
+                once finished with the snapshot to release the mapping.
+        Raises:
+            ValueError: if the snapshot file is poorly formatted.
         """
-        with path.open("r") as file:
-            data = _load_snapshot(file, load_content)
+        if lazy:
+            return cls._load_lazily(path)
+
+        # Lines are only decoded as they are needed, so binary content is never decoded as text
+        with path.open("rb") as file:
+            lines = (line.decode("utf-8") for line in iter(file.readline, b""))
+            data = _load_snapshot(lines, load_content)
+
+            buffer = None
+            if load_content and _is_binary_data(data):
+                if "blob" in data:
+                    buffer = memoryview(read_object(path.parent / data["blob"]))
+                else:
+                    buffer = _read_binary(file, data)
+
+        if buffer is not None:
+            snapshot = cls(
+                test_name = data["test"],
+                snap_name = data["snap"],
+                hash = _hash_of(data),
+                date = data["date"],
+                meta = _meta_of(data)
+            )
+            snapshot._buffer = buffer
+            return snapshot
+
+        if "blob" in data and "content" in data:
+            data["content"] = read_object(path.parent / data["blob"]).decode("utf-8")
 
         if "content" in data:
             return cls(
                 test_name = data["test"],
                 snap_name = data["snap"],
                 content = data["content"],
-                date = data["date"]
+                date = data["date"],
+                algorithm = data.get("algorithm", DEFAULT_ALGORITHM)
             )
 
         else:
             return cls(
                 test_name = data["test"],
                 snap_name = data["snap"],
-                hash = data["hash"],
-                date = data["date"]
+                hash = _hash_of(data),
+                date = data["date"],
+                meta = _meta_of(data)
             )
 
 
-    def save_to(self, path: Path) -> None:
+    @classmethod
+    def _load_lazily(cls, path: Path) -> Snapshot:
+        with path.open("rb") as file:
+            # Lines are read one at a time so that the file position lands just past the header
+            lines = (line.decode("utf-8") for line in iter(file.readline, b""))
+            data = _load_snapshot(lines, load_content=False)
+            start = file.tell()
+
+            if "blob" in data:
+                buffer = read_object(path.parent / data["blob"])
+                view = ContentView(buffer)
+            else:
+                if _is_binary_data(data) and "length" not in data:
+                    raise ValueError("Poorly Formatted snapshot file.")
+
+                # Binary content gives its length, text runs up to the closing delimiter
+                buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                end = start + int(data["length"]) if "length" in data else len(buffer) - 4
+                if buffer[end:] != b"\n---":
+                    buffer.close()
+                    raise ValueError("Poorly Formatted snapshot file.")
+                view = ContentView(buffer, start, end)
+
+        snapshot = cls(
+            test_name = data["test"],
+            snap_name = data["snap"],
+            hash = _hash_of(data),
+            date = data["date"],
+            meta = _meta_of(data)
+        )
+        snapshot._view = view
+        return snapshot
+
+
+    def save_to(self, path: Path, objects: Optional[ObjectStore] = None) -> None:
         """
         Saves a snapshot to a file path.
 
         Args:
             path: the location to store the snapshot.
+            objects: an object store to keep the content in. If given, the snapshot file holds
+                only the header and a reference to the stored object.
         """
-        path.write_text(str(self))
+        with path.open("wb") as file:
+            self._write(file, path, objects)
+
+
+    def _write(self, file: IO[bytes], path: Path, objects: Optional[ObjectStore] = None) -> None:
+        # Writes the snapshot into an open file, which will end up at `path`. Content is always
+        # copied across a chunk at a time, so streamed or mapped content is never joined up.
+        if objects is not None:
+            blob = objects.put(self._hash, self._chunks())
+            reference = Path(os.path.relpath(blob, path.parent)).as_posix()
+            file.write(f"{self._header(blob=reference)}---".encode("utf-8"))
+            return
+
+        file.write(self._header().encode("utf-8"))
+        for chunk in self._chunks():
+            file.write(chunk)
+        file.write(b"\n---")
+
+
+    def _size(self) -> int:
+        # Roughly how many bytes of content the snapshot is holding on to
+        if self._buffer is not None:
+            return self._buffer.nbytes
+        if self._spool is not None:
+            return self._spool.seek(0, os.SEEK_END)
+        if self._view is not None:
+            return len(self._view)
+        return len(self._content or "")
+
+
+    def _chunks(self) -> Iterator[bytes]:
+        if self._buffer is not None:
+            for start in range(0, self._buffer.nbytes, CHUNK_SIZE):
+                yield self._buffer[start:start + CHUNK_SIZE]
+            return
+
+        if self._view is not None:
+            for start in range(0, len(self._view), CHUNK_SIZE):
+                yield self._view.tobytes(start, start + CHUNK_SIZE)
+            return
+
+        if self._spool is None:
+            yield (self._content or "").encode("utf-8")
+            return
+
+        self._spool.seek(0)
+        while chunk := self._spool.read(CHUNK_SIZE):
+            yield chunk
+
+
+    def close(self) -> None:
+        """
+        Releases any content spooled by `Snapshot.stream`, mapped by a lazy `Snapshot.load_from`
+        or held on to by `Snapshot.array`. Does nothing for other snapshots.
+        """
+        self._buffer = None
+
+        if self._spool is not None:
+            self._spool.close()
+            self._spool = None
+
+        if self._view is not None:
+            self._view.close()
+            self._view = None
 
 
     def __eq__(self, value: object, /) -> bool:
@@ -155,15 +552,32 @@ class Snapshot:
         return self._hash == value._hash
 
 
-    def __str__(self) -> str:
+    def _header(self, blob: Optional[str] = None) -> str:
+        # Snapshots hashed with the default algorithm don't name it, as before it could be chosen
+        algorithm, digest = split(self._hash)
         return '\n'.join([
             f"---",
             f"test: {self._test}",
             f"snap: {self._snap}",
-            f"hash: {self._hash}",
+            f"hash: {digest}",
+            *([f"algorithm: {algorithm}"] if algorithm != DEFAULT_ALGORITHM else []),
             f"date: {self._date}",
+            *(f"{key}: {value}" for key, value in self._meta.items()),
+            *([f"length: {self._size()}"] if self._is_binary() else []),
+            *([f"blob: {blob}"] if blob else []),
             f"---",
-            f"{self._content}",
-            f"---",
+            f"",
         ])
 
+
+    def __str__(self) -> str:
+        content = self._content
+        if self._is_binary():
+            content = f"<{self._size()} bytes>"
+        elif self._view is not None:
+            content = str(self._view)
+        elif self._spool is not None:
+            self._spool.seek(0)
+            content = self._spool.read().decode("utf-8")
+        return f"{self._header()}{content}\n---"
+
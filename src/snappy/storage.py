@@ -0,0 +1,578 @@
+from __future__ import annotations
+
+import os
+import json
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from .snapshot import SPOOL_SIZE, Snapshot, _is_binary_data
+from .hashing import split
+from .index import SnapshotIndex
+from .objects import ObjectStore, OBJECTS_DIR
+from .writer import SnapshotWriter, write_atomically
+
+
+DATABASE_NAME = "snapshots.db"
+
+
+class Storage(ABC):
+    """
+    A place snapshots are kept. Each test and snap name has at most one accepted snapshot, and at
+    most one new snapshot waiting to be reviewed.
+
+    Storage is loaded once at the start of a test run and flushed at the end, so backends are
+    free to cache reads and batch writes in between.
+    """
+
+
+    def load(self) -> None:
+        """
+        Reads in any state needed before a test run. Does nothing by default.
+        """
+
+
+    def flush(self) -> None:
+        """
+        Persists anything batched up during a test run. Does nothing by default.
+        """
+
+
+    def pop_changes(self) -> Any:
+        """
+        Returns changes made since the last call, so a worker process can hand them back to the
+        parent's copy of the storage with `merge_changes`.
+        """
+        return None
+
+
+    def merge_changes(self, changes: Any) -> None:
+        """
+        Applies changes made to a copy of the storage in a worker process.
+
+        Args:
+            changes: as returned by `pop_changes`.
+        """
+
+
+    @abstractmethod
+    def hash_of(self, test_name: str, snap_name: str) -> Optional[str]:
+        """
+        Finds the hash of an accepted snapshot.
+
+        Args:
+            test_name: the name of the test the snapshot belongs to.
+            snap_name: the name of the snapshot.
+        Returns:
+            The hash of the snapshot, or None if there is no accepted snapshot.
+        """
+
+
+    @abstractmethod
+    def snapshot_of(self, test_name: str, snap_name: str, new: bool = False) -> Optional[Snapshot]:
+        """
+        Loads a stored snapshot along with its content.
+
+        Args:
+            test_name: the name of the test the snapshot belongs to.
+            snap_name: the name of the snapshot.
+            new: whether to load the new snapshot waiting for review, rather than the accepted one.
+        Returns:
+            The snapshot, or None if there is no such snapshot.
+        """
+
+
+    @abstractmethod
+    def save(self, snapshot: Snapshot, new: bool = True) -> None:
+        """
+        Stores a snapshot, replacing any existing one. The storage takes ownership of the
+        snapshot, and closes it once it has been stored.
+
+        Args:
+            snapshot: the snapshot to store.
+            new: whether the snapshot is new and waiting for review, or already accepted.
+        """
+
+
+    @abstractmethod
+    def snapshots(self) -> Iterator[tuple[Snapshot, bool]]:
+        """
+        Yields every stored snapshot with its content loaded, along with whether it is new.
+        """
+
+
+    @abstractmethod
+    def new_snaps(self) -> list[tuple[str, str]]:
+        """
+        Finds the test and snap name of every new snapshot waiting to be reviewed, in order.
+        """
+
+
+    @abstractmethod
+    def accept(self, names: Iterable[tuple[str, str]]) -> int:
+        """
+        Accepts new snapshots, each replacing its accepted snapshot, if any, in a single step.
+
+        Args:
+            names: the test and snap name of each new snapshot to accept.
+        Returns:
+            The number of snapshots accepted.
+        """
+
+
+    @abstractmethod
+    def reject(self, names: Iterable[tuple[str, str]]) -> int:
+        """
+        Rejects new snapshots, removing them and leaving the accepted snapshots as they are.
+        Names without a new snapshot are passed over.
+
+        Args:
+            names: the test and snap name of each new snapshot to reject.
+        Returns:
+            The number of snapshots rejected.
+        """
+
+
+    @abstractmethod
+    def prune(self, keep: Callable[[str, str], bool], dry_run: bool = False) -> list[str]:
+        """
+        Removes every snapshot, accepted or new, that isn't to be kept.
+
+        Args:
+            keep: called with each test and snap name, returning whether to keep its snapshots.
+            dry_run: only find the snapshots that would be removed, leaving them in place.
+        Returns:
+            A description of each snapshot removed, e.g. `test/snap.snap`.
+        """
+
+
+class DirectoryStorage(Storage):
+    """
+    Stores each snapshot as its own file, at `<directory>/<test>/<snap>.snap`. New snapshots
+    use the `.snap.new` extension until they are reviewed. Files are always written to a
+    temporary file first and renamed into place, so are never left half written. Directories
+    are only created once a snapshot needs saving in them.
+    """
+
+
+    def __init__(self,
+        directory: Path,
+        index: Optional[SnapshotIndex] = None,
+        objects: Optional[ObjectStore] = None,
+        writer: Optional[SnapshotWriter] = None
+    ) -> None:
+        """
+        Creates directory storage.
+
+        Args:
+            directory: the root directory snapshots are stored in.
+            index: an index used to look up accepted snapshots without reading them.
+            objects: an object store to keep snapshot content in, see `ObjectStore`.
+            writer: a writer to save snapshots in the background with, until the storage is
+                flushed. By default snapshots are saved straight away.
+        """
+        self._directory = directory
+        self._index = index
+        self._objects = objects
+        self._writer = writer
+
+
+    def path_of(self, test_name: str, snap_name: str, new: bool = False) -> Path:
+        """
+        The location of a snapshot file.
+        """
+        return self._directory / test_name / (f"{snap_name}.snap.new" if new else f"{snap_name}.snap")
+
+
+    def load(self) -> None:
+        if self._index is not None:
+            self._index.load()
+
+
+    def flush(self) -> None:
+        if self._writer is not None:
+            self._writer.flush()
+        if self._index is not None:
+            self._index.save()
+
+
+    def pop_changes(self) -> Any:
+        return self._index.pop_changes() if self._index is not None else None
+
+
+    def merge_changes(self, changes: Any) -> None:
+        if self._index is not None and changes:
+            self._index.merge(changes)
+
+
+    def hash_of(self, test_name: str, snap_name: str) -> Optional[str]:
+        path = self.path_of(test_name, snap_name)
+
+        if self._index is not None:
+            return self._index.hash_of(test_name, snap_name, path)
+        elif path.exists():
+            return Snapshot.load_from(path)._hash
+        else:
+            return None
+
+
+    def snapshot_of(self, test_name: str, snap_name: str, new: bool = False) -> Optional[Snapshot]:
+        path = self.path_of(test_name, snap_name, new)
+        return Snapshot.load_from(path, load_content=True) if path.exists() else None
+
+
+    def save(self, snapshot: Snapshot, new: bool = True) -> None:
+        path = self.path_of(snapshot._test, snapshot._snap, new)
+        if self._writer is not None:
+            # The test carries on once the snapshot is queued, and may change what it snapped
+            snapshot._detach()
+            self._writer.submit(snapshot, path, self._objects)
+            return
+
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            write_atomically(snapshot, path, self._objects)
+        finally:
+            snapshot.close()
+
+
+    def snapshots(self) -> Iterator[tuple[Snapshot, bool]]:
+        for path in sorted(self._directory.rglob("*.snap*")):
+            if path.relative_to(self._directory).parts[0] == OBJECTS_DIR:
+                continue
+
+            if path.name.endswith(".snap"):
+                yield Snapshot.load_from(path, load_content=True), False
+            elif path.name.endswith(".snap.new"):
+                yield Snapshot.load_from(path, load_content=True), True
+
+
+    def new_snaps(self) -> list[tuple[str, str]]:
+        found = []
+        for path in self._directory.glob("*/*.snap.new"):
+            if path.parent.name != OBJECTS_DIR:
+                found.append((path.parent.name, path.name.removesuffix(".snap.new")))
+        return sorted(found)
+
+
+    def accept(self, names: Iterable[tuple[str, str]]) -> int:
+        accepted = 0
+        for test_name, snap_name in names:
+            os.replace(self.path_of(test_name, snap_name, True), self.path_of(test_name, snap_name))
+            if self._index is not None:
+                self._index._update(f"{test_name}/{snap_name}", None)
+            accepted = accepted + 1
+        return accepted
+
+
+    def reject(self, names: Iterable[tuple[str, str]]) -> int:
+        rejected = 0
+        for test_name, snap_name in names:
+            self.path_of(test_name, snap_name, new=True).unlink(missing_ok=True)
+            rejected = rejected + 1
+        return rejected
+
+
+    def prune(self, keep: Callable[[str, str], bool], dry_run: bool = False) -> list[str]:
+        """
+        Removes snapshot files that aren't to be kept, along with test directories left empty,
+        in a single pass over the snapshot directory. Files other than snapshots are left alone,
+        as are the object store and the suite's own records at the top of the directory.
+        """
+        removed = []
+        try:
+            tests = os.scandir(self._directory)
+        except FileNotFoundError:
+            return removed
+
+        with tests:
+            for test in tests:
+                if test.name == OBJECTS_DIR or not test.is_dir(follow_symlinks=False):
+                    continue
+
+                remaining = 0
+                with os.scandir(test.path) as files:
+                    for file in files:
+                        if file.name.endswith(".snap"):
+                            snap, new = file.name.removesuffix(".snap"), False
+                        elif file.name.endswith(".snap.new"):
+                            snap, new = file.name.removesuffix(".snap.new"), True
+                        else:
+                            remaining = remaining + 1
+                            continue
+
+                        if keep(test.name, snap):
+                            remaining = remaining + 1
+                            continue
+
+                        removed.append(f"{test.name}/{file.name}")
+                        if not dry_run:
+                            os.unlink(file.path)
+                            if not new and self._index is not None:
+                                self._index._update(f"{test.name}/{snap}", None)
+
+                if remaining == 0:
+                    removed.append(f"{test.name}/")
+                    if not dry_run:
+                        os.rmdir(test.path)
+
+        return sorted(removed)
+
+
+    def __getstate__(self) -> dict:
+        # The writer's thread stays behind in the parent, so worker processes save directly
+        return {**self.__dict__, "_writer": None}
+
+
+# Worker processes each keep one connection per database, see `SqliteStorage.__reduce__`
+_worker_databases: dict[Path, SqliteStorage] = {}
+
+
+def _shared_database(path: Path) -> SqliteStorage:
+    if path not in _worker_databases:
+        _worker_databases[path] = SqliteStorage(path)
+    return _worker_databases[path]
+
+
+def _from_row(
+    test: str, snap: str, new: int, hash: str, date: str, content: bytes, meta: str
+) -> tuple[Snapshot, bool]:
+    data = json.loads(meta)
+    if _is_binary_data(data):
+        snapshot = Snapshot(test, snap, hash=hash, date=date, meta=data)
+        snapshot._buffer = memoryview(content)
+    else:
+        algorithm, _ = split(hash)
+        snapshot = Snapshot(test, snap, content=content.decode("utf-8"), date=date, algorithm=algorithm)
+    return snapshot, bool(new)
+
+
+class SqliteStorage(Storage):
+    """
+    Stores every snapshot in a single SQLite database, which stays fast where a directory of
+    hundreds of thousands of small files would not. The database runs in WAL mode, and writes are
+    batched up and committed in a single transaction when the storage is flushed. Snapshots too
+    large to hold on to, such as long streams, are instead copied into the database as they are
+    saved.
+    """
+
+
+    def __init__(self, path: Path) -> None:
+        """
+        Creates SQLite storage. The database is created when it is first used.
+
+        Args:
+            path: the location of the database file.
+        """
+        self._path = path
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._pending: list[tuple] = []
+
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self._path, timeout=60, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS snapshots (
+                    test    TEXT    NOT NULL,
+                    snap    TEXT    NOT NULL,
+                    new     INTEGER NOT NULL,
+                    hash    TEXT    NOT NULL,
+                    date    TEXT    NOT NULL,
+                    content BLOB    NOT NULL,
+                    meta    TEXT    NOT NULL,
+                    PRIMARY KEY (test, snap, new)
+                )
+            """)
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+
+    def flush(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, []
+            if not pending:
+                return
+
+            connection = self._connect()
+            with connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO snapshots (test, snap, new, hash, date, content, meta) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    pending
+                )
+
+
+    def pop_changes(self) -> Any:
+        with self._lock:
+            pending, self._pending = self._pending, []
+        return pending
+
+
+    def merge_changes(self, changes: Any) -> None:
+        if changes:
+            with self._lock:
+                self._pending.extend(changes)
+
+
+    def hash_of(self, test_name: str, snap_name: str) -> Optional[str]:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT hash FROM snapshots WHERE test = ? AND snap = ? AND new = 0",
+                (test_name, snap_name)
+            ).fetchone()
+        return row[0] if row else None
+
+
+    def snapshot_of(self, test_name: str, snap_name: str, new: bool = False) -> Optional[Snapshot]:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT test, snap, new, hash, date, content, meta FROM snapshots "
+                "WHERE test = ? AND snap = ? AND new = ?",
+                (test_name, snap_name, int(new))
+            ).fetchone()
+        return _from_row(*row)[0] if row else None
+
+
+    def save(self, snapshot: Snapshot, new: bool = True) -> None:
+        meta = json.dumps(snapshot._meta, sort_keys=True)
+        try:
+            # Content too large to batch up, held as bytes, is written straight into its blob
+            if snapshot._content is None and snapshot._size() > SPOOL_SIZE:
+                if self._write_blob(snapshot, new, meta):
+                    return
+            content = b''.join(snapshot._chunks())
+        finally:
+            snapshot.close()
+
+        with self._lock:
+            self._pending.append((
+                snapshot._test, snapshot._snap, int(new), snapshot._hash, snapshot._date, content,
+                meta
+            ))
+
+
+    def _write_blob(self, snapshot: Snapshot, new: bool, meta: str) -> bool:
+        # Writes a snapshot's row in a transaction of its own, copying the content in chunk by
+        # chunk. Returns whether it could, as blobs can only be opened from Python 3.11.
+        key = (snapshot._test, snapshot._snap, int(new))
+        with self._lock:
+            connection = self._connect()
+            if not hasattr(connection, "blobopen"):
+                return False
+
+            with connection:
+                row = connection.execute(
+                    "INSERT OR REPLACE INTO snapshots (test, snap, new, hash, date, content, meta) "
+                    "VALUES (?, ?, ?, ?, ?, zeroblob(?), ?)",
+                    (*key, snapshot._hash, snapshot._date, snapshot._size(), meta)
+                ).lastrowid
+                with connection.blobopen("snapshots", "content", row) as blob:
+                    for chunk in snapshot._chunks():
+                        blob.write(chunk)
+
+            # An earlier save of the snap still waiting to be written would replace this one
+            self._pending = [pending for pending in self._pending if pending[:3] != key]
+        return True
+
+
+    def snapshots(self) -> Iterator[tuple[Snapshot, bool]]:
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT test, snap, new, hash, date, content, meta FROM snapshots "
+                "ORDER BY test, snap, new"
+            )
+
+        for row in rows:
+            yield _from_row(*row)
+
+
+    def new_snaps(self) -> list[tuple[str, str]]:
+        with self._lock:
+            return self._connect().execute(
+                "SELECT test, snap FROM snapshots WHERE new = 1 ORDER BY test, snap"
+            ).fetchall()
+
+
+    def accept(self, names: Iterable[tuple[str, str]]) -> int:
+        # Every snapshot is accepted in the one transaction
+        names = list(names)
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.executemany(
+                    "DELETE FROM snapshots WHERE test = ? AND snap = ? AND new = 0", names
+                )
+                connection.executemany(
+                    "UPDATE snapshots SET new = 0 WHERE test = ? AND snap = ? AND new = 1", names
+                )
+        return len(names)
+
+
+    def reject(self, names: Iterable[tuple[str, str]]) -> int:
+        names = list(names)
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.executemany(
+                    "DELETE FROM snapshots WHERE test = ? AND snap = ? AND new = 1", names
+                )
+        return len(names)
+
+
+    def prune(self, keep: Callable[[str, str], bool], dry_run: bool = False) -> list[str]:
+        with self._lock:
+            connection = self._connect()
+            rows = connection.execute("SELECT test, snap, new FROM snapshots").fetchall()
+
+            unused = [(test, snap, new) for test, snap, new in rows if not keep(test, snap)]
+            if not dry_run:
+                with connection:
+                    connection.executemany(
+                        "DELETE FROM snapshots WHERE test = ? AND snap = ? AND new = ?", unused
+                    )
+
+        return [f"{test}/{snap}.snap{'.new' if new else ''}" for test, snap, new in sorted(unused)]
+
+
+    def __reduce__(self):
+        # Connections can't be pickled, so worker processes open their own, once
+        return (_shared_database, (self._path,))
+
+
+def open_storage(
+    directory: Path, compression: Optional[str] = None, backend: str = "directory"
+) -> Storage:
+    """
+    Opens the storage for a snapshot directory, as configured for a suite.
+
+    Args:
+        directory: the snapshot directory.
+        compression: if given, either 'zlib' or 'lzma', see `ObjectStore`.
+        backend: either 'directory', to store each snapshot as its own file, or 'sqlite', to
+            store all snapshots in a single database within the snapshot directory.
+    Raises:
+        ValueError: if the compression or backend is unknown, or compression is requested
+            for a backend that doesn't support it.
+    """
+    match backend:
+        case "directory":
+            return DirectoryStorage(
+                directory = directory,
+                index = SnapshotIndex(directory),
+                objects = ObjectStore(directory, compression) if compression else None,
+                writer = SnapshotWriter()
+            )
+        case "sqlite":
+            if compression:
+                raise ValueError("Compression is only supported by the 'directory' backend.")
+            return SqliteStorage(directory / DATABASE_NAME)
+        case _:
+            raise ValueError(f"Unknown backend `{backend}`: expected 'directory' or 'sqlite'.")
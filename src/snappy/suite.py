@@ -1,7 +1,128 @@
-from typing import Callable, List
+import time
+import signal
+import asyncio
+import threading
+from collections import deque
+from typing import Any, Callable, Iterable, Iterator, List, Optional
 from pathlib import Path
+from functools import partial
+from concurrent.futures import (
+    FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+)
 
-from .test import Test
+from .test import Parametrized, Test, TestFunction
+from .fixtures import Fixture, FixtureSet, teardown_session
+from .storage import Storage, open_storage
+from .deps import DependencyRecord
+from .history import TestHistory
+from .hashing import DEFAULT_ALGORITHM, hasher
+from .results import TestResult
+from .reporters import Reporter, TerminalReporter, report_result, plural
+from .shards import Shard
+
+
+Outcome = tuple[TestResult, Any, Optional[tuple]]
+
+
+# Process workers are given this long past a test's timeout to stop the test themselves, before
+# they are killed
+TIMEOUT_GRACE = 1.0
+
+
+class TestTimedOut(BaseException):
+    """
+    Raised inside a test that has run past its timeout. Tests catching `Exception` won't catch
+    it by mistake.
+    """
+
+
+def _raise_timeout(signum: int, frame: Any) -> None:
+    raise TestTimedOut()
+
+
+def _timed_out(test: Test, changes: Any = None) -> Outcome:
+    result = TestResult(
+        name = test._name,
+        passed = False,
+        new_snaps = list(test._new_snaps),
+        timed_out = True,
+        wall_time = test._timeout or 0.0
+    )
+    return result, changes, None
+
+
+def _run_untimed(test: Test, record: bool, profile: Optional[Path]) -> Outcome:
+    passed = test._run(record, profile)
+    dependencies = (test._sources, test._snap_hashes) if record and passed else None
+    return test._result(), test._storage.pop_changes(), dependencies
+
+
+def _run_test(test: Test, record: bool = False, profile: Optional[Path] = None) -> Outcome:
+    # Module level so that it can be pickled and shipped off to worker processes. The storage
+    # changes and dependencies are returned alongside the result, as a worker's copy of the test
+    # never makes it back.
+    if test._timeout is None:
+        return _run_untimed(test, record, profile)
+
+    # The main thread, of this process or of a worker process, can be interrupted by a signal
+    if threading.current_thread() is threading.main_thread() and hasattr(signal, "setitimer"):
+        previous = signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, test._timeout)
+        try:
+            return _run_untimed(test, record, profile)
+        except TestTimedOut:
+            return _timed_out(test, test._storage.pop_changes())
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+
+    # Other threads can't be interrupted, so the test is run on a thread of its own which is
+    # left behind if it runs out of time
+    outcome: list = []
+
+    def run() -> None:
+        try:
+            outcome.append(_run_untimed(test, record, profile))
+        except BaseException as error:
+            outcome.append(error)
+
+    thread = threading.Thread(target=run, name=f"snappy-{test._name}", daemon=True)
+    thread.start()
+    thread.join(test._timeout)
+    if not outcome:
+        return _timed_out(test)
+    if isinstance(outcome[0], BaseException):
+        raise outcome[0]
+    return outcome[0]
+
+
+def _run_batch(tests: List[Test], record: bool, profile: Optional[Path]) -> List[Outcome]:
+    return [_run_test(test, record, profile) for test in tests]
+
+
+def _batches(tests: List[Test], size: int) -> Iterator[List[Test]]:
+    # Tests with a timeout are sent off on their own, so that they can be told apart should
+    # their worker need killing
+    batch: List[Test] = []
+    for test in tests:
+        if test._timeout is not None:
+            yield [test]
+            continue
+
+        batch.append(test)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _terminate(pool: ProcessPoolExecutor) -> None:
+    # There's no way to stop a single worker of a pool, so all of them are
+    processes = getattr(pool, "_processes", None) or {}
+    for process in list(processes.values()):
+        process.terminate()
+    pool.shutdown(wait=True, cancel_futures=True)
 
 
 class TestSuite:
@@ -10,72 +131,487 @@ class TestSuite:
     runner, which will then execute all tests associated with the suite and report the results.
     """
 
-    def __init__(self, snapshot_directory: str | Path) -> None:
+    def __init__(self,
+        snapshot_directory: str | Path,
+        compression: Optional[str] = None,
+        backend: str = "directory",
+        timeout: Optional[float] = None,
+        hash_algorithm: str = DEFAULT_ALGORITHM
+    ) -> None:
         """
         Creates a new test suite.
 
         Args:
             snapshot_directory: the path you would like snapshots to be stored in.
+            compression: if given, either 'zlib' or 'lzma'. Snapshot content is then stored once
+                per unique hash in a compressed object store, rather than in each snapshot file.
+            backend: either 'directory', to store each snapshot as its own file, or 'sqlite', to
+                store all snapshots in a single database within the snapshot directory.
+            timeout: the seconds each test may run for before it is stopped and reported as
+                timed out, unless the test gives its own. By default tests run as long as they
+                like.
+            hash_algorithm: the algorithm snapshots are hashed with: 'sha256', 'blake2b', which
+                is quicker on CPUs without SHA instructions, or 'xxh3', which is far quicker on
+                any but needs the `xxhash` package. Snapshots saved with another algorithm still
+                match, and can be rehashed with `snappy rehash`.
+        Raises:
+            ValueError: if the compression, backend or hash algorithm is unknown, or compression
+                is requested for a backend that doesn't support it.
         """
         if not isinstance(snapshot_directory, Path):
             snapshot_directory = Path(snapshot_directory)
 
+        # The directory is created once something needs saving in it
         self._snaps_dir = snapshot_directory
-        if not self._snaps_dir.exists():
-            self._snaps_dir.mkdir(parents=True, exist_ok=True)
 
-        self._tests: List[Test] = []
+        self._backend, self._compression = backend, compression
+        hasher(hash_algorithm)
+        self._algorithm = hash_algorithm
+        self._storage: Storage = open_storage(self._snaps_dir, compression, backend)
+
+        self._dependencies = DependencyRecord(self._snaps_dir)
+        self._history = TestHistory(self._snaps_dir)
+        self._fixtures = FixtureSet()
+        self._timeout = timeout
 
+        # Parametrized tests are kept as they are, and only expanded into tests when run
+        self._tests: List[Test | Parametrized] = []
 
-    def test_case(self, test: Callable[[Test], None]) -> Callable[[Test], None]:
+
+    def test_case(self,
+        test: Optional[TestFunction] = None,
+        timeout: Optional[float] = None
+    ) -> Callable:
         """
-        Decotator that marks a function as a test and registers it with the suite.
+        Decotator that marks a function as a test and registers it with the suite. Tests may be
+        `async def` functions, which are run concurrently on a shared event loop. Any parameters
+        after the `Test` are filled in with the suite's fixtures of the same name.
+
+        Use as either `@suite.test_case` or `@suite.test_case(timeout=5)`.
 
         Args:
             test: the function containing test logic.
+            timeout: the seconds the test may run for, in place of the suite's timeout.
         """
-        self._tests.append(Test(
-            name = test.__name__,
-            function = test,
-            snap_directory = self._snaps_dir
-        ))
+        def register(test: TestFunction) -> TestFunction:
+            self._tests.append(Test(
+                name = test.__name__,
+                function = test,
+                storage = self._storage,
+                fixtures = self._fixtures,
+                timeout = timeout if timeout is not None else self._timeout,
+                algorithm = self._algorithm
+            ))
+
+            # Return the function as is, now that we've registered it.
+            return test
 
-        # Return the function as is, now that we've registered it.
-        return test
+        return register if test is None else register(test)
 
 
-    def run_tests(self, display_func: Callable = print) -> None:
+    def parametrize(self,
+        cases: Iterable[Any] | Callable[[], Iterable[Any]],
+        ids: Optional[Iterable[Any] | Callable[[Any], Any]] = None,
+        timeout: Optional[float] = None
+    ) -> Callable[[TestFunction], TestFunction]:
         """
-        Executes all tests registered with the suite.
+        Decorator that registers a function as many tests, one for each case of a parameter
+        table. Each case's test is named `<function>[<case id>]` and keeps its snapshots in a
+        directory of its own, so cases pass, fail and can be cached separately.
+
+        Cases are generated as the tests are run, rather than when they're registered, so a run
+        with one worker never holds the whole table. Worker pools, shards and async functions
+        need every case before they start, so draw the table up front. An iterator can only be
+        gone through once, so pass a function that returns one for a suite that may be run more
+        than once.
 
         Args:
-            display_func: The callable that results will be pushed to.
+            cases: the arguments for each case, or a function returning them. A case is either
+                a dict of keyword arguments, a tuple of arguments to pass after the `Test`, or
+                a single argument. Parameters not given by the case are filled in by fixtures.
+            ids: the id of each case, or a function that makes one from a case. By default a
+                case's id is its position in the table, so give ids to keep a case's snapshots
+                the same as rows are added or removed.
+            timeout: the seconds each case may run for, in place of the suite's timeout.
         """
-        snaps_for_review = 0
-        tests_failed = 0
-        for test in self._tests:
-            display_func(f"{test._name}:", end=" \t")
+        def register(test: TestFunction) -> TestFunction:
+            self._tests.append(Parametrized(
+                function = test,
+                cases = cases,
+                storage = self._storage,
+                ids = ids,
+                fixtures = self._fixtures,
+                timeout = timeout if timeout is not None else self._timeout,
+                algorithm = self._algorithm
+            ))
+            return test
+
+        return register
+
+
+    def fixture(self,
+        function: Optional[Callable] = None,
+        scope: str = "test"
+    ) -> Callable:
+        """
+        Decorator that registers a function as a fixture, which tests request by naming it as a
+        parameter. Its value is created once per scope and shared by every test in that scope:
+        once for each 'test', once per 'suite' run, or once for the whole test 'session'.
+        Fixtures may request other fixtures of the same or a wider scope in the same way.
+
+        A generator fixture yields its value, and is resumed to tear it down once the scope is
+        over. Fixtures are torn down in the reverse order they were created in.
+
+        Worker threads share fixture values, so these should be thread safe. Worker processes
+        each create their own, and require fixtures to be defined at the top level of a module.
+
+        Use as either `@suite.fixture` or `@suite.fixture(scope="suite")`.
+
+        Args:
+            function: the function that creates the fixture's value.
+            scope: one of 'test', 'suite' or 'session', by default 'test'.
+        Raises:
+            ValueError: if the scope is unknown.
+        """
+        def register(function: Callable) -> Callable:
+            self._fixtures.add(Fixture(function.__name__, function, scope))
+            return function
+
+        return register if function is None else register(function)
 
-            if test._run():
-                display_func("ok.")
 
+    def _expand(self, drawn: Optional[dict[Parametrized, List[Test]]] = None) -> Iterator[Test]:
+        # Tables already drawn are gone through again as they are, rather than generating
+        # their tests anew
+        for test in self._tests:
+            if drawn is not None and test in drawn:
+                yield from drawn[test]
+            elif isinstance(test, Parametrized):
+                yield from test.tests()
             else:
-                tests_failed = tests_failed + 1
-                snaps_for_review = snaps_for_review + len(test._new_snaps)
-                display_func('err!')
-                display_func('\n'.join([
-                    f"  x {snap}" for snap in test._new_snaps
-                ]))
+                yield test
+
+
+    def _results(self,
+        tests: List[Test],
+        workers: int,
+        executor: str,
+        record: bool,
+        profile: Optional[Path],
+        stop: threading.Event
+    ) -> Iterator[tuple[Test, Outcome]]:
+        # Yields each test with its outcome as it finishes. No more tests are started once
+        # `stop` is set.
+        make_pool: Callable[[], Executor]
+        match executor:
+            case "process":
+                make_pool = partial(ProcessPoolExecutor, max_workers=workers)
+                chunksize = max(1, len(tests) // (workers * 4))
+            case "thread":
+                make_pool = partial(ThreadPoolExecutor, max_workers=workers)
+                chunksize = 1
+            case _:
+                raise ValueError(f"Unknown executor `{executor}`: expected 'process' or 'thread'.")
+
+        # A worker process stuck in a test is killed, so while there are tests that may need
+        # killing only as many batches are sent as there are workers, so that each starts as
+        # soon as it's sent and its deadline is fair. Worker threads stop waiting on stuck
+        # tests themselves, see `_run_test`.
+        batches = deque(_batches(tests, chunksize))
+        killable = executor == "process" and any(test._timeout is not None for test in tests)
+        limit = workers if killable else workers * 2
+
+        running: dict[Future, tuple[List[Test], Optional[float]]] = {}
+        pool = make_pool()
+        try:
+            while batches or running:
+                while batches and len(running) < limit and not stop.is_set():
+                    batch = batches.popleft()
+                    deadline = None
+                    if killable and batch[0]._timeout is not None:
+                        deadline = time.monotonic() + batch[0]._timeout + TIMEOUT_GRACE
+                    running[pool.submit(_run_batch, batch, record, profile)] = (batch, deadline)
+
+                if not running:
+                    return
+
+                deadlines = [deadline for _, deadline in running.values() if deadline is not None]
+                timeout = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+                done, _ = wait(running, timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    batch, _ = running.pop(future)
+                    yield from zip(batch, future.result())
+
+                now = time.monotonic()
+                expired = [
+                    future for future, (_, deadline) in running.items()
+                    if deadline is not None and deadline <= now
+                ]
+                if expired:
+                    for future in expired:
+                        test = running.pop(future)[0][0]
+                        yield test, _timed_out(test)
+
+                    # The stuck worker takes the pool with it, so the tests running alongside
+                    # it are run again in a new one
+                    batches.extendleft(reversed([batch for batch, _ in running.values()]))
+                    running.clear()
+                    _terminate(pool)
+                    pool = make_pool()
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+
+    def _run_async(self, tests: List[Test], concurrency: int) -> dict[Test, Outcome]:
+        # Coroutine tests all share one event loop, with at most `concurrency` running at once.
+        # Each test still has its own `_new_snaps`, so they can't see each other's results.
+        if not tests:
+            return {}
+
+        timed_out: set[Test] = set()
+
+        async def run_all() -> list[None]:
+            limit = asyncio.Semaphore(concurrency)
+
+            async def run_one(test: Test) -> None:
+                async with limit:
+                    if test._timeout is None:
+                        await test._run_async()
+                        return
+
+                    # Cancelling a test raises inside it, so its fixtures are still torn down
+                    try:
+                        await asyncio.wait_for(test._run_async(), test._timeout)
+                    except asyncio.TimeoutError:
+                        timed_out.add(test)
+
+            return await asyncio.gather(*(run_one(test) for test in tests))
+
+        asyncio.run(run_all())
+        return {
+            test: _timed_out(test) if test in timed_out else (test._result(), None, None)
+            for test in tests
+        }
+
+
+    def run_tests(self,
+        display_func: Callable = print,
+        workers: int = 1,
+        executor: str = "process",
+        changed: bool = False,
+        concurrency: int = 64,
+        durations: int = 0,
+        profile: Optional[Path] = None,
+        shard: Optional[Shard] = None,
+        fail_fast: bool = False,
+        reporter: Optional[Reporter] = None
+    ) -> List[TestResult]:
+        """
+        Executes all tests registered with the suite. Tests that failed the last time the suite
+        was run are run and reported first, the rest in the order they were registered,
+        regardless of how many workers are used. With several workers, the tests that took
+        longest last time are started first, so that no long test is left until the end.
+
+        A test that runs past its timeout is stopped and reported as timed out. Worker processes
+        stuck in a test are killed, along with the rest of the pool, and the tests they were
+        running are run again in a new one. Worker threads can't be stopped, so carry on with
+        the next test while the stuck one is left to finish in the background.
+
+        Args:
+            display_func: The callable that results will be pushed to, unless a reporter is
+                given.
+            workers: the number of tests to run at once, by default tests run one at a time.
+            executor: either 'process' or 'thread', the kind of worker pool to use when
+                `workers` is greater than one. Process pools require test functions to be
+                picklable, i.e. defined at the top level of a module.
+            changed: flag that skips tests whose recorded dependencies are unchanged, reporting
+                them as cached passes. Tests that are run have their dependencies recorded, which
+                means async tests are run one at a time, each on their own event loop.
+            concurrency: the number of async tests that may run at once on the shared event loop.
+            durations: the number of slowest tests to report, none by default. Only used when
+                no reporter is given.
+            profile: a directory to dump a cProfile `<test>.pstats` file into for each test. As
+                with `changed`, this runs async tests one at a time.
+            shard: if given, only the tests belonging to this shard are run, see `Shard`.
+            fail_fast: flag that stops starting tests once one has failed. Tests already
+                running are finished and reported, the rest aren't run at all.
+            reporter: what to report the run to, in place of a `TerminalReporter` pushing to
+                `display_func`. See `reporters` for the others.
+        Returns:
+            The result of each test run, in the order they were reported.
+        Raises:
+            ValueError: if `executor` is not a known kind of worker pool.
+        """
+        if reporter is None:
+            reporter = TerminalReporter(display_func, durations)
+
+        try:
+            results = self._run(
+                reporter, workers, executor, changed, concurrency, profile, shard, fail_fast
+            )
+        finally:
+            teardown_session()
+        reporter.summary(results)
+        return results
+
+
+    def _run(self,
+        reporter: Reporter,
+        workers: int,
+        executor: str,
+        changed: bool = False,
+        concurrency: int = 64,
+        profile: Optional[Path] = None,
+        shard: Optional[Shard] = None,
+        fail_fast: bool = False
+    ) -> List[TestResult]:
+        # Runs and reports each test, returning the results so that several suites can share
+        # one summary
+        self._storage.load()
+        self._history.load()
+        if changed:
+            self._dependencies.load()
+
+        # Serially, tests are run as their cases are generated, so that a large table is never
+        # held all at once. Shards and worker pools need every test before they can start.
+        lazy = workers <= 1 and shard is None
+
+        # Async tests can't be traced or profiled individually while sharing a loop, so are left
+        # with the rest when recording dependencies or profiling
+        isolate = changed or profile is not None
+
+        # The shared loop runs ahead of the rest, so async tables are drawn up front even so
+        drawn: dict[Parametrized, List[Test]] = {}
+        if lazy and not isolate:
+            drawn = {
+                test: list(test.tests()) for test in self._tests
+                if isinstance(test, Parametrized) and test._is_async()
+            }
+
+        # Tests are reported in this order, and run in it unless there are several workers
+        tests: Iterable[Test]
+        cached: set[str] = set()
+        if lazy:
+            names = {test._name for test in self._tests if isinstance(test, Test)}
+            prefixes = tuple(
+                f"{test._name}[" for test in self._tests if isinstance(test, Parametrized)
+            )
+            tests = self._history.order(self._expand(drawn), names, prefixes)
+        else:
+            tests = list(self._expand())
+            if shard is not None:
+                tests = shard.select(tests)
+            if changed:
+                cached = {
+                    test._name for test in tests
+                    if self._dependencies.is_fresh(test._name, self._storage)
+                }
+            tests = self._history.schedule(tests)
+
+        stop = threading.Event()
+        reporter.start_suite(str(self._snaps_dir))
+
+        # Suite scoped fixtures last for this run only, and what was saved is kept, however it
+        # ends
+        outcomes: Optional[Iterator[tuple[Test, Outcome]]] = None
+        try:
+            shared_loop: List[Test] = []
+            if not isolate and lazy:
+                shared_loop = [
+                    test for test in self._tests if isinstance(test, Test) and test._is_async()
+                ]
+                shared_loop = self._history.schedule(
+                    shared_loop + [test for cases in drawn.values() for test in cases]
+                )
+            elif not isolate:
+                shared_loop = [test for test in tests if test._is_async()]
+            async_outcomes = self._run_async(shared_loop, concurrency)
+            if fail_fast and any(not result.passed for result, _, _ in async_outcomes.values()):
+                stop.set()
+
+            if workers > 1:
+                pending = [
+                    test for test in tests
+                    if test._name not in cached and test not in async_outcomes
+                ]
+                pending = self._history.schedule(pending, longest_first=True)
+                outcomes = self._results(pending, workers, executor, changed, profile, stop)
+
+            # Tests finishing before those reported ahead of them wait here to be reported
+            finished: dict[Test, Outcome] = {}
+
+            results: List[TestResult] = []
+            not_run = 0
+            for test in tests:
+                # Lazily drawn tests are only checked once they come up
+                fresh = lazy and changed and self._dependencies.is_fresh(test._name, self._storage)
+                if fresh or test._name in cached:
+                    reporter.start_test(test._name)
+                    test._new_snaps = []
+                    results.append(TestResult(test._name, passed=True, cached=True))
+                    report_result(reporter, results[-1])
+                    continue
+
+                if test in async_outcomes:
+                    reporter.start_test(test._name)
+                    outcome = async_outcomes[test]
+
+                elif outcomes is None:
+                    if stop.is_set():
+                        not_run = not_run + 1
+                        continue
+
+                    # Serially, the name is shown before the test is run, so that anything the
+                    # test prints follows it
+                    reporter.start_test(test._name)
+                    outcome = _run_test(test, changed, profile)
+                    if fail_fast and not outcome[0].passed:
+                        stop.set()
+
+                else:
+                    for finished_test, finished_outcome in outcomes:
+                        finished[finished_test] = finished_outcome
+                        if fail_fast and not finished_outcome[0].passed:
+                            stop.set()
+                        if finished_test is test:
+                            break
+
+                    if test not in finished:
+                        not_run = not_run + 1
+                        continue
+
+                    reporter.start_test(test._name)
+                    outcome = finished.pop(test)
+
+                result, changes, dependencies = outcome
+                test._new_snaps = result.new_snaps
+                results.append(result)
+                self._history.record(result)
+
+                self._storage.merge_changes(changes)
+                if changed:
+                    if dependencies is not None:
+                        self._dependencies.update(test._name, *dependencies)
+                    else:
+                        self._dependencies.forget(test._name)
 
-        n_tests = len(self._tests)
-        tests_passed = n_tests - tests_failed
+                report_result(reporter, result)
 
-        def plural(n: int, word: str) -> str:
-            return f"1 {word}" if n == 1 else f"{n} {word}s"
+            if not_run:
+                reporter.message(f"Stopped after a failure, {plural(not_run, 'test')} not run.")
+        finally:
+            # Finish the generator off so any worker pool gets shut down
+            if outcomes is not None:
+                outcomes.close()
 
-        display_func("-----------------------------------")
-        display_func(f"{plural(n_tests, 'test')} ran:")
-        display_func(f"  {plural(tests_passed, 'test')} passed")
-        display_func(f"  {plural(tests_failed, 'test')} failed")
-        display_func(f"  {plural(snaps_for_review, 'new snap')} to review")
+            # Snapshots queued by tests before one raised are still written out
+            try:
+                self._storage.flush()
+                self._history.save()
+                if changed:
+                    self._dependencies.save()
+            finally:
+                self._fixtures.teardown()
+                reporter.finish_suite()
 
+        return results
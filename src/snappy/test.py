@@ -1,9 +1,44 @@
 from __future__ import annotations
 
-from typing import Callable
+import re
+import time
+import asyncio
+import cProfile
+import inspect
+from collections import abc
+from contextlib import contextmanager
+from functools import partial
+from typing import Any, Awaitable, Callable, Iterable, Iterator, Optional, Union
 from pathlib import Path
 
-from .snapshot import Snapshot
+from .snapshot import OCTET_STREAM, Capturable, Snapshot
+from .hashing import DEFAULT_ALGORITHM, split
+from .storage import DirectoryStorage, Storage
+from .deps import fingerprint, trace_sources
+from .fixtures import FixtureCache, FixtureSet
+from .serializers import as_buffer, canonical, serialize
+from .results import TestResult
+
+
+# Test functions are either plain functions or coroutine functions, which may take fixtures
+# as parameters after the test
+TestFunction = Callable[..., Union[None, Awaitable[None]]]
+
+
+def _is_stream(content: Any) -> bool:
+    # Iterators are streamed, as are lists and tuples made up only of string or bytes chunks.
+    # Other iterables, such as lists of numbers, are snapped as values.
+    if hasattr(content, "read") or isinstance(content, abc.Iterator):
+        return True
+    return isinstance(content, (list, tuple)) and all(
+        isinstance(chunk, (str, bytes, bytearray, memoryview)) for chunk in content
+    )
+
+
+def _case_id(value: Any) -> str:
+    # Case ids name a directory, so anything that could escape it or upset a file system goes
+    case_id = re.sub(r"[^\w.-]", "_", str(value))
+    return f"_{case_id}" if case_id.startswith(".") or not case_id else case_id
 
 
 class Test:
@@ -13,66 +48,349 @@ class Test:
     test running and reporting.
     """
 
-    def __init__(self, name: str, function: Callable[[Test], None], snap_directory: Path) -> None:
+    # Suites can register a great many tests, so they are kept compact
+    __slots__ = (
+        "_name", "_function", "_storage", "_fixtures", "_timeout", "_algorithm",
+        "_new_snaps", "_snap_hashes", "_sources", "_wall_time", "_cpu_time", "_phases"
+    )
+
+    def __init__(self,
+        name: str,
+        function: TestFunction,
+        storage: Storage | Path,
+        fixtures: Optional[FixtureSet] = None,
+        timeout: Optional[float] = None,
+        algorithm: str = DEFAULT_ALGORITHM
+    ) -> None:
         """
-        Creates a test case object and sets up the snap directory with the correct sub-directories
-        for the test to save to.
+        Creates a test case object. Nothing is touched on disk until the test saves a snapshot,
+        so registering a test is cheap.
 
         Args:
             name: the name of the test case, most likely derived from the function name.
-            function: the callable that holds test logic.
-            snap_directory: the path to the directory snapshots should be save to.
+            function: the callable that holds test logic, which may be a coroutine function.
+            storage: where snapshots are stored, either a storage backend or the path to the
+                directory snapshots should be saved to.
+            fixtures: the fixtures the function may request by naming them as parameters.
+            timeout: the seconds the test may run for before it is stopped and reported as
+                timed out, by default as long as it likes.
+            algorithm: the algorithm to hash snapshots with, see `hashing.HASH_ALGORITHMS`.
         """
+        if not isinstance(storage, Storage):
+            storage = DirectoryStorage(storage)
+
         # These are constants for the lifespan of the test
         self._name = name
         self._function = function
-        self._snap_directory = snap_directory / name
-
-        # Prepare the snapshot directory
-        self._snap_directory.mkdir(parents=True, exist_ok=True)
+        self._storage = storage
+        self._fixtures = fixtures
+        self._timeout = timeout
+        self._algorithm = algorithm
 
         # Used to track test state / results
         self._new_snaps: list[str] = []
+        self._snap_hashes: dict[str, str] = {}
+        self._sources: Optional[dict[str, Optional[str]]] = None
+        self._wall_time = 0.0
+        self._cpu_time: Optional[float] = None
+        self._phases: dict[str, float] = {}
 
 
-    def snap(self, capture_content: str, snap_name: str) -> None:
+    def snap(self,
+        capture_content: Capturable,
+        snap_name: str,
+        content_type: Optional[str] = None
+    ) -> None:
         """
         Creates a snapshot of the given content and compares it to the existing snapshot. If the
         existing snapshot does not exist or has a different hash, the new snapshot will be saved
         with a `.snap.new` extension for review.
 
+        Strings are snapped as they are. Bytes are snapped as binary, hashed and saved as they
+        are, along with their content type. Iterators of chunks, lists and tuples of string or
+        bytes chunks, and file-like objects are streamed: hashed a chunk at a time, so very large
+        content can be snapped cheaply. Streamed bytes that aren't text are saved as binary.
+        NumPy arrays, and other objects supporting the buffer protocol, have their raw bytes
+        hashed where they are. Anything else, such as dicts, lists and dataclasses, is encoded
+        canonically as text, see `serializers.canonical`.
+
         Args:
-            capture_content: The string content to be saved in the snapshot.
+            capture_content: The content to be saved in the snapshot.
             snap_name: The name under which the snapshot will be stored.
+            content_type: the media type of bytes content, such as 'image/png', by default
+                'application/octet-stream'.
+        Raises:
+            TypeError: if the content is of a type that can't be snapped, or a content type is
+                given for content other than bytes.
         """
-        file_path = self._snap_directory / f"{snap_name}.snap"
+        with self._timed("hash"):
+            capture_content = serialize(capture_content)
 
-        snap = Snapshot.new(
-            test_name = self._name,
-            snap_name = snap_name,
-            content = capture_content
-        )
+            binary = isinstance(capture_content, (bytes, bytearray, memoryview))
+            if content_type is not None and not binary:
+                kind = type(capture_content).__name__
+                raise TypeError(f"Only bytes can be given a content type, not `{kind}`.")
+
+            if isinstance(capture_content, str):
+                snap = Snapshot.new(self._name, snap_name, capture_content, self._algorithm)
+            elif binary:
+                snap = Snapshot.binary(
+                    self._name, snap_name, capture_content, content_type or OCTET_STREAM,
+                    self._algorithm
+                )
+            elif _is_stream(capture_content):
+                snap = Snapshot.stream(self._name, snap_name, capture_content, self._algorithm)
+            elif (buffer := as_buffer(capture_content)) is not None:
+                snap = Snapshot.array(self._name, snap_name, *buffer, self._algorithm)
+            else:
+                content = canonical(capture_content)
+                snap = Snapshot.new(self._name, snap_name, content, self._algorithm)
+
+        # Once saved, the storage owns the snapshot and closes it itself
+        saved = False
+        try:
+            saved = self._compare_and_save(snap)
+        finally:
+            if not saved:
+                snap.close()
+
+
+    def _compare_and_save(self, snap: Snapshot) -> bool:
+        self._snap_hashes[snap._snap] = snap._hash
+
+        # If the old snap exists, and it matches the current one, we don't have to do anything
+        # so simply return early
+        with self._timed("load"):
+            old_hash = self._storage.hash_of(self._name, snap._snap)
+        if snap._hash == old_hash:
+            return False
 
-        if file_path.exists():
-            old = Snapshot.load_from(file_path)
+        # Snapshots accepted before the suite changed hash algorithm are compared by hashing the
+        # new content the old way, until they're rehashed, see `core.rehash_snaps`
+        if old_hash is not None and split(old_hash)[0] != split(snap._hash)[0]:
+            with self._timed("hash"):
+                matched = snap._rehash(split(old_hash)[0]) == old_hash
+            if matched:
+                self._snap_hashes[snap._snap] = old_hash
+                return False
 
-            # If the old snap exists, and it matches the current one, we don't have to do anything
-            # so simply return early
-            if snap == old:
-                return
+        # If we get here, either the old snap doesn't exist or it's different. Either way, save it
+        # as a new snap for review later
+        with self._timed("write"):
+            self._storage.save(snap, new=True)
+        self._new_snaps.append(snap._snap)
+        return True
 
-        # If we get here, either the file doesn't exist or it's different. Either way, save it with
-        # the `.snap.new` extension for review later
-        snap.save_to(file_path.with_suffix(".snap.new"))
-        self._new_snaps.append(file_path.stem)
 
+    @contextmanager
+    def _timed(self, phase: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self._phases[phase] = self._phases.get(phase, 0.0) + elapsed
 
-    def _run(self) -> bool:
+
+    def _is_async(self) -> bool:
+        return inspect.iscoroutinefunction(self._function)
+
+
+    def _reset(self) -> None:
         # Any calls to snap made with in the function will be recorded
         # and used for test reporting by the suite
         self._new_snaps = []
-        self._function(self)
+        self._snap_hashes = {}
+        self._sources = None
+        self._wall_time = 0.0
+        self._cpu_time = None
+        self._phases = {}
+
+
+    def _run(self, record: bool = False, profile: Optional[Path] = None) -> bool:
+        self._reset()
+        scope = FixtureCache()
+
+        # Coroutine functions get an event loop to themselves when run this way, see `_run_async`
+        # for running several on one loop
+        if self._is_async():
+            call = lambda: asyncio.run(self._function(self, **self._arguments(scope)))
+        else:
+            call = lambda: self._function(self, **self._arguments(scope))
+
+        if profile is not None:
+            profiler = cProfile.Profile()
+            unprofiled = call
+            call = lambda: profiler.runcall(unprofiled)
+
+        wall_start, cpu_start = time.perf_counter(), time.thread_time()
+
+        # When recording, the source files the test runs are fingerprinted so that the test can
+        # be skipped on later runs if none of them change. Fixtures shared with other tests may
+        # have been set up by one of them, so their own files are added in as well.
+        try:
+            if record:
+                sources = trace_sources(call)
+                if self._fixtures is not None:
+                    sources |= self._fixtures.sources(self._function)
+                self._sources = fingerprint(sources)
+            else:
+                call()
+        finally:
+            self._teardown(scope)
+
+        self._wall_time = time.perf_counter() - wall_start
+        self._cpu_time = time.thread_time() - cpu_start
+
+        if profile is not None:
+            profile.mkdir(parents=True, exist_ok=True)
+            profiler.dump_stats(profile / f"{self._name}.pstats")
 
         # If no new snaps were created then it was a 'success'
         return self._new_snaps == []
 
+
+    async def _run_async(self) -> bool:
+        # CPU time isn't recorded, as it can't be told apart from other tests sharing the loop
+        self._reset()
+        scope = FixtureCache()
+        wall_start = time.perf_counter()
+        try:
+            await self._function(self, **self._arguments(scope))
+        finally:
+            self._teardown(scope)
+        self._wall_time = time.perf_counter() - wall_start
+        return self._new_snaps == []
+
+
+    def _arguments(self, scope: FixtureCache) -> dict[str, Any]:
+        # Only tests that request fixtures have their setup timed
+        if not self._fixtures or not self._fixtures._requested(self._function):
+            return {}
+        with self._timed("fixtures"):
+            return self._fixtures.resolve(self._function, scope)
+
+
+    def _teardown(self, scope: FixtureCache) -> None:
+        if len(scope):
+            with self._timed("fixtures"):
+                scope.teardown()
+
+
+    def _result(self) -> TestResult:
+        return TestResult(
+            name = self._name,
+            passed = self._new_snaps == [],
+            new_snaps = self._new_snaps,
+            wall_time = self._wall_time,
+            cpu_time = self._cpu_time,
+            phases = self._phases,
+            snaps = list(self._snap_hashes)
+        )
+
+
+class Parametrized:
+    """
+    A test function run once for each case of a parameter table, created by a Test Suite. Each
+    case becomes a `Test` of its own named `<function>[<case id>]`, so it passes, fails and is
+    cached separately and keeps its snapshots in a directory of its own.
+
+    Cases are only turned into tests as they are run, so even a very large table costs nothing
+    to register.
+    """
+
+
+    def __init__(self,
+        function: TestFunction,
+        cases: Iterable[Any] | Callable[[], Iterable[Any]],
+        storage: Storage,
+        ids: Optional[Iterable[Any] | Callable[[Any], Any]] = None,
+        fixtures: Optional[FixtureSet] = None,
+        timeout: Optional[float] = None,
+        algorithm: str = DEFAULT_ALGORITHM
+    ) -> None:
+        """
+        Creates a parametrized test.
+
+        Args:
+            function: the callable that holds test logic, which may be a coroutine function.
+            cases: the arguments for each case, or a function returning them. A case is either
+                a dict of keyword arguments, a tuple of arguments to pass after the `Test`, or
+                a single argument.
+            storage: where snapshots are stored.
+            ids: the id of each case, or a function that makes one from a case. By default a
+                case's id is its position in the table.
+            fixtures: the fixtures the function may request by naming them as parameters.
+            timeout: the seconds each case may run for, see `Test`.
+            algorithm: the algorithm to hash snapshots with, see `Test`.
+        """
+        self._name = function.__name__
+        self._function = function
+        self._cases = cases
+        self._storage = storage
+
+        # Ids are kept so they can be gone through again on every run, unlike an iterator
+        self._ids = ids if ids is None or callable(ids) else list(ids)
+        self._fixtures = fixtures
+        self._timeout = timeout
+        self._algorithm = algorithm
+
+
+    def _is_async(self) -> bool:
+        return inspect.iscoroutinefunction(self._function)
+
+
+    def tests(self) -> Iterator[Test]:
+        """
+        Generates a test for each case, in order.
+
+        Raises:
+            ValueError: if there are more or fewer ids than cases, two cases have the same id, or
+                a case has too many arguments.
+        """
+        cases = self._cases() if callable(self._cases) else self._cases
+
+        # Only worked out once there is a tuple case that needs it
+        names: Optional[list[str]] = None
+        seen: set[str] = set()
+
+        count = 0
+        for index, case in enumerate(cases):
+            count = index + 1
+            if isinstance(self._ids, list):
+                if index == len(self._ids):
+                    raise ValueError(f"Parametrized test `{self._name}` has more cases than ids.")
+                case_id = _case_id(self._ids[index])
+            elif callable(self._ids):
+                case_id = _case_id(self._ids(case))
+            else:
+                case_id = str(index)
+
+            if case_id in seen:
+                raise ValueError(f"Parametrized test `{self._name}` has two cases `{case_id}`.")
+            seen.add(case_id)
+
+            if isinstance(case, dict):
+                arguments = case
+            else:
+                if names is None:
+                    names = list(inspect.signature(self._function).parameters)[1:]
+                values = case if isinstance(case, tuple) else (case,)
+                if len(values) > len(names):
+                    raise ValueError(
+                        f"Case `{case_id}` of `{self._name}` has more arguments than parameters."
+                    )
+                arguments = dict(zip(names, values))
+
+            yield Test(
+                name = f"{self._name}[{case_id}]",
+                function = partial(self._function, **arguments),
+                storage = self._storage,
+                fixtures = self._fixtures,
+                timeout = self._timeout,
+                algorithm = self._algorithm
+            )
+
+        # A table used up by an earlier run has no cases left, rather than too few
+        if isinstance(self._ids, list) and 0 < count < len(self._ids):
+            raise ValueError(f"Parametrized test `{self._name}` has more ids than cases.")
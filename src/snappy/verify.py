@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import os
+import mmap
+from pathlib import Path
+from typing import Iterator, Optional
+from concurrent.futures import ProcessPoolExecutor
+
+from .hashing import DEFAULT_ALGORITHM, hasher
+from .objects import OBJECTS_DIR, read_object
+from .snapshot import _is_binary_data, _load_snapshot, _meta_of, _meta_text
+
+
+# Snapshots are handed to worker processes in batches of this many, and trees with fewer than
+# this many aren't worth starting any for
+VERIFY_CHUNK = 64
+
+
+def find_snaps(directory: Path) -> Iterator[Path]:
+    """
+    Finds every snapshot file, accepted or new, anywhere under a directory, in a stable order.
+    Object stores are skipped over, as they hold no snapshot files.
+    """
+    try:
+        entries = sorted(os.scandir(directory), key=lambda entry: entry.name)
+    except (FileNotFoundError, NotADirectoryError):
+        return
+
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            if entry.name != OBJECTS_DIR:
+                yield from find_snaps(Path(entry.path))
+        elif entry.name.endswith((".snap", ".snap.new")):
+            yield Path(entry.path)
+
+
+def check_snap(path: Path) -> Optional[str]:
+    """
+    Checks a snapshot file's content still matches the hash in its header. Content is mapped
+    into memory and hashed where it is, rather than read in.
+
+    Args:
+        path: the location of the snapshot file.
+    Returns:
+        What is wrong with the snapshot, or None if nothing is.
+    """
+    try:
+        with path.open("rb") as file:
+            # Lines are read one at a time so that the file position lands just past the header
+            lines = (line.decode("utf-8") for line in iter(file.readline, b""))
+            data = _load_snapshot(lines, load_content=False)
+            start = file.tell()
+
+            expected = data["hash"]
+            hashing = hasher(data.get("algorithm", DEFAULT_ALGORITHM))
+
+            # What an array's bytes mean is hashed along with them, see `Snapshot.array`
+            if "dtype" in data:
+                hashing.update(_meta_text(_meta_of(data)).encode("utf-8"))
+
+            if "blob" in data:
+                if file.read() != b"---":
+                    return "malformed: content follows an object reference"
+                hashing.update(read_object(path.parent / data["blob"]))
+
+            else:
+                size = os.fstat(file.fileno()).st_size
+                if size - start < 4:
+                    return "malformed: content isn't closed by a delimiter"
+
+                # Binary content gives its length, which must account for the rest of the file
+                end = size - 4
+                if _is_binary_data(data) and "length" not in data:
+                    return "malformed: binary content doesn't give its length"
+                if "length" in data and int(data["length"]) != end - start:
+                    return "malformed: content isn't the length given in its header"
+
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                    if buffer[end:] != b"\n---":
+                        return "malformed: content isn't closed by a delimiter"
+                    with memoryview(buffer) as view, view[start:end] as content:
+                        hashing.update(content)
+
+    except FileNotFoundError as error:
+        return f"missing: {error.filename}"
+    except OSError as error:
+        return f"unreadable: {error.strerror}"
+    except (KeyError, ValueError) as error:
+        return f"malformed: {error}"
+
+    if hashing.hexdigest() != expected:
+        return "corrupt: content doesn't match its hash"
+    return None
+
+
+def verify(directory: Path, workers: Optional[int] = None) -> Iterator[tuple[Path, Optional[str]]]:
+    """
+    Checks every snapshot file under a directory, see `check_snap`. Files are checked in a
+    process pool, so hashing a large tree runs on every core.
+
+    Args:
+        directory: the directory to look for snapshot files in.
+        workers: the number of processes to check files in, by default one per core.
+    Returns:
+        Each snapshot file, in order, along with what is wrong with it, if anything.
+    """
+    paths = list(find_snaps(directory))
+    workers = workers if workers is not None else os.cpu_count() or 1
+
+    if workers <= 1 or len(paths) < VERIFY_CHUNK:
+        yield from ((path, check_snap(path)) for path in paths)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from zip(paths, pool.map(check_snap, paths, chunksize=VERIFY_CHUNK))
@@ -0,0 +1,501 @@
+from __future__ import annotations
+
+import os
+import sys
+import time
+import ctypes
+import ctypes.util
+import select
+import struct
+import importlib
+import importlib.util
+import traceback
+from abc import ABC, abstractmethod
+from fnmatch import fnmatch
+from graphlib import CycleError, TopologicalSorter
+from pathlib import Path
+from types import ModuleType
+from typing import Callable, Optional
+
+from .deps import _is_source
+from .discovery import TEST_PATTERNS, _import, _module_name, _suites_in, discover
+from .suite import TestSuite
+
+
+# Changes arriving within this many seconds of each other are handled together, as editors
+# often write a file in several steps
+DEBOUNCE = 0.05
+
+# Seconds between scans of the watched directories, when they can't be watched with inotify
+POLL_INTERVAL = 0.25
+
+# snappy's own modules are never reloaded
+_PACKAGE_DIR = Path(__file__).resolve().parent
+
+# See `inotify(7)`
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT = struct.Struct("iIII")
+
+
+def _is_watched(path: Path) -> bool:
+    # Only source files and accepted snapshots matter. New snapshots, indexes and the like are
+    # written by test runs, so reacting to them would rerun tests forever.
+    return path.suffix == ".py" or path.name.endswith(".snap")
+
+
+def _skipped(name: str) -> bool:
+    return name.startswith(".") or name == "__pycache__"
+
+
+class Watcher(ABC):
+    """
+    Watches directories for changes to source files and accepted snapshots.
+    """
+
+
+    @abstractmethod
+    def add(self, directory: Path, recursive: bool = True) -> None:
+        """
+        Starts watching a directory, if it isn't already watched.
+
+        Args:
+            directory: the directory to watch.
+            recursive: whether to also watch every directory within it, including those made
+                later on.
+        """
+
+
+    @abstractmethod
+    def _read(self, timeout: Optional[float]) -> set[Path]:
+        # Waits up to `timeout` seconds, or forever if None, for changes, returning the paths
+        # changed
+        ...
+
+
+    def close(self) -> None:
+        """
+        Stops watching. Does nothing by default.
+        """
+
+
+    def wait(self, timeout: Optional[float] = None) -> set[Path]:
+        """
+        Waits for files to change, then for changes to settle down.
+
+        Args:
+            timeout: the longest to wait in seconds, by default forever.
+        Returns:
+            The paths of the source files and snapshots that were changed, created or deleted,
+            which is empty if nothing changed before the timeout.
+        """
+        # Changes to files that aren't watched, such as new snapshots, are waited past
+        deadline = None if timeout is None else time.monotonic() + timeout
+        changed: set[Path] = set()
+        while not changed:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            changed = {path for path in self._read(remaining) if _is_watched(path)}
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+
+        if not changed:
+            return changed
+
+        while more := self._read(DEBOUNCE):
+            changed |= {path for path in more if _is_watched(path)}
+        return changed
+
+
+    def __enter__(self) -> Watcher:
+        return self
+
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+class InotifyWatcher(Watcher):
+    """
+    Watches directories with Linux's inotify, so changes are noticed straight away without
+    scanning anything.
+    """
+
+
+    def __init__(self) -> None:
+        """
+        Creates an inotify watcher.
+
+        Raises:
+            OSError: if inotify isn't available.
+        """
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            self._add_watch = libc.inotify_add_watch
+        except (OSError, AttributeError) as error:
+            raise OSError("inotify isn't available on this platform.") from error
+
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._fd = libc.inotify_init1(IN_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+
+        # Each watch descriptor's directory, and whether directories made within it are watched
+        self._directories: dict[int, tuple[Path, bool]] = {}
+        self._watched: dict[Path, bool] = {}
+
+
+    def add(self, directory: Path, recursive: bool = True) -> None:
+        if self._watched.get(directory) in (True, recursive):
+            return
+
+        descriptor = self._add_watch(self._fd, os.fsencode(directory), WATCH_MASK)
+        if descriptor < 0:
+            return
+
+        self._directories[descriptor] = (directory, recursive)
+        self._watched[directory] = recursive
+        if recursive:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False) and not _skipped(entry.name):
+                        self.add(Path(entry.path))
+
+
+    def _read(self, timeout: Optional[float]) -> set[Path]:
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return set()
+
+        changed = set()
+        buffer = os.read(self._fd, 64 * 1024)
+        offset = 0
+        while offset < len(buffer):
+            descriptor, mask, _, length = EVENT.unpack_from(buffer, offset)
+            name = buffer[offset + EVENT.size:offset + EVENT.size + length].rstrip(b"\0")
+            offset += EVENT.size + length
+
+            if mask & IN_IGNORED:
+                if (removed := self._directories.pop(descriptor, None)) is not None:
+                    self._watched.pop(removed[0], None)
+                continue
+            if descriptor not in self._directories:
+                continue
+
+            directory, recursive = self._directories[descriptor]
+            path = directory / os.fsdecode(name)
+            if mask & IN_ISDIR:
+                # Files written before the new directory was watched would go unnoticed
+                if recursive and mask & (IN_CREATE | IN_MOVED_TO) and not _skipped(path.name):
+                    self.add(path)
+                    changed.update(file for file in path.rglob("*") if file.is_file())
+            else:
+                changed.add(path)
+
+        return changed
+
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class PollingWatcher(Watcher):
+    """
+    Watches directories by scanning them every so often for files with a new modification time
+    or size, for platforms without inotify.
+    """
+
+
+    def __init__(self, interval: float = POLL_INTERVAL) -> None:
+        """
+        Creates a polling watcher.
+
+        Args:
+            interval: the seconds between scans.
+        """
+        self._interval = interval
+        self._directories: dict[Path, bool] = {}
+        self._files: dict[Path, tuple[int, int]] = {}
+
+
+    def add(self, directory: Path, recursive: bool = True) -> None:
+        if self._directories.get(directory) in (True, recursive):
+            return
+
+        self._directories[directory] = recursive
+        self._files.update(self._scan(directory, recursive))
+
+
+    def _scan(self, directory: Path, recursive: bool) -> dict[Path, tuple[int, int]]:
+        files = {}
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive and not _skipped(entry.name):
+                            files.update(self._scan(Path(entry.path), recursive))
+                    elif _is_watched(path := Path(entry.path)):
+                        stat = entry.stat()
+                        files[path] = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            pass
+        return files
+
+
+    def _read(self, timeout: Optional[float]) -> set[Path]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            time.sleep(self._interval if deadline is None else
+                       max(0.0, min(self._interval, deadline - time.monotonic())))
+
+            files = {}
+            for directory, recursive in self._directories.items():
+                files.update(self._scan(directory, recursive))
+
+            changed = {
+                path for path in files.keys() | self._files.keys()
+                if files.get(path) != self._files.get(path)
+            }
+            self._files = files
+            if changed or (deadline is not None and time.monotonic() >= deadline):
+                return changed
+
+
+def open_watcher() -> Watcher:
+    """
+    Creates the best watcher for the platform, using inotify where it's available and polling
+    elsewhere.
+    """
+    try:
+        return InotifyWatcher()
+    except OSError:
+        return PollingWatcher()
+
+
+def _source_modules() -> dict[Path, ModuleType]:
+    # The loaded modules that may be reloaded, by file: not the standard library, installed
+    # packages or snappy itself
+    modules = {}
+    for module in list(sys.modules.values()):
+        filename = getattr(module, "__file__", None)
+        if not filename or not _is_source(filename):
+            continue
+
+        path = Path(filename).resolve()
+        if _PACKAGE_DIR not in path.parents:
+            modules[path] = module
+    return modules
+
+
+def _imports_of(module: ModuleType) -> set[str]:
+    # The names of the modules whose modules, functions or classes a module holds on to, which
+    # would go stale when those modules were reloaded
+    names = set()
+    for value in list(vars(module).values()):
+        try:
+            if isinstance(value, ModuleType):
+                names.add(value.__name__)
+            elif isinstance(name := getattr(value, "__module__", None), str):
+                names.add(name)
+        except Exception:
+            continue
+    names.discard(module.__name__)
+    return names
+
+
+class WatchSession:
+    """
+    The suites discovered in a test directory, kept loaded between runs so that only the
+    modules that change have to be imported again.
+    """
+
+
+    def __init__(self, directory: Path, workers: int = 1) -> None:
+        """
+        Creates a session for a test directory. Nothing is discovered until `start` is called.
+
+        Args:
+            directory: the test directory.
+            workers: the number of processes to discover suites with to start with.
+        """
+        self._directory = directory.resolve()
+        self._workers = workers
+
+        # Each test module's suites, by module file
+        self._suites: dict[Path, list[TestSuite]] = {}
+
+
+    def start(self) -> list[TestSuite]:
+        """
+        Discovers every suite in the test directory.
+
+        Returns:
+            Each suite found, in the order of the modules defining them.
+        """
+        suites = discover(self._directory, self._workers)
+        for path in sorted(self._directory.rglob("*.py")):
+            module = sys.modules.get(_module_name(path, self._directory))
+            if module is not None and module.__file__ == str(path):
+                self._suites[path] = [suite for suite in _suites_in(module) if suite in suites]
+        return suites
+
+
+    def directories(self) -> list[tuple[Path, bool]]:
+        """
+        The directories to watch, along with whether to watch within them: the test directory,
+        each suite's snapshot directory and the directory of every loaded source module.
+        """
+        directories = [(self._directory, True)]
+        directories += [
+            (suite._snaps_dir.resolve(), True)
+            for suites in self._suites.values() for suite in suites if suite._snaps_dir.exists()
+        ]
+        directories += [(path.parent, False) for path in _source_modules()]
+        return list(dict.fromkeys(directories))
+
+
+    def affected(self, changed: set[Path], display_func: Callable = print) -> list[TestSuite]:
+        """
+        Reloads the changed modules, along with every module using them, and works out which
+        suites need running again: those whose test modules were reloaded, and those with
+        changed accepted snapshots. Modules that fail to reload are reported and left as they
+        were.
+
+        Args:
+            changed: the paths changed, see `Watcher.wait`.
+            display_func: the callable that reload errors are pushed to.
+        Returns:
+            The suites to run, in the order of the modules defining them.
+        """
+        changed = {path.resolve() for path in changed}
+        reloaded = self._reload({path for path in changed if path.suffix == ".py"}, display_func)
+
+        snaps = [path for path in changed if path.name.endswith(".snap")]
+        affected = []
+        for path in sorted(self._suites):
+            for suite in self._suites[path]:
+                directory = suite._snaps_dir.resolve()
+                if path in reloaded or any(directory in snap.parents for snap in snaps):
+                    affected.append(suite)
+        return affected
+
+
+    def _is_test_module(self, path: Path) -> bool:
+        return self._directory in path.parents and any(
+            fnmatch(path.name, pattern) for pattern in TEST_PATTERNS
+        )
+
+
+    def _reload(self, changed: set[Path], display_func: Callable) -> set[Path]:
+        # Reloads changed modules before the modules using them, returning the files of those
+        # reloaded. Test modules are imported afresh rather than reloaded, as they are imported
+        # outside of any package.
+        modules = _source_modules()
+        names = {module.__name__: path for path, module in modules.items()}
+
+        users: dict[str, set[str]] = {}
+        for module in modules.values():
+            for name in _imports_of(module) & names.keys():
+                users.setdefault(name, set()).add(module.__name__)
+
+        pending = [modules[path].__name__ for path in changed if path in modules]
+        stale = set(pending)
+        while pending:
+            for user in users.get(pending.pop(), ()):
+                if user not in stale:
+                    stale.add(user)
+                    pending.append(user)
+
+        graph = {name: _imports_of(sys.modules[name]) & stale for name in stale}
+        try:
+            order = list(TopologicalSorter(graph).static_order())
+        except CycleError:
+            order = sorted(stale)
+
+        files = [names[name] for name in order]
+        files += sorted(path for path in changed if path not in modules and self._is_test_module(path))
+
+        reloaded = set()
+        for path in files:
+            # Bytecode is only checked against the second a file was changed in, which edits
+            # made in quick succession can share
+            Path(importlib.util.cache_from_source(str(path))).unlink(missing_ok=True)
+            try:
+                if self._is_test_module(path):
+                    self._import_test_module(path)
+                elif path.exists():
+                    importlib.reload(modules[path])
+                reloaded.add(path)
+            except Exception:
+                display_func(traceback.format_exc().rstrip())
+        return reloaded
+
+
+    def _import_test_module(self, path: Path) -> None:
+        name = _module_name(path, self._directory)
+        previous = sys.modules.pop(name, None)
+        self._suites.pop(path, None)
+        if not path.exists():
+            return
+
+        try:
+            self._suites[path] = _suites_in(_import(path, self._directory))
+        except BaseException:
+            # The suites of the last good version are kept, to be rerun once it is fixed
+            if previous is not None:
+                sys.modules[name] = previous
+                self._suites[path] = _suites_in(previous)
+            raise
+
+
+def _run_reporting(
+    run: Callable[[list[TestSuite]], object], suites: list[TestSuite], display_func: Callable
+) -> None:
+    # A test raising shouldn't stop the watching, as the next change may well fix it
+    try:
+        run(suites)
+    except Exception:
+        display_func(traceback.format_exc().rstrip())
+
+
+def watch(
+    directory: Path,
+    run: Callable[[list[TestSuite]], object],
+    workers: int = 1,
+    display_func: Callable = print,
+    watcher: Optional[Watcher] = None
+) -> None:
+    """
+    Runs every suite in a test directory, then keeps running the suites affected by each change
+    to the test modules, the source they use or their accepted snapshots, until interrupted.
+
+    Args:
+        directory: the test directory.
+        run: called with the suites to run, each time some need running. Anything it raises
+            is reported, and watching carries on.
+        workers: the number of processes to discover suites with to start with.
+        display_func: the callable that progress is pushed to.
+        watcher: how to watch for changes, by default the best the platform has.
+    """
+    session = WatchSession(directory, workers)
+    _run_reporting(run, session.start(), display_func)
+
+    with watcher or open_watcher() as watcher:
+        while True:
+            for watched, recursive in session.directories():
+                if watched.is_dir():
+                    watcher.add(watched, recursive)
+
+            display_func("Watching for changes, press Ctrl+C to stop.")
+            suites = session.affected(watcher.wait(), display_func)
+            if suites:
+                _run_reporting(run, suites, display_func)
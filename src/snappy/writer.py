@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import os
+import threading
+from collections import deque
+from pathlib import Path
+from typing import IO, Optional
+
+from .snapshot import Snapshot
+from .objects import ObjectStore
+
+
+def _temp_path(path: Path) -> Path:
+    return path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+
+def write_atomically(
+    snapshot: Snapshot, path: Path, objects: Optional[ObjectStore] = None, fsync: bool = False
+) -> None:
+    """
+    Saves a snapshot to a temporary file which is then renamed into place, so the file at `path`
+    is only ever missing, the old version, or the complete new version.
+
+    Args:
+        snapshot: the snapshot to save.
+        path: the location to store the snapshot.
+        objects: an object store to keep the content in, see `Snapshot.save_to`.
+        fsync: flag that flushes the file to disk before it is renamed into place.
+    """
+    temp = _temp_path(path)
+    with temp.open("wb") as file:
+        snapshot._write(file, path, objects)
+        if fsync:
+            file.flush()
+            os.fsync(file.fileno())
+    os.replace(temp, path)
+
+
+class SnapshotWriter:
+    """
+    Writes snapshots on a background thread, so that tests creating many new snapshots don't wait
+    on the disk. Snapshots are written in batches: each is written to a temporary file, the batch
+    is flushed to disk together, and only then is each renamed into place.
+
+    The writer holds at most `max_bytes` of snapshot content at a time, past which submitting
+    blocks until earlier snapshots are written. Call `flush` to wait for every submitted snapshot
+    to be written.
+    """
+
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, batch_size: int = 64, fsync: bool = True) -> None:
+        """
+        Creates a writer. The background thread is started when the first snapshot is submitted.
+
+        Args:
+            max_bytes: the amount of snapshot content that may be waiting to be written.
+            batch_size: the most snapshots written and flushed to disk together.
+            fsync: flag that flushes each batch to disk before renaming it into place.
+        """
+        self._max_bytes = max_bytes
+        self._batch_size = batch_size
+        self._fsync = fsync
+
+        self._queue: deque[tuple[Snapshot, Path, Optional[ObjectStore], int]] = deque()
+        self._queued_bytes = 0
+        self._writing = 0
+        self._error: Optional[BaseException] = None
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+
+    def submit(self, snapshot: Snapshot, path: Path, objects: Optional[ObjectStore] = None) -> None:
+        """
+        Queues a snapshot to be written, taking ownership of it: it is closed once written.
+
+        Args:
+            snapshot: the snapshot to save.
+            path: the location to store the snapshot.
+            objects: an object store to keep the content in, see `Snapshot.save_to`.
+        """
+        size = snapshot._size()
+        with self._condition:
+            # An empty queue always takes the snapshot, however big, so it can't block forever
+            while self._queue and self._queued_bytes + size > self._max_bytes:
+                self._condition.wait()
+
+            self._queue.append((snapshot, path, objects, size))
+            self._queued_bytes += size
+            self._condition.notify_all()
+
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._work, name="snappy-writer", daemon=True)
+                self._thread.start()
+
+
+    def flush(self) -> None:
+        """
+        Waits until every submitted snapshot has been written.
+
+        Raises:
+            OSError: or whichever error first stopped a snapshot being written.
+        """
+        with self._condition:
+            while self._queue or self._writing:
+                self._condition.wait()
+
+            error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+
+    def _work(self) -> None:
+        while True:
+            with self._condition:
+                while not self._queue:
+                    self._condition.wait()
+
+                batch = []
+                while self._queue and len(batch) < self._batch_size:
+                    batch.append(self._queue.popleft())
+                self._writing = len(batch)
+
+            try:
+                self._write_batch(batch)
+            except BaseException as error:
+                with self._condition:
+                    self._error = self._error or error
+
+            with self._condition:
+                self._queued_bytes -= sum(size for *_, size in batch)
+                self._writing = 0
+                self._condition.notify_all()
+
+
+    def _write_batch(self, batch: list[tuple[Snapshot, Path, Optional[ObjectStore], int]]) -> None:
+        written: list[tuple[IO[bytes], Path, Path]] = []
+        complete = False
+        try:
+            for snapshot, path, objects, _ in batch:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                temp = _temp_path(path)
+                file = temp.open("wb")
+                written.append((file, temp, path))
+                snapshot._write(file, path, objects)
+
+            # Everything in the batch reaches the disk before anything is renamed into place
+            for file, _, _ in written:
+                file.flush()
+                if self._fsync:
+                    os.fsync(file.fileno())
+            complete = True
+
+        finally:
+            for file, temp, _ in written:
+                file.close()
+                if not complete:
+                    temp.unlink(missing_ok=True)
+            for snapshot, *_ in batch:
+                snapshot.close()
+
+        for _, temp, path in written:
+            os.replace(temp, path)
@@ -0,0 +1,48 @@
+from unittest import TestCase
+from tempfile import mkdtemp
+from shutil import rmtree
+from pathlib import Path
+
+from snappy.benchmark import compare, format_results, load_results, run_benchmarks, save_results
+from snappy.hashing import available_algorithms
+
+
+def results(**seconds: float) -> dict:
+    return {"benchmarks": {name: {"seconds": value} for name, value in seconds.items()}}
+
+
+class TestRunning(TestCase):
+
+    def setUp(self) -> None:
+        self.path = Path(mkdtemp())
+
+    def test_runs_every_benchmark(self) -> None:
+        ran = run_benchmarks(content_sizes=[1024], suite_sizes=[10], repeat=1)
+        hashes = [f"hash_{algorithm}/1KiB" for algorithm in available_algorithms()[1:]]
+        self.assertEqual([
+            "hash/1KiB", *hashes, "hash_array/1KiB", "canonical", "load_header", "save/1KiB",
+            "snap/match", "snap/mismatch",
+            "suite/10/register", "suite/10/first_run", "suite/10/rerun",
+        ], list(ran["benchmarks"]))
+        self.assertEqual(10 + len(hashes), len(list(format_results(ran))))
+
+    def test_round_trips(self) -> None:
+        saved = results(hash=0.5)
+        save_results(saved, self.path / "bench.json")
+        self.assertEqual(saved, load_results(self.path / "bench.json"))
+
+    def tearDown(self) -> None:
+        rmtree(self.path)
+
+
+class TestComparing(TestCase):
+
+    def test_within_threshold(self) -> None:
+        self.assertEqual([], compare(results(hash=1.0), results(hash=1.05), threshold=0.1))
+
+    def test_regression(self) -> None:
+        regressions = compare(results(hash=1.0, save=1.0), results(hash=1.5, save=0.5))
+        self.assertEqual(["hash: 1.000000s -> 1.500000s (1.50x)"], regressions)
+
+    def test_ignores_new_benchmarks(self) -> None:
+        self.assertEqual([], compare(results(), results(hash=1.0)))
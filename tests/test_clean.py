@@ -0,0 +1,119 @@
+from unittest import TestCase
+from tempfile import mkdtemp
+from shutil import rmtree
+from pathlib import Path
+
+from snappy.clean import prune
+from snappy.history import HISTORY_NAME
+from snappy.index import INDEX_NAME
+from snappy.storage import SqliteStorage, DATABASE_NAME
+from snappy.suite import TestSuite
+from snappy.test import Test
+
+
+def discard(*args, **kwargs) -> None:
+    _, _ = args, kwargs
+
+
+def snap_greeting(test: Test) -> None:
+    test.snap("hello, world!", "greeting")
+
+
+def snap_value(test: Test, value: int) -> None:
+    test.snap(str(value), "value")
+
+
+class TestPrune(TestCase):
+
+    def setUp(self) -> None:
+        self.path = Path(mkdtemp())
+        self.suite = TestSuite(self.path)
+        self.suite.test_case(snap_greeting)
+        self.suite.run_tests(display_func=discard)
+        (self.path / "snap_greeting" / "greeting.snap.new").rename(
+            self.path / "snap_greeting" / "greeting.snap"
+        )
+        self.suite.run_tests(display_func=discard)
+
+    def write_snap(self, test_name: str, file_name: str) -> Path:
+        path = self.path / test_name / file_name
+        path.parent.mkdir(exist_ok=True)
+        path.write_text("")
+        return path
+
+    def test_removes_snaps_not_taken(self) -> None:
+        stale = self.write_snap("snap_greeting", "farewell.snap")
+        new = self.write_snap("snap_greeting", "farewell.snap.new")
+
+        self.assertEqual([stale, new], prune([self.suite]))
+        self.assertFalse(stale.exists() or new.exists())
+        self.assertTrue((self.path / "snap_greeting" / "greeting.snap").exists())
+
+    def test_removes_unregistered_tests(self) -> None:
+        stale = self.write_snap("removed", "greeting.snap")
+
+        self.assertEqual([stale.parent, stale], prune([self.suite]))
+        self.assertFalse(stale.parent.exists())
+        self.assertTrue((self.path / INDEX_NAME).exists())
+        self.assertTrue((self.path / HISTORY_NAME).exists())
+
+    def test_keeps_other_files(self) -> None:
+        notes = self.write_snap("removed", "notes.txt")
+        stale = self.write_snap("removed", "greeting.snap")
+
+        self.assertEqual([stale], prune([self.suite]))
+        self.assertTrue(notes.exists())
+
+    def test_keeps_tests_never_run(self) -> None:
+        self.suite.test_case(snap_value)
+        kept = self.write_snap("snap_value", "value.snap")
+        self.assertEqual([], prune([self.suite]))
+        self.assertTrue(kept.exists())
+
+    def test_keeps_used_cases(self) -> None:
+        cases = iter(range(3))
+        self.suite.parametrize(cases)(snap_value)
+        self.suite.run_tests(display_func=discard)
+        stale = self.write_snap("snap_value[5]", "value.snap")
+
+        # The cases have all been used up, so none can be told apart from a removed case
+        self.assertEqual([], prune([self.suite]))
+        self.assertTrue(stale.exists())
+
+    def test_dry_run(self) -> None:
+        stale = self.write_snap("removed", "greeting.snap")
+        self.assertEqual([stale.parent, stale], prune([self.suite], dry_run=True))
+        self.assertTrue(stale.exists())
+
+    def test_shared_directory(self) -> None:
+        other = TestSuite(self.path)
+        other.parametrize(range(2))(snap_value)
+        other.run_tests(display_func=discard)
+
+        # Each suite's tests are registered for the other's, so neither's snaps are removed
+        self.assertEqual([], prune([self.suite, other]))
+        self.assertEqual(2, len(list(self.path.glob("snap_value*/*.snap.new"))))
+
+    def tearDown(self) -> None:
+        rmtree(self.path)
+
+
+class TestSqlitePrune(TestCase):
+
+    def setUp(self) -> None:
+        self.path = Path(mkdtemp())
+
+    def test_removes_rows(self) -> None:
+        suite = TestSuite(self.path, backend="sqlite")
+        suite.parametrize(range(2))(snap_value)
+        suite.run_tests(display_func=discard)
+
+        suite = TestSuite(self.path, backend="sqlite")
+        suite.parametrize(range(1))(snap_value)
+        self.assertEqual([self.path / "snap_value[1]" / "value.snap.new"], prune([suite]))
+
+        rows = [(s._test, new) for s, new in SqliteStorage(self.path / DATABASE_NAME).snapshots()]
+        self.assertEqual([("snap_value[0]", True)], rows)
+
+    def tearDown(self) -> None:
+        rmtree(self.path)
@@ -0,0 +1,77 @@
+from unittest import TestCase
+from tempfile import mkdtemp
+from shutil import rmtree
+from pathlib import Path
+
+from snappy.content import ContentView
+from snappy.objects import ObjectStore
+from snappy.snapshot import Snapshot
+
+
+class TestContentView(TestCase):
+
+    def setUp(self) -> None:
+        self.view = ContentView(b"header\nfirst\nsecond\n\nfourth\ntrailer", 7, 27)
+
+    def test_decodes_region(self) -> None:
+        self.assertEqual("first\nsecond\n\nfourth", str(self.view))
+        self.assertEqual(20, len(self.view))
+
+    def test_slices_lines(self) -> None:
+        self.assertEqual(4, self.view.line_count())
+        self.assertEqual(["second", ""], self.view.lines(1, 3))
+        self.assertEqual(["fourth"], self.view.lines(-1))
+        self.assertEqual([], self.view.lines(10, 12))
+
+    def test_iterates_lines(self) -> None:
+        self.assertEqual(["first", "second", "", "fourth"], list(self.view.iter_lines()))
+
+    def test_copies_bytes(self) -> None:
+        self.assertEqual(b"second", self.view.tobytes(6, 12))
+
+
+class TestLazyLoading(TestCase):
+
+    def setUp(self) -> None:
+        self.path = Path(mkdtemp())
+
+    def test_maps_content(self) -> None:
+        original = Snapshot.new("test", "snap", "hello,\nworld!\n")
+        original.save_to(self.path / "snap.snap")
+
+        loaded = Snapshot.load_from(self.path / "snap.snap", lazy=True)
+        self.assertTrue(original == loaded)
+        self.assertIsNone(loaded._content)
+        self.assertEqual("hello,\nworld!\n", str(loaded._view))
+        self.assertEqual(["world!"], loaded._view.lines(1, 2))
+        loaded.close()
+
+    def test_maps_empty_content(self) -> None:
+        Snapshot.new("test", "snap", "").save_to(self.path / "snap.snap")
+        loaded = Snapshot.load_from(self.path / "snap.snap", lazy=True)
+        self.assertEqual("", str(loaded._view))
+        loaded.close()
+
+    def test_resaves_mapped_content(self) -> None:
+        original = Snapshot.new("test", "snap", "hello,\nworld!\n")
+        original.save_to(self.path / "snap.snap")
+
+        loaded = Snapshot.load_from(self.path / "snap.snap", lazy=True)
+        loaded.save_to(self.path / "copy.snap")
+        loaded.close()
+        self.assertEqual(original._content, Snapshot.load_from(self.path / "copy.snap", True)._content)
+
+    def test_reads_blobs(self) -> None:
+        (self.path / "test").mkdir()
+        Snapshot.new("test", "snap", "hello, world!").save_to(
+            self.path / "test" / "snap.snap", ObjectStore(self.path)
+        )
+        loaded = Snapshot.load_from(self.path / "test" / "snap.snap", lazy=True)
+        self.assertEqual("hello, world!", str(loaded._view))
+
+    def test_rejects_truncated_file(self) -> None:
+        (self.path / "snap.snap").write_text("---\ntest: t\nsnap: s\nhash: h\ndate: d\n---\nhello")
+        self.assertRaises(ValueError, Snapshot.load_from, self.path / "snap.snap", lazy=True)
+
+    def tearDown(self) -> None:
+        rmtree(self.path)
@@ -0,0 +1,83 @@
+import sys
+import importlib
+from typing import Callable
+from unittest import TestCase
+from tempfile import mkdtemp
+from shutil import rmtree
+from pathlib import Path
+
+from snappy.deps import DEPS_NAME, trace_sources
+from snappy.suite import TestSuite
+from snappy.test import Test
+
+
+def arg_capturer(context: list) -> Callable:
+    def capture_args(*args, **kwargs):
+        context.append([args, kwargs])
+    return capture_args
+
+
+class TestTracing(TestCase):
+
+    def test_records_own_file(self) -> None:
+        self.assertIn(__file__, trace_sources(lambda: None))
+
+    def test_ignores_standard_library(self) -> None:
+        sources = trace_sources(lambda: importlib.util.find_spec("json"))
+        self.assertNotIn(importlib.util.__file__, sources)
+
+
+class TestChangedRuns(TestCase):
+
+    def setUp(self) -> None:
+        self.path = Path(mkdtemp())
+        (self.path / "snappy_deps_helper.py").write_text("def greet():\n    return 'hello'\n")
+        sys.path.insert(0, str(self.path))
+        self.helper = importlib.import_module("snappy_deps_helper")
+
+        self.suite = TestSuite(self.path / "snaps")
+        self.runs = []
+
+        @self.suite.test_case
+        def greeting(test: Test) -> None:
+            self.runs.append("greeting")
+            test.snap(self.helper.greet(), "greeting")
+
+        _ = greeting
+
+    def run_and_accept(self) -> list:
+        capture = []
+        self.suite.run_tests(display_func=arg_capturer(capture), changed=True)
+        for file in self.path.rglob("*.new"):
+            file.rename(file.with_suffix(""))
+        return capture
+
+    def test_skips_unchanged(self) -> None:
+        self.run_and_accept()
+        self.run_and_accept()
+        capture = self.run_and_accept()
+
+        # The first run fails, so only the second records dependencies
+        self.assertEqual(["greeting", "greeting"], self.runs)
+        self.assertEqual([('cached.',), {}], capture[1])
+        self.assertEqual([('  1 test passed',), {}], capture[-3])
+        self.assertTrue((self.path / "snaps" / DEPS_NAME).exists())
+
+    def test_reruns_on_source_change(self) -> None:
+        self.run_and_accept()
+        self.run_and_accept()
+        (self.path / "snappy_deps_helper.py").write_text("def greet():\n    return 'hi'\n")
+        self.run_and_accept()
+        self.assertEqual(3, len(self.runs))
+
+    def test_reruns_on_snapshot_change(self) -> None:
+        self.run_and_accept()
+        self.run_and_accept()
+        (self.path / "snaps" / "greeting" / "greeting.snap").unlink()
+        self.run_and_accept()
+        self.assertEqual(3, len(self.runs))
+
+    def tearDown(self) -> None:
+        sys.path.remove(str(self.path))
+        del sys.modules["snappy_deps_helper"]
+        rmtree(self.path)
@@ -0,0 +1,111 @@
+import sys
+import subprocess
+from unittest import TestCase
+from tempfile import mkdtemp
+from shutil import rmtree
+from pathlib import Path
+from contextlib import redirect_stdout
+from io import StringIO
+
+import snappy
+from snappy.core import run_tests
+from snappy.discovery import CACHE_DIR, CACHE_NAME, DiscoveryCache, discover
+
+
+SUITE_MODULE = """
+from pathlib import Path
+from snappy.suite import TestSuite
+
+Path(__file__).with_suffix(".imported").touch()
+suite = TestSuite(Path(__file__).parent / "snaps")
+
+@suite.test_case
+def greeting(test):
+    test.snap("hello, world!", "greeting")
+"""
+
+HELPER_MODULE = """
+from pathlib import Path
+
+Path(__file__).with_suffix(".imported").touch()
+"""
+
+
+class TestDiscovery(TestCase):
+
+    def setUp(self) -> None:
+        self.path = Path(mkdtemp()) / "tests"
+        (self.path / "nested").mkdir(parents=True)
+        (self.path / "test_suite_module.py").write_text(SUITE_MODULE)
+        (self.path / "nested" / "helpers_test.py").write_text(HELPER_MODULE)
+        (self.path / "helpers.py").write_text("raise RuntimeError")
+
+    def forget_modules(self) -> None:
+        for name in [name for name in sys.modules if name.startswith("tests.")]:
+            if sys.modules[name].__file__.startswith(str(self.path)):
+                del sys.modules[name]
+        for imported in self.path.rglob("*.imported"):
+            imported.unlink()
+
+    def test_finds_suites(self) -> None:
+        suites = discover(self.path)
+        self.assertEqual(1, len(suites))
+        self.assertEqual("greeting", suites[0]._tests[0]._name)
+
+    def test_caches_modules_without_suites(self) -> None:
+        discover(self.path)
+        self.forget_modules()
+
+        discover(self.path)
+        self.assertTrue((self.path / "test_suite_module.imported").exists())
+        self.assertFalse((self.path / "nested" / "helpers_test.imported").exists())
+
+    def test_rescans_changed_modules(self) -> None:
+        discover(self.path)
+        self.forget_modules()
+
+        (self.path / "nested" / "helpers_test.py").write_text(HELPER_MODULE + "\n# changed\n")
+        discover(self.path)
+        self.assertTrue((self.path / "nested" / "helpers_test.imported").exists())
+
+    def test_scans_in_workers(self) -> None:
+        suites = discover(self.path, workers=2)
+        self.assertEqual(1, len(suites))
+
+        cache = DiscoveryCache(self.path)
+        cache.load()
+        self.assertFalse(cache.lookup(self.path / "nested" / "helpers_test.py"))
+        self.assertTrue((self.path / CACHE_DIR / CACHE_NAME).exists())
+        self.assertEqual([], list(self.path.glob("*.json")))
+
+    def test_runs_under_one_summary(self) -> None:
+        output = StringIO()
+        with redirect_stdout(output):
+            passed = run_tests(self.path)
+        self.assertFalse(passed)
+        self.assertIn("1 test ran:", output.getvalue())
+        self.assertTrue((self.path / "snaps" / "greeting" / "greeting.snap.new").exists())
+
+    def test_runs_in_worker_processes_from_cli(self) -> None:
+        # Run from outside the project, as the installed `snappy` script would be, so that the
+        # test directory's parent is only importable if discovery makes it so
+        source = Path(snappy.__file__).parent.parent
+        command = [
+            sys.executable, "-c", "from snappy.cli import main; main()",
+            "test", str(self.path), "-j", "2"
+        ]
+        process = subprocess.run(
+            command, cwd=self.path / "nested", env={"PYTHONPATH": str(source)},
+            capture_output=True, text=True, timeout=60
+        )
+        self.assertNotIn("Error", process.stderr)
+        self.assertEqual(1, process.returncode)
+        self.assertIn("1 test ran:", process.stdout)
+        self.assertTrue((self.path / "snaps" / "greeting" / "greeting.snap.new").exists())
+
+    def tearDown(self) -> None:
+        self.forget_modules()
+        for entry in (self.path, self.path.parent):
+            if str(entry) in sys.path:
+                sys.path.remove(str(entry))
+        rmtree(self.path.parent)
@@ -0,0 +1,178 @@
+from typing import Iterator
+from unittest import TestCase
+from tempfile import mkdtemp
+from shutil import rmtree
+from pathlib import Path
+
+from snappy.suite import TestSuite
+from snappy.test import Test
+from snappy.fixtures import Fixture, FixtureCache, FixtureSet, teardown_session
+from snappy.reporters import Reporter
+
+
+def discard(*args, **kwargs) -> None:
+    _ = args, kwargs
+
+
+def greeting() -> str:
+    return "hello, world!"
+
+
+def snap_greeting(test: Test, greeting: str) -> None:
+    test.snap(greeting, "greeting")
+
+
+class TestFixtureSet(TestCase):
+
+    def setUp(self) -> None:
+        self.fixtures = FixtureSet()
+        self.log = []
+
+    def add(self, function, scope: str = "test") -> None:
+        self.fixtures.add(Fixture(function.__name__, function, scope))
+
+    def test_resolves_by_parameter_name(self) -> None:
+        self.add(greeting)
+        self.assertEqual(
+            {"greeting": "hello, world!"},
+            self.fixtures.resolve(snap_greeting, FixtureCache())
+        )
+
+    def test_fixtures_use_fixtures(self) -> None:
+        def name() -> str:
+            return "moon"
+
+        def farewell(name: str) -> str:
+            return f"goodbye, {name}!"
+
+        def case(test: Test, farewell: str) -> None:
+            _ = test, farewell
+
+        self.add(name)
+        self.add(farewell)
+        self.assertEqual(
+            {"farewell": "goodbye, moon!"},
+            self.fixtures.resolve(case, FixtureCache())
+        )
+
+    def test_tears_down_in_reverse(self) -> None:
+        def first() -> Iterator[int]:
+            yield 1
+            self.log.append("first")
+
+        def second(first: int) -> Iterator[int]:
+            yield first + 1
+            self.log.append("second")
+
+        def case(test: Test, second: int) -> None:
+            _ = test, second
+
+        self.add(first)
+        self.add(second)
+        scope = FixtureCache()
+        self.assertEqual({"second": 2}, self.fixtures.resolve(case, scope))
+        scope.teardown()
+        self.assertEqual(["second", "first"], self.log)
+
+    def test_narrower_scope_is_error(self) -> None:
+        def connection() -> int:
+            return 1
+
+        def database(connection: int) -> int:
+            return connection
+
+        def case(test: Test, database: int) -> None:
+            _ = test, database
+
+        self.add(connection, "test")
+        self.add(database, "suite")
+        self.assertRaises(ValueError, self.fixtures.resolve, case, FixtureCache())
+
+    def test_unknown_fixture_is_error(self) -> None:
+        self.add(greeting)
+        def case(test: Test, missing: int) -> None:
+            _ = test, missing
+        self.assertRaises(ValueError, self.fixtures.resolve, case, FixtureCache())
+
+    def test_unknown_scope_is_error(self) -> None:
+        self.assertRaises(ValueError, Fixture, "greeting", greeting, "module")
+
+
+class TestSuiteFixtures(TestCase):
+
+    def setUp(self) -> None:
+        self.snap_path = Path(mkdtemp())
+        self.log = []
+
+    def make_suite(self, scope: str) -> TestSuite:
+        suite = TestSuite(self.snap_path)
+
+        @suite.fixture(scope=scope)
+        def resource() -> Iterator[int]:
+            self.log.append("setup")
+            yield len(self.log)
+            self.log.append("teardown")
+
+        @suite.test_case
+        def first(test: Test, resource: int) -> None:
+            _ = test, resource
+
+        @suite.test_case
+        def second(test: Test, resource: int) -> None:
+            _ = test, resource
+
+        return suite
+
+    def test_test_scope(self) -> None:
+        self.make_suite("test").run_tests(display_func=discard)
+        self.assertEqual(["setup", "teardown", "setup", "teardown"], self.log)
+
+    def test_suite_scope(self) -> None:
+        self.make_suite("suite").run_tests(display_func=discard)
+        self.assertEqual(["setup", "teardown"], self.log)
+
+    def test_session_scope_spans_suites(self) -> None:
+        first, second = self.make_suite("session"), self.make_suite("session")
+
+        # Both suites register the same kind of fixture, but as different functions
+        first._run(Reporter(), 1, "process")
+        self.assertEqual(["setup"], self.log)
+        second._run(Reporter(), 1, "process")
+        self.assertEqual(["setup", "setup"], self.log)
+
+        teardown_session()
+        self.assertEqual(["setup", "setup", "teardown", "teardown"], self.log)
+
+    def test_threads_share_suite_scope(self) -> None:
+        suite = self.make_suite("suite")
+        suite.run_tests(display_func=discard, workers=4, executor="thread")
+        self.assertEqual(["setup", "teardown"], self.log)
+
+    def test_async_tests_get_fixtures(self) -> None:
+        suite = TestSuite(self.snap_path)
+        suite.fixture(greeting)
+
+        @suite.test_case
+        async def case(test: Test, greeting: str) -> None:
+            test.snap(greeting, "greeting")
+
+        suite.run_tests(display_func=discard)
+        self.assertIn("hello, world!", (self.snap_path / "case" / "greeting.snap.new").read_text())
+
+    def test_processes_get_fixtures(self) -> None:
+        # Process pools need fixtures and tests defined at the top level of a module
+        suite = TestSuite(self.snap_path)
+        suite.fixture(greeting, scope="suite")
+        suite.test_case(snap_greeting)
+        suite.run_tests(display_func=discard, workers=2)
+
+        snap = self.snap_path / "snap_greeting" / "greeting.snap.new"
+        self.assertIn("hello, world!", snap.read_text())
+
+    def test_records_time_spent(self) -> None:
+        results = self.make_suite("test").run_tests(display_func=discard)
+        self.assertIn("fixtures", results[0].phases)
+
+    def tearDown(self) -> None:
+        teardown_session()
+        rmtree(self.snap_path)
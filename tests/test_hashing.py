@@ -0,0 +1,150 @@
+import array
+from unittest import TestCase
+from tempfile import mkdtemp
+from shutil import rmtree
+from pathlib import Path
+from contextlib import redirect_stdout
+from io import StringIO
+
+from snappy.core import rehash_snaps
+from snappy.hashing import available_algorithms, hasher, qualify, split
+from snappy.objects import OBJECTS_DIR, ObjectStore
+from snappy.serializers import as_buffer
+from snappy.snapshot import Snapshot
+from snappy.storage import DATABASE_NAME, SqliteStorage
+from snappy.suite import TestSuite
+from snappy.test import Test
+
+
+def discard(*args, **kwargs) -> None:
+    _, _ = args, kwargs
+
+
+def snap_greeting(test: Test) -> None:
+    test.snap("hello, world!", "greeting")
+
+
+def snap_numbers(test: Test) -> None:
+    test.snap(array.array("i", range(10)), "numbers")
+
+
+class TestHashes(TestCase):
+
+    def test_default_is_unqualified(self) -> None:
+        self.assertEqual("abc", qualify("sha256", "abc"))
+        self.assertEqual(("sha256", "abc"), split("abc"))
+
+    def test_round_trips(self) -> None:
+        self.assertEqual(("blake2b", "abc"), split(qualify("blake2b", "abc")))
+
+    def test_unknown_algorithm(self) -> None:
+        self.assertRaises(ValueError, hasher, "md5")
+        self.assertRaises(ValueError, TestSuite, "snaps", hash_algorithm="md5")
+
+    def test_missing_package(self) -> None:
+        if "xxh3" in available_algorithms():
+            self.skipTest("xxhash is installed")
+        self.assertRaisesRegex(ValueError, "xxhash", hasher, "xxh3")
+
+
+class TestSnapshotAlgorithms(TestCase):
+
+    def setUp(self) -> None:
+        self.path = Path(mkdtemp())
+
+    def test_algorithms_differ(self) -> None:
+        left = Snapshot.new("test", "snap", "hello, world!")
+        right = Snapshot.new("test", "snap", "hello, world!", "blake2b")
+        self.assertNotEqual(left, right)
+        self.assertEqual(left._hash, right._rehash("sha256"))
+
+    def test_header_names_algorithm(self) -> None:
+        snap = Snapshot.new("test", "snap", "hello, world!", "blake2b")
+        self.assertIn("algorithm: blake2b", snap._header())
+        self.assertNotIn("algorithm", Snapshot.new("test", "snap", "hello")._header())
+
+    def test_saved_snapshot_loads(self) -> None:
+        snap = Snapshot.new("test", "snap", "hello, world!", "blake2b")
+        snap.save_to(self.path / "snap.snap")
+
+        for load_content in (False, True):
+            with self.subTest(load_content=load_content):
+                loaded = Snapshot.load_from(self.path / "snap.snap", load_content)
+                self.assertEqual(snap._hash, loaded._hash)
+                self.assertEqual({}, loaded._meta)
+
+    def test_database_keeps_algorithm(self) -> None:
+        storage = SqliteStorage(self.path / DATABASE_NAME)
+        snap = Snapshot.new("test", "snap", "hello, world!", "blake2b")
+        storage.save(Snapshot.new("test", "snap", "hello, world!", "blake2b"), new=False)
+        storage.flush()
+
+        self.assertEqual(snap._hash, storage.hash_of("test", "snap"))
+        self.assertEqual([snap._hash], [loaded._hash for loaded, _ in storage.snapshots()])
+
+    def test_objects_kept_apart(self) -> None:
+        objects = ObjectStore(self.path)
+        self.assertEqual(self.path / OBJECTS_DIR / "ab" / "cd.zlib", objects.path_of("abcd"))
+        self.assertEqual(
+            self.path / OBJECTS_DIR / "blake2b" / "ab" / "cd.zlib", objects.path_of("blake2b:abcd")
+        )
+
+    def tearDown(self) -> None:
+        rmtree(self.path)
+
+
+class TestChangingAlgorithm(TestCase):
+
+    def setUp(self) -> None:
+        self.path = Path(mkdtemp())
+        suite = TestSuite(self.path / "snaps")
+        suite.test_case(snap_greeting)
+        suite.test_case(snap_numbers)
+        suite.run_tests(display_func=discard)
+        for new_snap in self.path.rglob("*.snap.new"):
+            new_snap.rename(new_snap.with_suffix(""))
+
+        (self.path / "test_module.py").write_text(
+            "from pathlib import Path\n"
+            "from snappy.suite import TestSuite\n"
+            "from test_hashing import snap_greeting, snap_numbers\n"
+            "suite = TestSuite(Path(__file__).parent / 'snaps', hash_algorithm='blake2b')\n"
+            "suite.test_case(snap_greeting)\n"
+            "suite.test_case(snap_numbers)\n"
+        )
+
+    def run_blake2b(self) -> list:
+        suite = TestSuite(self.path / "snaps", hash_algorithm="blake2b")
+        suite.test_case(snap_greeting)
+        suite.test_case(snap_numbers)
+        return suite.run_tests(display_func=discard)
+
+    def test_old_snapshots_match(self) -> None:
+        results = self.run_blake2b()
+        self.assertTrue(all(result.passed for result in results))
+        self.assertEqual([], list(self.path.rglob("*.snap.new")))
+
+    def test_rehashes(self) -> None:
+        with redirect_stdout(StringIO()) as output:
+            rehash_snaps(self.path)
+        self.assertIn("Rehashed 2 snaps", output.getvalue())
+
+        for path in self.path.rglob("*.snap"):
+            self.assertEqual("blake2b", split(Snapshot.load_from(path)._hash)[0])
+        self.assertTrue(all(result.passed for result in self.run_blake2b()))
+
+        with redirect_stdout(StringIO()) as output:
+            rehash_snaps(self.path)
+        self.assertIn("Rehashed 0 snaps", output.getvalue())
+
+    def test_rehashes_arrays(self) -> None:
+        with redirect_stdout(StringIO()):
+            rehash_snaps(self.path)
+
+        buffer, meta = as_buffer(array.array("i", range(10)))
+        snap = Snapshot.array("snap_numbers", "numbers", buffer, meta, "blake2b")
+        loaded = Snapshot.load_from(self.path / "snaps" / "snap_numbers" / "numbers.snap")
+        self.assertEqual(snap._hash, loaded._hash)
+
+    def tearDown(self) -> None:
+        rmtree(self.path)
@@ -0,0 +1,104 @@
+from unittest import TestCase
+from tempfile import mkdtemp
+from shutil import rmtree
+from pathlib import Path
+
+from snappy.history import HISTORY_NAME, TestHistory
+from snappy.results import TestResult
+from snappy.test import Test
+
+
+def make_tests(*names: str) -> list:
+    return [Test(name, lambda test: None, storage=Path(".")) for name in names]
+
+
+class TestTestHistory(TestCase):
+
+    def setUp(self) -> None:
+        self.path = Path(mkdtemp())
+        self.history = TestHistory(self.path / "snaps")
+
+    def test_records(self) -> None:
+        self.history.record(TestResult("slow", passed=False, wall_time=1.5))
+        self.assertEqual(1.5, self.history.duration("slow"))
+        self.assertTrue(self.history.failed("slow"))
+        self.assertIsNone(self.history.duration("unknown"))
+        self.assertFalse(self.history.failed("unknown"))
+
+    def test_ignores_cached(self) -> None:
+        self.history.record(TestResult("cached", passed=True, cached=True))
+        self.assertIsNone(self.history.duration("cached"))
+
+    def test_persists(self) -> None:
+        self.history.record(TestResult("slow", passed=False, wall_time=1.5))
+        self.history.save()
+        self.assertTrue((self.path / "snaps" / HISTORY_NAME).exists())
+
+        loaded = TestHistory(self.path / "snaps")
+        loaded.load()
+        self.assertEqual(1.5, loaded.duration("slow"))
+
+    def test_records_snaps(self) -> None:
+        self.history.record(TestResult("snapper", passed=True, snaps=["b", "a"]))
+        self.history.record(TestResult("stuck", passed=False, timed_out=True, snaps=["a"]))
+        self.assertEqual(["a", "b"], self.history.snaps("snapper"))
+        self.assertIsNone(self.history.snaps("stuck"))
+        self.assertIsNone(self.history.snaps("unknown"))
+
+    def test_schedules_failures_first(self) -> None:
+        self.history.record(TestResult("c", passed=False))
+        tests = self.history.schedule(make_tests("a", "b", "c"))
+        self.assertEqual(["c", "a", "b"], [test._name for test in tests])
+
+    def test_orders_as_drawn(self) -> None:
+        self.history.record(TestResult("b", passed=False))
+        drawn = []
+
+        def generate():
+            for test in make_tests("a", "b", "c", "d"):
+                drawn.append(test._name)
+                yield test
+
+        tests = self.history.order(generate(), {"a", "b", "c", "d"})
+        self.assertEqual("b", next(tests)._name)
+        self.assertEqual(["a", "b"], drawn)
+
+        # Once the failures are out of the way, tests follow as they're drawn
+        self.assertEqual("a", next(tests)._name)
+        self.assertEqual("c", next(tests)._name)
+        self.assertEqual(["a", "b", "c"], drawn)
+        self.assertEqual(["d"], [test._name for test in tests])
+
+    def test_orders_past_stale_failures(self) -> None:
+        for name in ("removed", "table[gone]", "table[kept]"):
+            self.history.record(TestResult(name, passed=False))
+
+        # Failures of tests that aren't registered any more hold nothing back
+        drawn = []
+
+        def generate():
+            for test in make_tests("a", "table[kept]", "b"):
+                drawn.append(test._name)
+                yield test
+
+        tests = self.history.order(generate(), {"a", "b"}, ("table[",))
+        self.assertEqual(["table[kept]", "a", "b"], [test._name for test in tests])
+
+        # Nor do rows of a table that weren't drawn, the next time
+        self.assertFalse(self.history.failed("table[gone]"))
+        self.history.record(TestResult("table[kept]", passed=True))
+        drawn.clear()
+        tests = self.history.order(generate(), {"a", "b"}, ("table[",))
+        self.assertEqual("a", next(tests)._name)
+        self.assertEqual(["a"], drawn)
+
+    def test_schedules_longest_first(self) -> None:
+        for name, seconds in (("a", 1.0), ("b", 3.0), ("c", 2.0), ("d", 0.5)):
+            self.history.record(TestResult(name, passed=name != "d", wall_time=seconds))
+
+        # Unknown tests are taken to be of median length
+        tests = self.history.schedule(make_tests("a", "b", "c", "d", "e"), longest_first=True)
+        self.assertEqual(["d", "b", "c", "e", "a"], [test._name for test in tests])
+
+    def tearDown(self) -> None:
+        rmtree(self.path)
@@ -0,0 +1,89 @@
+from unittest import TestCase
+from tempfile import mkdtemp
+from shutil import rmtree
+from pathlib import Path
+import os
+
+from snappy.index import SnapshotIndex, INDEX_NAME
+from snappy.snapshot import Snapshot
+
+
+class TestIndexLookup(TestCase):
+
+    def setUp(self) -> None:
+        self.path = Path(mkdtemp())
+        self.snap_file = self.path / "test" / "snap.snap"
+        self.snap_file.parent.mkdir()
+        self.snap = Snapshot.new("test", "snap", "hello, world!")
+        self.snap.save_to(self.snap_file)
+
+    def test_missing_snapshot(self) -> None:
+        index = SnapshotIndex(self.path)
+        self.assertIsNone(index.hash_of("test", "other", self.path / "test" / "other.snap"))
+
+    def test_reads_unindexed_snapshot(self) -> None:
+        index = SnapshotIndex(self.path)
+        self.assertEqual(self.snap._hash, index.hash_of("test", "snap", self.snap_file))
+
+    def test_trusts_unchanged_entry(self) -> None:
+        index = SnapshotIndex(self.path)
+        index.hash_of("test", "snap", self.snap_file)
+
+        # Corrupt the file without changing its size or modification time, proving it isn't read
+        stat = self.snap_file.stat()
+        self.snap_file.write_text("x" * stat.st_size)
+        os.utime(self.snap_file, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        self.assertEqual(self.snap._hash, index.hash_of("test", "snap", self.snap_file))
+
+    def test_heals_changed_entry(self) -> None:
+        index = SnapshotIndex(self.path)
+        index.hash_of("test", "snap", self.snap_file)
+
+        changed = Snapshot.new("test", "snap", "goodbye, moon!")
+        changed.save_to(self.snap_file)
+        os.utime(self.snap_file, ns=(0, 0))
+        self.assertEqual(changed._hash, index.hash_of("test", "snap", self.snap_file))
+
+    def tearDown(self) -> None:
+        rmtree(self.path)
+
+
+class TestIndexPersistence(TestCase):
+
+    def setUp(self) -> None:
+        self.path = Path(mkdtemp())
+        self.snap_file = self.path / "test" / "snap.snap"
+        self.snap_file.parent.mkdir()
+        Snapshot.new("test", "snap", "hello, world!").save_to(self.snap_file)
+
+    def test_round_trip(self) -> None:
+        index = SnapshotIndex(self.path)
+        index.hash_of("test", "snap", self.snap_file)
+        index.save()
+
+        loaded = SnapshotIndex(self.path)
+        loaded.load()
+        self.assertEqual(index._entries, loaded._entries)
+        self.assertEqual([INDEX_NAME], [p.name for p in self.path.glob(".snappy-index*")])
+
+    def test_skips_clean_save(self) -> None:
+        SnapshotIndex(self.path).save()
+        self.assertFalse((self.path / INDEX_NAME).exists())
+
+    def test_ignores_corrupt_index(self) -> None:
+        (self.path / INDEX_NAME).write_text("{not json")
+        index = SnapshotIndex(self.path)
+        index.load()
+        self.assertEqual({}, index._entries)
+
+    def test_merges_changes(self) -> None:
+        worker = SnapshotIndex(self.path)
+        worker.hash_of("test", "snap", self.snap_file)
+
+        parent = SnapshotIndex(self.path)
+        parent.merge(worker.pop_changes())
+        self.assertEqual(worker._entries, parent._entries)
+        self.assertEqual({}, worker.pop_changes())
+
+    def tearDown(self) -> None:
+        rmtree(self.path)
@@ -0,0 +1,85 @@
+from unittest import TestCase
+from tempfile import mkdtemp
+from shutil import rmtree
+from pathlib import Path
+
+from snappy.objects import OBJECTS_DIR, ObjectStore, read_object
+from snappy.snapshot import Snapshot
+from snappy.storage import DirectoryStorage
+from snappy.test import Test
+from snappy.verify import find_snaps
+
+
+def tester(test: Test) -> None:
+    _ = test
+
+
+class TestObjectStore(TestCase):
+
+    def setUp(self) -> None:
+        self.path = Path(mkdtemp())
+
+    def test_unknown_compression(self) -> None:
+        self.assertRaises(ValueError, ObjectStore, self.path, "brotli")
+
+    def test_round_trip(self) -> None:
+        for compression in ["zlib", "lzma"]:
+            store = ObjectStore(self.path, compression)
+            path = store.put("abcdef", [b"hello, ", b"world!"])
+            self.assertEqual(b"hello, world!", read_object(path))
+            self.assertEqual(self.path / OBJECTS_DIR / "ab" / f"cdef.{compression}", path)
+
+    def test_deduplicates(self) -> None:
+        store = ObjectStore(self.path)
+        first = store.put("abcdef", [b"hello, world!"])
+        second = store.put("abcdef", iter(()))
+        self.assertEqual(first, second)
+        self.assertEqual(b"hello, world!", read_object(first))
+
+    def tearDown(self) -> None:
+        rmtree(self.path)
+
+
+class TestSnapshotBlobs(TestCase):
+
+    def setUp(self) -> None:
+        self.path = Path(mkdtemp())
+        self.store = ObjectStore(self.path, "lzma")
+        (self.path / "test").mkdir()
+
+    def test_saves_reference(self) -> None:
+        snap = Snapshot.new("test", "snap", "hello, world!")
+        snap.save_to(self.path / "test" / "snap.snap", self.store)
+        text = (self.path / "test" / "snap.snap").read_text()
+        self.assertIn(f"blob: ../{OBJECTS_DIR}/{snap._hash[:2]}/{snap._hash[2:]}.lzma\n", text)
+        self.assertNotIn("hello, world!", text)
+
+    def test_loads_content(self) -> None:
+        snap = Snapshot.stream("test", "snap", ["hello,\n", "world!\n"])
+        snap.save_to(self.path / "test" / "snap.snap", self.store)
+        snap.close()
+        loaded = Snapshot.load_from(self.path / "test" / "snap.snap", load_content=True)
+        self.assertEqual("hello,\nworld!\n", loaded._content)
+        self.assertTrue(snap == loaded)
+        self.assertTrue(snap == Snapshot.load_from(self.path / "test" / "snap.snap"))
+
+    def test_tests_share_objects(self) -> None:
+        storage = DirectoryStorage(self.path, objects=self.store)
+        first = Test("first", tester, storage)
+        second = Test("second", tester, storage)
+        first.snap("same content", "snap")
+        second.snap("same content", "snap")
+        self.assertEqual(1, len(list((self.path / OBJECTS_DIR).rglob("*.lzma"))))
+
+    def test_test_named_objects(self) -> None:
+        # The store can't be mistaken for a test's snapshots, or theirs for it
+        storage = DirectoryStorage(self.path, objects=self.store)
+        Test("objects", tester, storage).snap("content", "snap")
+        self.assertEqual([("objects", "snap")], storage.new_snaps())
+        self.assertEqual(["snap"], [snap._snap for snap, _ in storage.snapshots()])
+        self.assertEqual(
+            [self.path / "objects" / "snap.snap.new"], list(find_snaps(self.path))
+        )
+
+    def tearDown(self) -> None:
+        rmtree(self.path)
@@ -0,0 +1,129 @@
+import json
+from unittest import TestCase
+from tempfile import mkdtemp
+from shutil import rmtree
+from pathlib import Path
+from io import StringIO
+from xml.etree import ElementTree
+
+from snappy.reporters import (
+    DotsReporter, JUnitReporter, JsonLinesReporter, MultiReporter, Reporter, TerminalReporter,
+    BUFFER_LINES
+)
+from snappy.suite import TestSuite
+from snappy.test import Test
+
+
+def discard(*args, **kwargs) -> None:
+    _, _ = args, kwargs
+
+
+def snap_greeting(test: Test) -> None:
+    test.snap("hello, world!", "greeting")
+
+
+def snap_nothing(test: Test) -> None:
+    _ = test
+
+
+class RecordingReporter(Reporter):
+
+    def __init__(self) -> None:
+        self.events = []
+
+    def start_suite(self, name: str) -> None:
+        self.events.append("start_suite")
+
+    def start_test(self, test_name: str) -> None:
+        self.events.append(f"start {test_name}")
+
+    def snap_created(self, test_name: str, snap_name: str) -> None:
+        self.events.append(f"snap {test_name}/{snap_name}")
+
+    def finish_test(self, result) -> None:
+        self.events.append(f"finish {result.name}")
+
+    def finish_suite(self) -> None:
+        self.events.append("finish_suite")
+
+    def summary(self, results) -> None:
+        self.events.append(f"summary {len(results)}")
+
+
+class TestReporters(TestCase):
+
+    def setUp(self) -> None:
+        self.path = Path(mkdtemp())
+        self.suite = TestSuite(self.path / "snaps")
+        self.suite.test_case(snap_greeting)
+        self.suite.test_case(snap_nothing)
+
+    def test_events(self) -> None:
+        reporter = RecordingReporter()
+        self.suite.run_tests(reporter=reporter)
+        self.assertEqual([
+            "start_suite",
+            "start snap_greeting", "snap snap_greeting/greeting", "finish snap_greeting",
+            "start snap_nothing", "finish snap_nothing",
+            "finish_suite", "summary 2",
+        ], reporter.events)
+
+    def test_multiple_reporters(self) -> None:
+        first, second = RecordingReporter(), RecordingReporter()
+        self.suite.run_tests(reporter=MultiReporter([first, second]))
+        self.assertEqual(first.events, second.events)
+
+    def test_buffered_terminal_matches_print(self) -> None:
+        printed = StringIO()
+        self.suite.run_tests(reporter=TerminalReporter(stream=printed, buffered=False))
+
+        # Nothing is written until the run is over
+        class Watched(StringIO):
+            def write(inner, text: str) -> int:
+                self.assertIn("tests ran", text)
+                return super().write(text)
+
+        buffered = Watched()
+        self.suite.run_tests(reporter=TerminalReporter(stream=buffered))
+        self.assertEqual(printed.getvalue(), buffered.getvalue())
+
+    def test_buffer_is_bounded(self) -> None:
+        stream = StringIO()
+        reporter = TerminalReporter(stream=stream)
+        for _ in range(BUFFER_LINES):
+            reporter.message("hello")
+        self.assertEqual("hello\n" * BUFFER_LINES, stream.getvalue())
+
+    def test_dots(self) -> None:
+        stream = StringIO()
+        self.suite.run_tests(reporter=DotsReporter(stream))
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(["F.", "snap_greeting: err!", "  x greeting"], lines[:3])
+        self.assertIn("  1 new snap to review", lines)
+
+    def test_junit(self) -> None:
+        self.suite.run_tests(reporter=JUnitReporter(self.path / "report" / "junit.xml"))
+
+        root = ElementTree.parse(self.path / "report" / "junit.xml").getroot()
+        cases = root.findall("testsuite/testcase")
+        self.assertEqual(["snap_greeting", "snap_nothing"], [case.get("name") for case in cases])
+        self.assertEqual("x greeting", cases[0].find("failure").text)
+        self.assertIsNone(cases[1].find("failure"))
+
+    def test_json_lines(self) -> None:
+        self.suite.run_tests(reporter=JsonLinesReporter(self.path / "events.jsonl"))
+
+        with (self.path / "events.jsonl").open() as file:
+            events = [json.loads(line) for line in file]
+        self.assertEqual("suite_started", events[0]["event"])
+        self.assertEqual(
+            {"event": "snap_created", "test": "snap_greeting", "snap": "greeting"}, events[2]
+        )
+        self.assertEqual(["greeting"], events[3]["new_snaps"])
+        self.assertEqual(
+            {"event": "summary", "tests": 2, "passed": 1, "failed": 1, "timed_out": 0, "new_snaps": 1},
+            events[-1]
+        )
+
+    def tearDown(self) -> None:
+        rmtree(self.path)
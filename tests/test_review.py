@@ -0,0 +1,203 @@
+import array
+import random
+from typing import Sequence
+from unittest import TestCase
+from tempfile import mkdtemp
+from shutil import rmtree
+from pathlib import Path
+from contextlib import redirect_stdout
+from io import StringIO
+
+from snappy import review
+from snappy.core import review_snaps
+from snappy.review import (
+    accept, diff_lines, diff_snap, diff_stored, find_new_snaps, find_stored_snaps, format_diff,
+    reject
+)
+from snappy.storage import DATABASE_NAME, SqliteStorage
+from snappy.snapshot import Snapshot
+from snappy.serializers import as_buffer
+
+
+class TestDiff(TestCase):
+
+    def test_identical(self) -> None:
+        self.assertEqual([("equal", 0, 2, 0, 2)], diff_lines(["a", "b"], ["a", "b"]))
+
+    def test_empty(self) -> None:
+        self.assertEqual([], diff_lines([], []))
+        self.assertEqual([("insert", 0, 0, 0, 1)], diff_lines([], ["a"]))
+        self.assertEqual([("delete", 0, 1, 0, 0)], diff_lines(["a"], []))
+
+    def test_finds_shortest_edit(self) -> None:
+        a, b = list("abcabba"), list("cbabac")
+        opcodes = diff_lines(a, b)
+        equal = sum(ahi - alo for tag, alo, ahi, _, _ in opcodes if tag == "equal")
+        # The longest common subsequence of these is 4 long, e.g. `baba`
+        self.assertEqual(4, equal)
+
+    def assertTransforms(self, a: Sequence[str], b: Sequence[str], opcodes: list) -> None:
+        # Opcodes must cover both sides in order, and only call equal lines equal
+        x = y = 0
+        for tag, alo, ahi, blo, bhi in opcodes:
+            self.assertEqual((x, y), (alo, blo))
+            if tag == "equal":
+                self.assertEqual(a[alo:ahi], b[blo:bhi])
+            x, y = ahi, bhi
+        self.assertEqual((len(a), len(b)), (x, y))
+
+    def test_replaces_dissimilar(self) -> None:
+        a = [f"old {i}" for i in range(100_000)]
+        b = [f"new {i}" for i in range(100_000)]
+        self.assertEqual(
+            [("delete", 0, 100_000, 0, 0), ("insert", 100_000, 100_000, 0, 100_000)],
+            diff_lines(a, b)
+        )
+
+    def test_sets_aside_unmatched_lines(self) -> None:
+        a = ["}" if i % 3 == 0 else f"old {i}" for i in range(30)]
+        b = ["}" if i % 3 == 0 else f"new {i}" for i in range(30)]
+        opcodes = diff_lines(a, b)
+        self.assertTransforms(a, b, opcodes)
+        self.assertEqual(10, sum(ahi - alo for tag, alo, ahi, _, _ in opcodes if tag == "equal"))
+
+    def test_caps_search_cost(self) -> None:
+        cost = review.DIFF_MAX_COST
+        review.DIFF_MAX_COST = 4
+        try:
+            a = [f"line {i}" for i in range(5000)]
+            b = random.Random(0).sample(a, len(a))
+            self.assertTransforms(a, b, diff_lines(a, b))
+
+            # Differences cheaper than the cap are still found exactly
+            c = a[:100] + ["changed"] + a[101:]
+            self.assertEqual(
+                [("equal", 0, 100, 0, 100), ("delete", 100, 101, 100, 100),
+                 ("insert", 101, 101, 100, 101), ("equal", 101, 5000, 101, 5000)],
+                diff_lines(a, c)
+            )
+        finally:
+            review.DIFF_MAX_COST = cost
+
+    def test_formats_with_context(self) -> None:
+        a = [f"line {i}" for i in range(20)]
+        b = a[:10] + ["changed"] + a[11:]
+        self.assertEqual([
+            "@@ 7 unchanged lines @@",
+            "  line 7", "  line 8", "  line 9",
+            "- line 10", "+ changed",
+            "  line 11", "  line 12", "  line 13",
+            "@@ 6 unchanged lines @@",
+        ], list(format_diff(a, b)))
+
+
+class TestReviewing(TestCase):
+
+    def setUp(self) -> None:
+        self.path = Path(mkdtemp())
+        for test, snap in [("parser", "simple"), ("parser", "nested"), ("lexer", "simple")]:
+            (self.path / test).mkdir(exist_ok=True)
+            Snapshot.new(test, snap, "old\nshared").save_to(self.path / test / f"{snap}.snap")
+            Snapshot.new(test, snap, "new\nshared").save_to(self.path / test / f"{snap}.snap.new")
+
+    def names(self, paths: list[Path]) -> list[str]:
+        return [f"{path.parent.name}/{path.name}" for path in paths]
+
+    def test_finds_all(self) -> None:
+        self.assertEqual(
+            ["lexer/simple.snap.new", "parser/nested.snap.new", "parser/simple.snap.new"],
+            self.names(find_new_snaps(self.path))
+        )
+
+    def test_finds_by_test_or_glob(self) -> None:
+        self.assertEqual(
+            ["parser/nested.snap.new", "parser/simple.snap.new"],
+            self.names(find_new_snaps(self.path, tests=["parser"]))
+        )
+        self.assertEqual(
+            ["lexer/simple.snap.new", "parser/simple.snap.new"],
+            self.names(find_new_snaps(self.path, patterns=["*/simple"]))
+        )
+
+    def test_finds_parametrized_by_function(self) -> None:
+        (self.path / "parser[1]").mkdir()
+        Snapshot.new("parser[1]", "simple", "new").save_to(self.path / "parser[1]" / "simple.snap.new")
+        self.assertEqual(
+            ["parser/nested.snap.new", "parser/simple.snap.new", "parser[1]/simple.snap.new"],
+            self.names(find_new_snaps(self.path, tests=["parser"]))
+        )
+
+    def test_diffs_against_accepted(self) -> None:
+        self.assertEqual(["- old", "+ new", "  shared"], list(diff_snap(self.path / "lexer" / "simple.snap.new")))
+
+    def test_diffs_arrays_as_summary(self) -> None:
+        for values, suffix in [([1], ""), ([2], ".new")]:
+            snap = Snapshot.array("lexer", "array", *as_buffer(array.array("b", values)))
+            snap.save_to(self.path / "lexer" / f"array.snap{suffix}")
+
+        lines = list(diff_snap(self.path / "lexer" / "array.snap.new"))
+        self.assertEqual(2, len(lines))
+        self.assertTrue(lines[0].startswith("- <dtype b, shape (1,), 1 bytes, hash "))
+
+    def test_diffs_without_accepted(self) -> None:
+        (self.path / "lexer" / "simple.snap").unlink()
+        self.assertEqual(["+ new", "+ shared"], list(diff_snap(self.path / "lexer" / "simple.snap.new")))
+
+    def test_accepts(self) -> None:
+        self.assertEqual(2, accept(find_new_snaps(self.path, tests=["parser"])))
+        accepted = Snapshot.load_from(self.path / "parser" / "simple.snap", load_content=True)
+        self.assertEqual("new\nshared", accepted._content)
+        self.assertEqual(["lexer/simple.snap.new"], self.names(find_new_snaps(self.path)))
+
+    def test_rejects(self) -> None:
+        self.assertEqual(3, reject(find_new_snaps(self.path)))
+        rejected = Snapshot.load_from(self.path / "parser" / "simple.snap", load_content=True)
+        self.assertEqual("old\nshared", rejected._content)
+        self.assertEqual([], find_new_snaps(self.path))
+
+    def tearDown(self) -> None:
+        rmtree(self.path)
+
+
+class TestReviewingDatabase(TestCase):
+
+    def setUp(self) -> None:
+        self.path = Path(mkdtemp())
+        self.storage = SqliteStorage(self.path / "suite" / DATABASE_NAME)
+        for snap in ["simple", "nested"]:
+            self.storage.save(Snapshot.new("parser", snap, "old\nshared"), new=False)
+            self.storage.save(Snapshot.new("parser", snap, "new\nshared"), new=True)
+        self.storage.flush()
+
+    def review(self, *args) -> list[str]:
+        output = StringIO()
+        with redirect_stdout(output):
+            review_snaps(self.path, *args)
+        return output.getvalue().splitlines()
+
+    def test_finds_by_glob(self) -> None:
+        self.assertEqual(
+            [("parser", "nested")], find_stored_snaps(self.storage, patterns=["*/nest*"])
+        )
+
+    def test_diffs_against_accepted(self) -> None:
+        self.assertEqual(
+            ["- old", "+ new", "  shared"], list(diff_stored(self.storage, "parser", "simple"))
+        )
+
+    def test_accepts(self) -> None:
+        lines = self.review("accept", ["parser"], [], False)
+        self.assertEqual(["Accepted 2 snaps."], lines)
+        self.assertEqual([], self.storage.new_snaps())
+        self.assertEqual("new\nshared", self.storage.snapshot_of("parser", "simple")._content)
+
+    def test_rejects(self) -> None:
+        lines = self.review("reject", [], ["parser/simple"])
+        self.assertEqual(
+            ["parser/simple:", "  - old", "  + new", "    shared", "Rejected 1 snaps."], lines
+        )
+        self.assertEqual([("parser", "nested")], self.storage.new_snaps())
+        self.assertEqual("old\nshared", self.storage.snapshot_of("parser", "simple")._content)
+
+    def tearDown(self) -> None:
+        rmtree(self.path)
@@ -0,0 +1,109 @@
+import array
+from enum import Enum
+from decimal import Decimal
+from dataclasses import dataclass, field
+from collections import namedtuple
+from unittest import TestCase
+
+from snappy.serializers import _serializers, as_buffer, canonical, register
+
+
+@dataclass
+class Point:
+    x: float
+    y: float
+    label: str = field(default="", repr=False)
+
+
+Pair = namedtuple("Pair", "left right")
+
+
+class Colour(Enum):
+    RED = 1
+
+
+class TestCanonical(TestCase):
+
+    def test_scalars(self) -> None:
+        self.assertEqual("None", canonical(None))
+        self.assertEqual("True", canonical(True))
+        self.assertEqual("0.1", canonical(0.1))
+        self.assertEqual("-0.0", canonical(-0.0))
+        self.assertEqual("nan", canonical(float("nan")))
+        self.assertEqual('"tab\\there"', canonical("tab\there"))
+        self.assertEqual("b'\\x00'", canonical(b"\x00"))
+        self.assertEqual("Colour.RED", canonical(Colour.RED))
+
+    def test_dicts_are_sorted(self) -> None:
+        self.assertEqual(canonical({"b": 1, "a": 2}), canonical({"a": 2, "b": 1}))
+        self.assertEqual('{\n  "a": 2,\n  "b": 1,\n}', canonical({"b": 1, "a": 2}))
+
+    def test_sets_are_sorted(self) -> None:
+        self.assertEqual("{\n  1,\n  2,\n}", canonical({2, 1}))
+        self.assertEqual("set()", canonical(set()))
+        self.assertEqual("frozenset({\n  1,\n})", canonical(frozenset([1])))
+
+    def test_nested(self) -> None:
+        self.assertEqual(
+            '[\n  (\n    1,\n    "a",\n  ),\n  {\n    (1, 2): [],\n  },\n]',
+            canonical([(1, "a"), {(1, 2): []}])
+        )
+
+    def test_dataclasses_and_named_tuples(self) -> None:
+        self.assertEqual("Point(\n  x=1.5,\n  y=2,\n)", canonical(Point(1.5, 2, "hidden")))
+        self.assertEqual("Pair(\n  left=1,\n  right=2,\n)", canonical(Pair(1, 2)))
+
+    def test_unknown_type(self) -> None:
+        self.assertRaises(TypeError, canonical, [object()])
+
+    def test_contains_itself(self) -> None:
+        value = []
+        value.append(value)
+        self.assertRaises(ValueError, canonical, value)
+
+    def test_registered(self) -> None:
+        register(Decimal, str)
+        try:
+            self.assertEqual('[\n  "1.10",\n]', canonical([Decimal("1.10")]))
+        finally:
+            del _serializers[Decimal]
+
+
+class TestBuffers(TestCase):
+
+    def test_array(self) -> None:
+        values = array.array("d", [1.0, 2.0])
+        buffer, meta = as_buffer(values)
+        self.assertEqual(values.tobytes(), buffer.tobytes())
+        self.assertEqual({"dtype": "d", "shape": "(2,)"}, meta)
+
+    def test_not_copied(self) -> None:
+        values = array.array("i", [1, 2])
+        buffer, _ = as_buffer(values)
+        values[0] = 3
+        self.assertEqual(values.tobytes(), buffer.tobytes())
+        buffer.release()
+
+    def test_array_like(self) -> None:
+        buffer, meta = as_buffer(FakeArray())
+        self.assertEqual(b"\x01\x02\x03\x04", buffer.tobytes())
+        self.assertEqual({"dtype": "|u1", "shape": "(2, 2)"}, meta)
+
+    def test_not_buffers(self) -> None:
+        self.assertIsNone(as_buffer("text"))
+        self.assertIsNone(as_buffer(b"bytes"))
+        self.assertIsNone(as_buffer({"a": 1}))
+
+
+class FakeDtype:
+    str = "|u1"
+    hasobject = False
+
+
+class FakeArray:
+    # Stands in for a NumPy array whose elements can't be exported as a buffer
+    dtype = FakeDtype()
+    shape = (2, 2)
+
+    def tobytes(self) -> bytes:
+        return b"\x01\x02\x03\x04"
@@ -0,0 +1,131 @@
+import os
+from unittest import TestCase
+from tempfile import mkdtemp
+from shutil import rmtree
+from pathlib import Path
+
+from snappy.shards import Shard, save_results, load_results, load_durations, merge_results
+from snappy.results import SuiteResults, TestResult
+from snappy.suite import TestSuite
+from snappy.test import Test
+
+
+def discard(*args, **kwargs) -> None:
+    _, _ = args, kwargs
+
+
+def make_tests(count: int) -> list:
+    return [Test(f"test_{n}", discard, storage=None) for n in range(count)]
+
+
+class TestShard(TestCase):
+
+    def test_shards_split_tests(self) -> None:
+        tests = make_tests(100)
+        chosen = [Shard(index, 4).select(tests) for index in range(1, 5)]
+
+        names = [test._name for shard in chosen for test in shard]
+        self.assertEqual(sorted(test._name for test in tests), sorted(names))
+        self.assertTrue(all(len(shard) > 10 for shard in chosen))
+
+    def test_keeps_order(self) -> None:
+        tests = make_tests(20)
+        chosen = Shard(1, 2).select(tests)
+        self.assertEqual(sorted(chosen, key=tests.index), chosen)
+
+    def test_is_deterministic(self) -> None:
+        names = [[test._name for test in Shard(2, 3).select(make_tests(50))] for _ in range(2)]
+        self.assertEqual(names[0], names[1])
+
+    def test_balances_by_duration(self) -> None:
+        tests = make_tests(20)
+        durations = {test._name: float(n) for n, test in enumerate(tests)}
+
+        loads = []
+        for index in range(1, 4):
+            shard = Shard(index, 3, durations)
+            loads.append(sum(durations[test._name] for test in shard.select(tests)))
+
+        self.assertEqual(sum(durations.values()), sum(loads))
+        self.assertLessEqual(max(loads) - min(loads), 19)
+
+    def test_balances_across_suites(self) -> None:
+        tests = make_tests(20)
+        durations = {test._name: 1.0 for test in tests}
+
+        counts = []
+        for index in range(1, 5):
+            shard = Shard(index, 4, durations)
+            counts.append(sum(len(shard.select(tests[start:start + 5])) for start in (0, 5, 10, 15)))
+        self.assertEqual([5, 5, 5, 5], counts)
+
+    def test_parses(self) -> None:
+        shard = Shard.parse("2/8")
+        self.assertEqual((2, 8), (shard._index, shard._count))
+
+    def test_bad_shards(self) -> None:
+        for text in ("2", "a/b", "0/8", "9/8", "-1/8"):
+            with self.subTest(text):
+                self.assertRaises(ValueError, Shard.parse, text)
+
+
+class TestResults(TestCase):
+
+    def setUp(self) -> None:
+        self.path = Path(mkdtemp())
+        self.cwd = os.getcwd()
+
+    def run_shard(self, index: int, count: int) -> Path:
+        # Each shard runs in a checkout of its own, as it would on its own machine
+        checkout = self.path / f"shard-{index}"
+        checkout.mkdir()
+        os.chdir(checkout)
+
+        suite = TestSuite("snaps")
+        suite.parametrize(range(10))(snap_value)
+        shard = Shard(index, count)
+        results = suite.run_tests(display_func=discard, shard=shard)
+
+        save_results(checkout / "out" / "results.json", [SuiteResults(Path("snaps"), results=results)], shard)
+        os.chdir(self.cwd)
+        return checkout / "out" / "results.json"
+
+    def test_round_trips(self) -> None:
+        path = self.run_shard(1, 1)
+        shard, suites = load_results(path)
+
+        self.assertEqual((1, 1), shard)
+        self.assertEqual(self.path / "shard-1" / "out" / ".." / "snaps", suites[0].snapshot_directory)
+        self.assertEqual(10, len(suites[0].results))
+        self.assertIsInstance(suites[0].results[0], TestResult)
+        self.assertEqual(10, len(load_durations(path)))
+
+    def test_merges_shards(self) -> None:
+        paths = [self.run_shard(index, 3) for index in range(1, 4)]
+        merged = self.path / "merged"
+
+        suites = merge_results(paths, merged)
+        self.assertEqual(1, len(suites))
+        self.assertEqual(
+            sorted(f"snap_value[{n}]" for n in range(10)),
+            sorted(result.name for result in suites[0].results)
+        )
+
+        new_snaps = sorted(path.parent.name for path in merged.rglob("*.snap.new"))
+        self.assertEqual(sorted(f"snap_value[{n}]" for n in range(10)), new_snaps)
+
+    def test_missing_shard(self) -> None:
+        paths = [self.run_shard(index, 3) for index in (1, 3)]
+        self.assertRaises(ValueError, merge_results, paths, self.path / "merged")
+
+    def test_repeated_shard(self) -> None:
+        path = self.run_shard(1, 2)
+        self.assertRaises(ValueError, merge_results, [path, path], self.path / "merged")
+
+    def tearDown(self) -> None:
+        os.chdir(self.cwd)
+        rmtree(self.path)
+
+
+def snap_value(test: Test, value: int) -> None:
+    test.snap(str(value), "value")
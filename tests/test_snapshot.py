@@ -1,7 +1,12 @@
+import array
 from unittest import TestCase
-from io import StringIO
+from io import BytesIO, StringIO
+from tempfile import mkdtemp
+from shutil import rmtree
+from pathlib import Path
 
-from snappy.snapshot import Snapshot, _load_snapshot
+from snappy.snapshot import Snapshot, _load_snapshot, SPOOL_SIZE
+from snappy.serializers import as_buffer
 
 
 class TestSnapshotCreation(TestCase):
@@ -22,6 +27,14 @@ class TestSnapshotCreation(TestCase):
         right = Snapshot.new("test2", "test", "hello, world!\n")
         self.assertFalse(left == right)
 
+    def test_is_compact(self) -> None:
+        snap = Snapshot.new("test", "test", "hello, world!\n")
+        self.assertFalse(hasattr(snap, "__dict__"))
+
+    def test_date_given_is_kept(self) -> None:
+        snap = Snapshot("test", "test", hash="abc", date="2020-01-01T00:00:00+00:00")
+        self.assertIn("date: 2020-01-01T00:00:00+00:00", snap._header())
+
 
 class SnapshotLoader(TestCase):
 
@@ -75,3 +88,140 @@ class SnapshotStringify(TestCase):
         # Content should not appear if not loading
         self.assertNotIn("content", loaded)
 
+
+
+class SnapshotStreaming(TestCase):
+
+    def setUp(self) -> None:
+        self.path = Path(mkdtemp())
+
+    def test_chunks_hash_like_string(self) -> None:
+        whole = Snapshot.new("test", "snap", "hello, world!\n")
+        streamed = Snapshot.stream("test", "snap", ["hello", b", ", "world!\n"])
+        self.assertTrue(whole == streamed)
+        streamed.close()
+
+    def test_file_hashes_like_string(self) -> None:
+        whole = Snapshot.new("test", "snap", "hello, world!\n")
+        for file in [StringIO("hello, world!\n"), BytesIO(b"hello, world!\n")]:
+            streamed = Snapshot.stream("test", "snap", file)
+            self.assertTrue(whole == streamed)
+            streamed.close()
+
+    def test_saved_stream_loads(self) -> None:
+        chunks = (f"line {i}\n" for i in range(SPOOL_SIZE // 4))
+        streamed = Snapshot.stream("test", "snap", chunks)
+        streamed.save_to(self.path / "snap.snap")
+        streamed.close()
+
+        loaded = Snapshot.load_from(self.path / "snap.snap", load_content=True)
+        self.assertTrue(streamed == loaded)
+        self.assertTrue(loaded._content.startswith("line 0\nline 1\n"))
+
+    def test_bytes_not_text_saved_as_binary(self) -> None:
+        streamed = Snapshot.stream("test", "snap", BytesIO(b"\x89PNG\r\n\x00\xff"))
+        self.assertEqual({"content-type": "application/octet-stream"}, streamed._meta)
+        streamed.save_to(self.path / "snap.snap")
+        streamed.close()
+
+        loaded = Snapshot.load_from(self.path / "snap.snap", load_content=True)
+        self.assertEqual(b"\x89PNG\r\n\x00\xff", loaded._buffer.tobytes())
+        self.assertEqual(streamed, loaded)
+
+        # Characters split across chunks are still text
+        streamed = Snapshot.stream("test", "snap", [b"caf\xc3", b"\xa9", "!"])
+        self.assertFalse(streamed._is_binary())
+        streamed.close()
+
+    def test_stringify_matches_new(self) -> None:
+        whole = Snapshot.new("test", "snap", "hello, world!")
+        streamed = Snapshot.stream("test", "snap", [b"hello, world!"])
+        streamed._date = whole._date
+        self.assertEqual(str(whole), str(streamed))
+        streamed.close()
+
+    def tearDown(self) -> None:
+        rmtree(self.path)
+
+
+class SnapshotArrays(TestCase):
+
+    def setUp(self) -> None:
+        self.path = Path(mkdtemp())
+        self.values = array.array("d", [1.0, 2.5])
+
+    def test_meta_is_hashed(self) -> None:
+        buffer, meta = as_buffer(self.values)
+        same = Snapshot.array("test", "snap", buffer, meta)
+        reshaped = Snapshot.array("test", "snap", buffer, {**meta, "shape": "(1, 2)"})
+        self.assertNotEqual(same, reshaped)
+        self.assertEqual(same, Snapshot.array("test", "snap", *as_buffer(array.array("d", [1.0, 2.5]))))
+
+    def test_saved_array_loads(self) -> None:
+        snap = Snapshot.array("test", "snap", *as_buffer(self.values))
+        snap.save_to(self.path / "snap.snap")
+
+        header = Snapshot.load_from(self.path / "snap.snap")
+        self.assertEqual(snap._hash, header._hash)
+        self.assertEqual({"dtype": "d", "shape": "(2,)"}, header._meta)
+
+        loaded = Snapshot.load_from(self.path / "snap.snap", load_content=True)
+        self.assertEqual(self.values.tobytes(), loaded._buffer.tobytes())
+        loaded.close()
+
+    def tearDown(self) -> None:
+        rmtree(self.path)
+
+
+class SnapshotBinary(TestCase):
+
+    def setUp(self) -> None:
+        self.path = Path(mkdtemp())
+        self.content = b"\x00\xffnot text\n---\n\x89"
+
+    def test_hashes_bytes_alone(self) -> None:
+        snap = Snapshot.binary("test", "snap", self.content, "image/png")
+        streamed = Snapshot.stream("test", "snap", self.content)
+        self.assertEqual(streamed, snap)
+        streamed.close()
+        self.assertEqual({"content-type": "image/png"}, snap._meta)
+
+    def test_flattens_views(self) -> None:
+        values = array.array("i", [1, 2, 3])
+        snap = Snapshot.binary("test", "snap", memoryview(values))
+        self.assertEqual(12, snap._size())
+        self.assertIn("length: 12", snap._header())
+
+    def test_saved_bytes_load(self) -> None:
+        snap = Snapshot.binary("test", "snap", self.content, "image/png")
+        snap.save_to(self.path / "snap.snap")
+
+        loaded = Snapshot.load_from(self.path / "snap.snap", load_content=True)
+        self.assertEqual(self.content, loaded._buffer.tobytes())
+        self.assertEqual({"content-type": "image/png"}, loaded._meta)
+        self.assertEqual(snap._hash, loaded._hash)
+
+        lazy = Snapshot.load_from(self.path / "snap.snap", lazy=True)
+        self.assertEqual(self.content, lazy._view.tobytes())
+        lazy.close()
+
+    def test_wrong_length(self) -> None:
+        Snapshot.binary("test", "snap", self.content).save_to(self.path / "snap.snap")
+        text = (self.path / "snap.snap").read_bytes()
+        length = f"length: {len(self.content)}".encode("utf-8")
+        (self.path / "snap.snap").write_bytes(text.replace(length, b"length: 99"))
+
+        self.assertRaises(ValueError, Snapshot.load_from, self.path / "snap.snap", True)
+        self.assertRaises(ValueError, Snapshot.load_from, self.path / "snap.snap", lazy=True)
+
+    def test_missing_length(self) -> None:
+        Snapshot.binary("test", "snap", self.content).save_to(self.path / "snap.snap")
+        text = (self.path / "snap.snap").read_bytes()
+        length = f"length: {len(self.content)}\n".encode("utf-8")
+        (self.path / "snap.snap").write_bytes(text.replace(length, b""))
+
+        self.assertRaises(ValueError, Snapshot.load_from, self.path / "snap.snap", True)
+        self.assertRaises(ValueError, Snapshot.load_from, self.path / "snap.snap", lazy=True)
+
+    def tearDown(self) -> None:
+        rmtree(self.path)
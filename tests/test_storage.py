@@ -0,0 +1,167 @@
+import array
+from typing import Callable
+from unittest import TestCase
+from tempfile import mkdtemp
+from shutil import rmtree
+from pathlib import Path
+from contextlib import redirect_stdout
+from io import StringIO
+
+from snappy.core import import_snaps, export_snaps
+from snappy.snapshot import SPOOL_SIZE, Snapshot
+from snappy.serializers import as_buffer
+from snappy.storage import DATABASE_NAME, DirectoryStorage, SqliteStorage
+from snappy.suite import TestSuite
+from snappy.test import Test
+
+
+def discard(*args, **kwargs) -> None:
+    _, _ = args, kwargs
+
+
+def snap_greeting(test: Test) -> None:
+    test.snap("hello, world!", "greeting")
+
+
+def contents(snapshots) -> list:
+    return [(s._test, s._snap, s._content, new) for s, new in snapshots]
+
+
+class TestSqliteStorage(TestCase):
+
+    def setUp(self) -> None:
+        self.path = Path(mkdtemp())
+        self.storage = SqliteStorage(self.path / DATABASE_NAME)
+
+    def test_missing_snapshot(self) -> None:
+        self.assertIsNone(self.storage.hash_of("test", "snap"))
+
+    def test_writes_are_batched(self) -> None:
+        snap = Snapshot.new("test", "snap", "hello, world!")
+        self.storage.save(snap, new=False)
+        self.assertIsNone(self.storage.hash_of("test", "snap"))
+
+        self.storage.flush()
+        self.assertEqual(snap._hash, self.storage.hash_of("test", "snap"))
+
+    def test_new_and_accepted_kept_apart(self) -> None:
+        self.storage.save(Snapshot.new("test", "snap", "accepted"), new=False)
+        self.storage.save(Snapshot.new("test", "snap", "pending"), new=True)
+        self.storage.flush()
+        self.assertEqual(
+            [("test", "snap", "accepted", False), ("test", "snap", "pending", True)],
+            contents(self.storage.snapshots())
+        )
+
+    def test_accepts_and_rejects(self) -> None:
+        for snap in ["first", "second"]:
+            self.storage.save(Snapshot.new("test", snap, "accepted"), new=False)
+            self.storage.save(Snapshot.new("test", snap, "pending"), new=True)
+        self.storage.flush()
+        self.assertEqual([("test", "first"), ("test", "second")], self.storage.new_snaps())
+
+        self.assertEqual(1, self.storage.accept([("test", "first")]))
+        self.assertEqual(1, self.storage.reject([("test", "second")]))
+        self.assertEqual([], self.storage.new_snaps())
+        self.assertEqual(
+            [("test", "first", "pending", False), ("test", "second", "accepted", False)],
+            contents(self.storage.snapshots())
+        )
+
+    def test_suite_compares_against_database(self) -> None:
+        suite = TestSuite(self.path, backend="sqlite")
+        suite.test_case(snap_greeting)
+        suite.run_tests(display_func=discard)
+        self.assertEqual(["greeting"], suite._tests[0]._new_snaps)
+
+        self.storage.save(Snapshot.new("snap_greeting", "greeting", "hello, world!"), new=False)
+        self.storage.flush()
+        suite.run_tests(display_func=discard, workers=2)
+        self.assertEqual([], suite._tests[0]._new_snaps)
+
+    def test_workers_hand_back_writes(self) -> None:
+        suite = TestSuite(self.path, backend="sqlite")
+        suite.test_case(snap_greeting)
+        suite.run_tests(display_func=discard, workers=2)
+        self.assertEqual(
+            [("snap_greeting", "greeting", "hello, world!", True)],
+            contents(self.storage.snapshots())
+        )
+
+    def test_keeps_bytes(self) -> None:
+        self.storage.save(Snapshot.binary("test", "image", b"\x89PNG\x00", "image/png"), new=False)
+        self.storage.flush()
+
+        (snapshot, new), = self.storage.snapshots()
+        self.assertEqual(b"\x89PNG\x00", snapshot._buffer.tobytes())
+        self.assertEqual({"content-type": "image/png"}, snapshot._meta)
+
+    def test_writes_large_streams_straight_away(self) -> None:
+        chunks = [f"line {i}\n" for i in range(SPOOL_SIZE // 4)]
+        streamed = Snapshot.stream("test", "long", iter(chunks))
+        self.storage.save(streamed, new=True)
+        self.assertEqual([], self.storage.pop_changes())
+
+        loaded = self.storage.snapshot_of("test", "long", new=True)
+        self.assertEqual("".join(chunks), loaded._content)
+        self.assertEqual(streamed._hash, loaded._hash)
+
+    def test_rejects_compression(self) -> None:
+        self.assertRaises(ValueError, TestSuite, self.path, "zlib", "sqlite")
+
+    def tearDown(self) -> None:
+        rmtree(self.path)
+
+
+class TestConversion(TestCase):
+
+    def setUp(self) -> None:
+        self.path = Path(mkdtemp())
+        self.source = DirectoryStorage(self.path / "source")
+        self.source.save(Snapshot.new("test", "first", "hello,\nworld!\n"), new=False)
+        self.source.save(Snapshot.new("test", "second", "goodbye, moon!"), new=True)
+        self.source.save(Snapshot.new("other", "first", ""), new=False)
+
+    def run_quietly(self, func: Callable, *args) -> None:
+        with redirect_stdout(StringIO()):
+            func(*args)
+
+    def test_round_trip(self) -> None:
+        database = self.path / DATABASE_NAME
+        self.run_quietly(import_snaps, self.path / "source", database)
+        self.run_quietly(export_snaps, database, self.path / "exported")
+
+        exported = DirectoryStorage(self.path / "exported")
+        self.assertEqual(contents(self.source.snapshots()), contents(exported.snapshots()))
+        self.assertTrue((self.path / "exported" / "test" / "second.snap.new").exists())
+
+    def test_round_trip_keeps_review(self) -> None:
+        # New snaps reviewed once exported are gone from the database once imported back
+        database = self.path / DATABASE_NAME
+        self.run_quietly(import_snaps, self.path / "source", database)
+        self.run_quietly(export_snaps, database, self.path / "exported")
+
+        exported = DirectoryStorage(self.path / "exported")
+        self.assertEqual([("test", "second")], exported.new_snaps())
+        self.assertEqual(1, exported.accept(exported.new_snaps()))
+        self.run_quietly(import_snaps, self.path / "exported", database)
+
+        imported = SqliteStorage(database)
+        self.assertEqual([], imported.new_snaps())
+        self.assertEqual("goodbye, moon!", imported.snapshot_of("test", "second")._content)
+
+    def test_round_trips_arrays(self) -> None:
+        values = array.array("i", [1, 2, 3])
+        snap = Snapshot.array("array", "snap", *as_buffer(values))
+        self.source.save(snap, new=False)
+
+        database = self.path / DATABASE_NAME
+        self.run_quietly(import_snaps, self.path / "source", database)
+        self.run_quietly(export_snaps, database, self.path / "exported")
+
+        exported = Snapshot.load_from(self.path / "exported" / "array" / "snap.snap", load_content=True)
+        self.assertEqual(snap._hash, exported._hash)
+        self.assertEqual(values.tobytes(), exported._buffer.tobytes())
+
+    def tearDown(self) -> None:
+        rmtree(self.path)
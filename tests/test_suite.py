@@ -1,11 +1,17 @@
+import signal
+import asyncio
+import time
+import pstats
 from typing import Callable
 from unittest import TestCase
 from tempfile import mkdtemp
 from shutil import rmtree
 from pathlib import Path
 
+from snappy import suite as suite_module
 from snappy.suite import TestSuite
 from snappy.test import Test
+from snappy.index import INDEX_NAME
 
 
 def arg_capturer(context: list) -> Callable:
@@ -17,7 +23,8 @@ def arg_capturer(context: list) -> Callable:
 class TestNewSuite(TestCase):
 
     def setUp(self) -> None:
-        self.suite = TestSuite("./snaps")
+        self.snap_path = Path(mkdtemp())
+        self.suite = TestSuite(self.snap_path)
         self.context = []
 
         @self.suite.test_case
@@ -36,11 +43,21 @@ class TestNewSuite(TestCase):
     def test_adds_cases(self) -> None:
         self.assertEqual(2, len(self.suite._tests))
 
+    def test_registering_touches_no_directories(self) -> None:
+        path = Path(mkdtemp())
+        suite = TestSuite(path / "snaps")
+        suite.test_case(lambda test: None)
+        self.assertFalse((path / "snaps").exists())
+        rmtree(path)
+
     def test_runs_tests(self) -> None:
         # Set the display func to discard the output during tests
         self.suite.run_tests(display_func=arg_capturer([]))
         self.assertEqual(["my_test_case", "second_case"], self.context)
 
+    def tearDown(self) -> None:
+        rmtree(self.snap_path)
+
 
 class TestReporting(TestCase):
 
@@ -93,6 +110,14 @@ class TestReporting(TestCase):
             capture
         )
 
+    def test_saves_index(self) -> None:
+        self.suite.run_tests(display_func=arg_capturer([]))
+        for file in self.snap_path.rglob("*.new"):
+            file.rename(file.with_suffix(""))
+
+        self.suite.run_tests(display_func=arg_capturer([]))
+        self.assertIn("test_something/snap1", (self.snap_path / INDEX_NAME).read_text())
+
     def test_two_different_snaps(self) -> None:
         capture = []
         self.suite.run_tests(display_func=arg_capturer(capture))
@@ -116,6 +141,444 @@ class TestReporting(TestCase):
             capture
         )
 
+    def test_writes_snaps_when_a_test_raises(self) -> None:
+        @self.suite.test_case
+        def test_raising(test: Test) -> None:
+            raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            self.suite.run_tests(display_func=arg_capturer([]))
+        self.assertTrue((self.snap_path / "test_something" / "snap1.snap.new").exists())
+
+    def tearDown(self) -> None:
+        rmtree(self.snap_path)
+
+
+
+def snap_greeting(test: Test) -> None:
+    test.snap("hello, world!", "greeting")
+
+
+def snap_farewell(test: Test) -> None:
+    test.snap("goodbye, moon!", "farewell")
+
+
+class TestParallel(TestCase):
+
+    def setUp(self) -> None:
+        self.snap_path = Path(mkdtemp())
+
+    def make_suite(self) -> TestSuite:
+        # Process pools need tests defined at the top level of a module, so they can be pickled
+        suite = TestSuite(self.snap_path)
+        suite.test_case(snap_greeting)
+        suite.test_case(snap_farewell)
+        return suite
+
+    def test_threads_match_serial(self) -> None:
+        serial, threaded = [], []
+        self.make_suite().run_tests(display_func=arg_capturer(serial))
+        self.make_suite().run_tests(display_func=arg_capturer(threaded), workers=4, executor="thread")
+        self.assertEqual(serial, threaded)
+
+    def test_processes_report_new_snaps(self) -> None:
+        suite = self.make_suite()
+        capture = []
+        suite.run_tests(display_func=arg_capturer(capture), workers=2)
+        self.assertEqual(['greeting'], suite._tests[0]._new_snaps)
+        self.assertEqual(['farewell'], suite._tests[1]._new_snaps)
+        self.assertEqual([('snap_greeting:',), {'end': ' \t'}], capture[0])
+        self.assertEqual([('  2 new snaps to review',), {}], capture[-1])
+        self.assertTrue((self.snap_path / "snap_farewell" / "farewell.snap.new").exists())
+
+    def test_unknown_executor(self) -> None:
+        suite = self.make_suite()
+        self.assertRaises(ValueError, suite.run_tests, arg_capturer([]), 2, "fibre")
+
+    def tearDown(self) -> None:
+        rmtree(self.snap_path)
+
+
+class TestAsync(TestCase):
+
+    def setUp(self) -> None:
+        self.snap_path = Path(mkdtemp())
+        self.suite = TestSuite(self.snap_path)
+
+    def test_runs_concurrently(self) -> None:
+        ready = []
+
+        @self.suite.test_case
+        async def first(test: Test) -> None:
+            ready.append(asyncio.Event())
+            await asyncio.sleep(0)
+            ready[1].set()
+            await ready[0].wait()
+            test.snap("first", "snap")
+
+        @self.suite.test_case
+        async def second(test: Test) -> None:
+            ready.append(asyncio.Event())
+            ready[0].set()
+            await ready[1].wait()
+
+        _, _ = first, second
+
+        # Each test waits on the other, so this only finishes if they run at the same time
+        self.suite.run_tests(display_func=arg_capturer([]))
+        self.assertEqual(["snap"], self.suite._tests[0]._new_snaps)
+        self.assertEqual([], self.suite._tests[1]._new_snaps)
+
+    def test_limits_concurrency(self) -> None:
+        running, most = [0], [0]
+
+        async def counted(test: Test) -> None:
+            running[0] += 1
+            most[0] = max(most[0], running[0])
+            await asyncio.sleep(0.01)
+            running[0] -= 1
+            _ = test
+
+        for name in ["a", "b", "c", "d"]:
+            counted.__name__ = name
+            self.suite.test_case(counted)
+
+        self.suite.run_tests(display_func=arg_capturer([]), concurrency=2)
+        self.assertEqual(2, most[0])
+
+    def test_reports_in_registration_order(self) -> None:
+        @self.suite.test_case
+        def plain(test: Test) -> None:
+            test.snap("plain", "snap")
+
+        @self.suite.test_case
+        async def awaited(test: Test) -> None:
+            await asyncio.sleep(0)
+            test.snap("awaited", "snap")
+
+        _, _ = plain, awaited
+
+        capture = []
+        self.suite.run_tests(display_func=arg_capturer(capture))
+        self.assertEqual(
+            [[('plain:',), {'end': ' \t'}], [('err!',), {}], [('  x snap',), {}],
+             [('awaited:',), {'end': ' \t'}], [('err!',), {}], [('  x snap',), {}]],
+            capture[:6]
+        )
+
+    def test_runs_alone_when_recording(self) -> None:
+        @self.suite.test_case
+        async def awaited(test: Test) -> None:
+            await asyncio.sleep(0)
+            test.snap("awaited", "snap")
+
+        _ = awaited
+
+        self.suite.run_tests(display_func=arg_capturer([]), changed=True)
+        self.assertEqual(["snap"], self.suite._tests[0]._new_snaps)
+
+    def tearDown(self) -> None:
+        rmtree(self.snap_path)
+
+
+class TestTiming(TestCase):
+
+    def setUp(self) -> None:
+        self.snap_path = Path(mkdtemp())
+        self.suite = TestSuite(self.snap_path / "snaps")
+
+        @self.suite.test_case
+        def fast(test: Test) -> None:
+            _ = test
+
+        @self.suite.test_case
+        def slow(test: Test) -> None:
+            time.sleep(0.02)
+            test.snap("hello, world!", "snap")
+
+        _, _ = fast, slow
+
+    def test_returns_results(self) -> None:
+        results = self.suite.run_tests(display_func=arg_capturer([]))
+        self.assertEqual(["fast", "slow"], [result.name for result in results])
+        self.assertEqual([True, False], [result.passed for result in results])
+        self.assertEqual(["snap"], results[1].new_snaps)
+        self.assertGreaterEqual(results[1].wall_time, 0.02)
+        self.assertEqual({"hash", "load", "write"}, set(results[1].phases))
+        self.assertEqual({}, results[0].phases)
+
+    def test_reports_durations(self) -> None:
+        capture = []
+        self.suite.run_tests(display_func=arg_capturer(capture), durations=1)
+        lines = [args[0] for args, _ in capture]
+        start = lines.index("slowest 1 durations:")
+        self.assertRegex(lines[start + 1], r"^  0\.0\d\ds  slow \(cpu .*, hash .*, load .*, write .*\)$")
+        self.assertEqual("-----------------------------------", lines[start + 2])
+
+    def test_dumps_profiles(self) -> None:
+        self.suite.run_tests(display_func=arg_capturer([]), profile=self.snap_path / "profiles")
+        stats = pstats.Stats(str(self.snap_path / "profiles" / "slow.pstats"))
+        self.assertTrue(any(name == "slow" for _, _, name in stats.stats))
+        self.assertTrue((self.snap_path / "profiles" / "fast.pstats").exists())
+
+    def tearDown(self) -> None:
+        rmtree(self.snap_path)
+
+
+def snap_sum(test: Test, left: int, right: int) -> None:
+    test.snap(str(left + right), "sum")
+
+
+class TestParametrize(TestCase):
+
+    def setUp(self) -> None:
+        self.snap_path = Path(mkdtemp())
+        self.suite = TestSuite(self.snap_path)
+
+    def test_case_per_row(self) -> None:
+        self.suite.parametrize([(1, 2), {"left": 3, "right": 4}])(snap_sum)
+        results = self.suite.run_tests(display_func=arg_capturer([]))
+        self.assertEqual(["snap_sum[0]", "snap_sum[1]"], [result.name for result in results])
+        self.assertIn("\n7\n", (self.snap_path / "snap_sum[1]" / "sum.snap.new").read_text())
+
+    def test_ids(self) -> None:
+        self.suite.parametrize([(1, 2), (2, 2)], ids=["small", "../even"])(snap_sum)
+        results = self.suite.run_tests(display_func=arg_capturer([]))
+        self.assertEqual(["snap_sum[small]", "snap_sum[_.._even]"], [result.name for result in results])
+
+        suite = TestSuite(self.snap_path)
+        suite.parametrize(range(3), ids=lambda n: f"n{n}")(lambda test, n: None)
+        self.assertEqual(["<lambda>[n0]", "<lambda>[n1]", "<lambda>[n2]"], [test._name for test in suite._expand()])
+
+    def test_duplicate_ids(self) -> None:
+        self.suite.parametrize([(1, 2), (2, 1)], ids=lambda case: sum(case))(snap_sum)
+        self.assertRaises(ValueError, list, self.suite._expand())
+
+    def test_mismatched_ids(self) -> None:
+        self.suite.parametrize([(1, 2), (2, 2), (3, 2)], ids=["one", "two"])(snap_sum)
+        with self.assertRaisesRegex(ValueError, "`snap_sum` has more cases than ids"):
+            list(self.suite._expand())
+
+        suite = TestSuite(self.snap_path)
+        suite.parametrize([(1, 2)], ids=["one", "two"])(snap_sum)
+        with self.assertRaisesRegex(ValueError, "`snap_sum` has more ids than cases"):
+            list(suite._expand())
+
+    def test_ids_iterator_kept_between_runs(self) -> None:
+        self.suite.parametrize(lambda: [(1, 2), (2, 2)], ids=iter(["small", "even"]))(snap_sum)
+        for _ in range(2):
+            self.assertEqual(
+                ["snap_sum[small]", "snap_sum[even]"], [test._name for test in self.suite._expand()]
+            )
+
+    def test_expands_lazily(self) -> None:
+        generated = []
+
+        def cases():
+            for n in range(100000):
+                generated.append(n)
+                yield n
+
+        @self.suite.parametrize(cases)
+        def case(test: Test, n: int) -> None:
+            _ = test, n
+
+        self.assertEqual(1, len(self.suite._tests))
+        self.assertEqual([], generated)
+
+        tests = self.suite._expand()
+        next(tests)
+        self.assertEqual([0], generated)
+
+    def test_runs_lazily(self) -> None:
+        generated = []
+
+        def cases():
+            for n in range(10000):
+                generated.append(n)
+                yield n
+
+        @self.suite.parametrize(cases)
+        def case(test: Test, n: int) -> None:
+            _ = test
+            self.assertEqual(n + 1, len(generated))
+
+        results = self.suite.run_tests(display_func=arg_capturer([]))
+        self.assertEqual(10000, len(results))
+        self.assertTrue(all(result.passed for result in results))
+
+    def test_cases_fail_separately(self) -> None:
+        self.suite.parametrize([(1, 2), (2, 2)], ids=["small", "even"])(snap_sum)
+        self.suite.run_tests(display_func=arg_capturer([]))
+        (self.snap_path / "snap_sum[small]" / "sum.snap.new").rename(self.snap_path / "snap_sum[small]" / "sum.snap")
+
+        results = self.suite.run_tests(display_func=arg_capturer([]))
+        self.assertEqual([True, False], [result.passed for result in results])
+
+    def test_with_fixtures(self) -> None:
+        @self.suite.fixture
+        def right() -> int:
+            return 10
+
+        self.suite.parametrize([1, 2])(snap_sum)
+        self.suite.parametrize([{"left": 1, "right": 1}], ids=["bound"])(snap_sum)
+        self.suite.run_tests(display_func=arg_capturer([]))
+        self.assertIn("\n12\n", (self.snap_path / "snap_sum[1]" / "sum.snap.new").read_text())
+        self.assertIn("\n2\n", (self.snap_path / "snap_sum[bound]" / "sum.snap.new").read_text())
+
+    def test_processes(self) -> None:
+        self.suite.parametrize([(1, 2), (2, 2)])(snap_sum)
+        results = self.suite.run_tests(display_func=arg_capturer([]), workers=2)
+        self.assertEqual([["sum"], ["sum"]], [result.new_snaps for result in results])
+
+    def tearDown(self) -> None:
+        rmtree(self.snap_path)
+
+
+def sleep_long(test: Test) -> None:
+    time.sleep(30)
+    _ = test
+
+
+def sleep_unstoppably(test: Test) -> None:
+    # With the alarm blocked the worker can't stop the test itself, so has to be killed
+    signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGALRM})
+    time.sleep(30)
+    _ = test
+
+
+class TestScheduling(TestCase):
+
+    def setUp(self) -> None:
+        self.snap_path = Path(mkdtemp())
+        self.ran = []
+        self.failing = {"second"}
+
+    def make_suite(self) -> TestSuite:
+        suite = TestSuite(self.snap_path)
+        for name in ("first", "second", "third"):
+            def case(test: Test, name: str = name) -> None:
+                self.ran.append(name)
+                if name in self.failing:
+                    test.snap(str(time.time()), "snap")
+            case.__name__ = name
+            suite.test_case(case)
+        return suite
+
+    def test_runs_failures_first(self) -> None:
+        self.make_suite().run_tests(display_func=arg_capturer([]))
+        self.assertEqual(["first", "second", "third"], self.ran)
+
+        self.ran = []
+        results = self.make_suite().run_tests(display_func=arg_capturer([]))
+        self.assertEqual(["second", "first", "third"], self.ran)
+        self.assertEqual(["second", "first", "third"], [result.name for result in results])
+
+    def test_starts_longest_first(self) -> None:
+        suite = self.make_suite()
+        for name, seconds in (("first", 0.1), ("second", 0.3), ("third", 0.2)):
+            suite._history._entries[name] = [seconds, False]
+
+        tests = suite._history.schedule(list(suite._expand()), longest_first=True)
+        self.assertEqual(["second", "third", "first"], [test._name for test in tests])
+
+    def test_fail_fast(self) -> None:
+        capture = []
+        results = self.make_suite().run_tests(display_func=arg_capturer(capture), fail_fast=True)
+        self.assertEqual(["first", "second"], self.ran)
+        self.assertEqual(["first", "second"], [result.name for result in results])
+        self.assertIn([("Stopped after a failure, 1 test not run.",), {}], capture)
+
+    def test_fail_fast_in_parallel(self) -> None:
+        suite = TestSuite(self.snap_path)
+        for n in range(20):
+            def case(test: Test, n: int = n) -> None:
+                self.ran.append(n)
+                test.snap("failed", "snap")
+            case.__name__ = f"case_{n}"
+            suite.test_case(case)
+
+        results = suite.run_tests(
+            display_func=arg_capturer([]), workers=2, executor="thread", fail_fast=True
+        )
+        self.assertLess(len(self.ran), 20)
+        self.assertEqual(len(self.ran), len(results))
+
     def tearDown(self) -> None:
         rmtree(self.snap_path)
 
+
+class TestTimeouts(TestCase):
+
+    def setUp(self) -> None:
+        self.snap_path = Path(mkdtemp())
+        self.suite = TestSuite(self.snap_path, timeout=0.2)
+        self.grace = suite_module.TIMEOUT_GRACE
+        suite_module.TIMEOUT_GRACE = 0.2
+
+    def run_suite(self, **kwargs) -> list:
+        start = time.perf_counter()
+        results = self.suite.run_tests(display_func=arg_capturer([]), **kwargs)
+        self.assertLess(time.perf_counter() - start, 10)
+        return results
+
+    def test_serial(self) -> None:
+        self.suite.test_case(sleep_long)
+        self.suite.test_case(snap_greeting)
+
+        results = self.run_suite()
+        self.assertEqual([True, False], [result.timed_out for result in results])
+        self.assertEqual(["greeting"], results[1].new_snaps)
+
+    def test_override(self) -> None:
+        @self.suite.test_case(timeout=0.5)
+        def short(test: Test) -> None:
+            time.sleep(0.3)
+            _ = test
+
+        _ = short
+        self.assertFalse(self.run_suite()[0].timed_out)
+
+    def test_threads(self) -> None:
+        self.suite.test_case(sleep_long)
+        self.suite.test_case(snap_greeting)
+
+        results = self.run_suite(workers=2, executor="thread")
+        self.assertEqual([True, False], [result.timed_out for result in results])
+
+    def test_processes(self) -> None:
+        self.suite.test_case(sleep_long)
+        self.suite.test_case(snap_greeting)
+
+        results = self.run_suite(workers=2)
+        self.assertEqual([True, False], [result.timed_out for result in results])
+
+    def test_kills_stuck_processes(self) -> None:
+        self.suite.test_case(sleep_unstoppably)
+        self.suite.test_case(snap_greeting)
+        self.suite.test_case(snap_farewell)
+
+        results = self.run_suite(workers=2)
+        self.assertEqual([True, False, False], [result.timed_out for result in results])
+        self.assertEqual([[], ["greeting"], ["farewell"]], [result.new_snaps for result in results])
+
+    def test_async(self) -> None:
+        @self.suite.test_case
+        async def awaits_long(test: Test) -> None:
+            await asyncio.sleep(30)
+            _ = test
+
+        _ = awaits_long
+        results = self.run_suite()
+        self.assertTrue(results[0].timed_out)
+
+    def test_reported(self) -> None:
+        self.suite.test_case(sleep_long)
+        capture = []
+        self.suite.run_tests(display_func=arg_capturer(capture))
+        self.assertEqual([('timed out!',), {}], capture[1])
+        self.assertIn([('  1 test timed out',), {}], capture)
+
+    def tearDown(self) -> None:
+        suite_module.TIMEOUT_GRACE = self.grace
+        rmtree(self.snap_path)
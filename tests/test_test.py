@@ -1,11 +1,15 @@
+import array
 from typing import Callable
 from unittest import TestCase
 from tempfile import mkdtemp
 from shutil import rmtree
 from pathlib import Path
 
+from snappy.serializers import canonical
 from snappy.snapshot import Snapshot
+from snappy.storage import open_storage
 from snappy.test import Test
+from snappy.verify import check_snap
 
 
 def tester(test: Test) -> None:
@@ -17,9 +21,67 @@ class TestFileHandling(TestCase):
     def setUp(self) -> None:
         self.path = Path(mkdtemp())
 
-    def test_makes_new_directory(self) -> None:
-        Test("test", tester, self.path / "tests" / "snaps")
-        self.assertTrue((self.path / "tests" / "snaps").exists())
+    def test_makes_new_directory_lazily(self) -> None:
+        test = Test("test", tester, self.path / "tests" / "snaps")
+        self.assertFalse((self.path / "tests").exists())
+        test.snap("hello, world!", "snap")
+        self.assertTrue((self.path / "tests" / "snaps" / "test").exists())
+
+    def test_is_compact(self) -> None:
+        test = Test("test", tester, self.path)
+        self.assertFalse(hasattr(test, "__dict__"))
+
+    def test_snaps_values_canonically(self) -> None:
+        test = Test("test", tester, self.path)
+        test.snap({"b": [1, 2], "a": None}, "snap")
+        test._storage.flush()
+        (self.path / "test" / "snap.snap.new").rename(self.path / "test" / "snap.snap")
+
+        test._new_snaps = []
+        test.snap({"a": None, "b": [1, 2]}, "snap")
+        self.assertEqual([], test._new_snaps)
+
+    def test_snaps_arrays(self) -> None:
+        test = Test("test", tester, self.path)
+        test.snap(array.array("d", [1.0, 2.0]), "snap")
+        text = (self.path / "test" / "snap.snap.new").read_bytes()
+        self.assertIn(b"dtype: d\nshape: (2,)\n", text)
+        self.assertIn(array.array("d", [1.0, 2.0]).tobytes(), text)
+
+    def test_snaps_bytes(self) -> None:
+        test = Test("test", tester, self.path)
+        png = b"\x89PNG\r\n\x1a\n---\n\x00\xff"
+        test.snap(png, "image", content_type="image/png")
+
+        content = (self.path / "test" / "image.snap.new").read_bytes()
+        self.assertIn(b"content-type: image/png\nlength: 14\n---\n" + png + b"\n---", content)
+
+    def test_saves_arrays_as_snapped(self) -> None:
+        # Snapshots are saved in the background, by which time the test may change the array
+        test = Test("test", tester, open_storage(self.path))
+        values = array.array("d", [1.0] * 1024)
+        test.snap(values, "snap")
+        values[0] = 2.0
+        test._storage.flush()
+        self.assertIsNone(check_snap(self.path / "test" / "snap.snap.new"))
+
+    def test_saves_bytes_as_snapped(self) -> None:
+        test = Test("test", tester, open_storage(self.path))
+        content = bytearray(b"A" * 1024)
+        test.snap(content, "one")
+        test.snap(memoryview(content), "two")
+        content[:] = b"B" * 1024
+        test._storage.flush()
+        self.assertIsNone(check_snap(self.path / "test" / "one.snap.new"))
+        self.assertIsNone(check_snap(self.path / "test" / "two.snap.new"))
+
+    def test_content_type_needs_bytes(self) -> None:
+        test = Test("test", tester, self.path)
+        self.assertRaises(TypeError, test.snap, "hello", "snap", "text/plain")
+
+    def test_unknown_type(self) -> None:
+        test = Test("test", tester, self.path)
+        self.assertRaises(TypeError, test.snap, object(), "snap")
 
     def test_makes_new_snaps_first_time(self) -> None:
         test = Test("test_makes_snaps", tester, self.path)
@@ -30,6 +92,7 @@ class TestFileHandling(TestCase):
     def test_makes_new_snap_existing_but_different(self) -> None:
         test = Test("test_snap", tester, self.path)
         snap = Snapshot.new("test_snap", "snap", "this is content")
+        (self.path / "test_snap").mkdir()
         snap.save_to(self.path / "test_snap" / f"snap.snap")
         test.snap("this is not content", "snap")
         self.assertEqual(1, len(test._new_snaps))
@@ -37,10 +100,36 @@ class TestFileHandling(TestCase):
     def test_no_change_existing_but_same(self) -> None:
         test = Test("test_snap", tester, self.path)
         snap = Snapshot.new("test_snap", "snap", "this is content")
+        (self.path / "test_snap").mkdir()
         snap.save_to(self.path / "test_snap" / f"snap.snap")
         test.snap("this is content", "snap")
         self.assertEqual(0, len(test._new_snaps))
 
+    def test_no_change_streamed_but_same(self) -> None:
+        test = Test("test_snap", tester, self.path)
+        snap = Snapshot.new("test_snap", "snap", "this is content")
+        (self.path / "test_snap").mkdir()
+        snap.save_to(self.path / "test_snap" / f"snap.snap")
+        test.snap((word for word in ["this ", "is ", "content"]), "snap")
+        self.assertEqual(0, len(test._new_snaps))
+
+    def test_streams_lists_of_chunks(self) -> None:
+        test = Test("test_snap", tester, self.path)
+        test.snap(["this ", b"is ", "content"], "chunks")
+        test.snap(["this", 1], "values")
+        test._storage.flush()
+
+        chunks = Snapshot.load_from(self.path / "test_snap" / "chunks.snap.new", load_content=True)
+        self.assertEqual("this is content", chunks._content)
+        values = Snapshot.load_from(self.path / "test_snap" / "values.snap.new", load_content=True)
+        self.assertEqual(canonical(["this", 1]), values._content)
+
+    def test_makes_new_snap_streamed(self) -> None:
+        test = Test("test_snap", tester, self.path)
+        test.snap(iter([b"streamed ", "content"]), "snap")
+        loaded = Snapshot.load_from(self.path / "test_snap" / "snap.snap.new", load_content=True)
+        self.assertEqual("streamed content", loaded._content)
+
     def tearDown(self) -> None:
         rmtree(self.path)
 
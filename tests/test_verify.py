@@ -0,0 +1,99 @@
+import re
+import array
+from unittest import TestCase
+from tempfile import mkdtemp
+from shutil import rmtree
+from pathlib import Path
+
+from snappy.objects import OBJECTS_DIR
+from snappy.suite import TestSuite
+from snappy.test import Test
+from snappy.verify import VERIFY_CHUNK, check_snap, find_snaps, verify
+
+
+def discard(*args, **kwargs) -> None:
+    _, _ = args, kwargs
+
+
+def snap_everything(test: Test) -> None:
+    test.snap("hello, world!\n", "greeting")
+    test.snap("", "empty")
+    test.snap(array.array("d", [1.0, 2.0]), "numbers")
+    test.snap(iter([b"streamed ", b"bytes"]), "stream")
+    test.snap(b"\x00\xff\n---\n", "bytes", content_type="application/x-protobuf")
+
+
+def snap_value(test: Test, value: int) -> None:
+    test.snap(str(value), "value")
+
+
+class TestVerify(TestCase):
+
+    def setUp(self) -> None:
+        self.path = Path(mkdtemp())
+
+    def make_snaps(self, **kwargs) -> Path:
+        suite = TestSuite(self.path / "snaps", **kwargs)
+        suite.test_case(snap_everything)
+        suite.run_tests(display_func=discard)
+        return self.path / "snaps" / "snap_everything"
+
+    def test_intact_snaps(self) -> None:
+        for kwargs in ({}, {"compression": "zlib"}, {"hash_algorithm": "blake2b"}):
+            with self.subTest(**kwargs):
+                directory = self.make_snaps(**kwargs)
+                self.assertEqual(5, len(list(find_snaps(directory))))
+                self.assertEqual([None] * 5, [problem for _, problem in verify(self.path)])
+                rmtree(self.path / "snaps")
+
+    def test_edited_content(self) -> None:
+        path = self.make_snaps() / "greeting.snap.new"
+        path.write_text(path.read_text().replace("hello", "howdy"))
+        self.assertRegex(check_snap(path), "^corrupt")
+
+    def test_edited_array(self) -> None:
+        path = self.make_snaps() / "numbers.snap.new"
+        path.write_bytes(path.read_bytes().replace(b"shape: (2,)", b"shape: (1, 2)"))
+        self.assertRegex(check_snap(path), "^corrupt")
+
+    def test_edited_bytes(self) -> None:
+        path = self.make_snaps() / "bytes.snap.new"
+        path.write_bytes(path.read_bytes().replace(b"\xff", b"\xfe"))
+        self.assertRegex(check_snap(path), "^corrupt")
+
+        path.write_bytes(path.read_bytes().replace(b"\xfe", b"\xfe\xfe"))
+        self.assertRegex(check_snap(path), "^malformed")
+
+        path.write_bytes(re.sub(rb"length: \d+\n", b"", path.read_bytes()))
+        self.assertRegex(check_snap(path), "^malformed: binary content doesn't give its length")
+
+    def test_truncated(self) -> None:
+        path = self.make_snaps() / "greeting.snap.new"
+        path.write_bytes(path.read_bytes()[:-2])
+        self.assertRegex(check_snap(path), "^malformed")
+
+    def test_conflict_markers(self) -> None:
+        path = self.make_snaps() / "greeting.snap.new"
+        path.write_text("<<<<<<< HEAD\n" + path.read_text())
+        self.assertRegex(check_snap(path), "^malformed")
+
+    def test_missing_object(self) -> None:
+        directory = self.make_snaps(compression="zlib")
+        for blob in (self.path / "snaps" / OBJECTS_DIR).rglob("*.zlib"):
+            blob.unlink()
+        self.assertRegex(check_snap(directory / "greeting.snap.new"), "^missing")
+
+    def test_in_parallel(self) -> None:
+        suite = TestSuite(self.path / "snaps")
+        suite.parametrize(range(VERIFY_CHUNK * 2))(snap_value)
+        suite.run_tests(display_func=discard)
+
+        path = self.path / "snaps" / "snap_value[3]" / "value.snap.new"
+        path.write_text(path.read_text().replace("3", "4"))
+
+        checked = list(verify(self.path, workers=2))
+        self.assertEqual(list(find_snaps(self.path)), [path for path, _ in checked])
+        self.assertEqual([path], [path for path, problem in checked if problem is not None])
+
+    def tearDown(self) -> None:
+        rmtree(self.path)
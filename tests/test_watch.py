@@ -0,0 +1,160 @@
+import sys
+from unittest import TestCase
+from tempfile import mkdtemp
+from shutil import rmtree
+from pathlib import Path
+from uuid import uuid4
+
+from snappy.watch import InotifyWatcher, PollingWatcher, Watcher, WatchSession
+
+
+def discard(*args, **kwargs) -> None:
+    _, _ = args, kwargs
+
+
+SUITE_MODULE = """
+from pathlib import Path
+from snappy.suite import TestSuite
+from {helper} import greeting
+
+suite = TestSuite(Path(__file__).parent / "{name}_snaps")
+
+@suite.test_case
+def greets(test):
+    test.snap(greeting(), "greeting")
+"""
+
+HELPER_MODULE = """
+def greeting():
+    return "{greeting}"
+"""
+
+
+class WatcherTests:
+
+    def make_watcher(self) -> Watcher:
+        raise NotImplementedError
+
+    def setUp(self) -> None:
+        self.path = Path(mkdtemp())
+        (self.path / "nested").mkdir()
+        self.watcher = self.make_watcher()
+        self.watcher.add(self.path)
+
+    def test_sees_new_files(self) -> None:
+        (self.path / "nested" / "module.py").write_text("x = 1")
+        self.assertEqual({self.path / "nested" / "module.py"}, self.watcher.wait(5))
+
+    def test_sees_changes(self) -> None:
+        (self.path / "module.py").write_text("x = 1")
+        self.watcher.wait(5)
+        (self.path / "module.py").write_text("x = 22")
+        self.assertEqual({self.path / "module.py"}, self.watcher.wait(5))
+
+    def test_sees_accepted_snaps(self) -> None:
+        (self.path / "greeting.snap.new").write_text("hello")
+        (self.path / "greeting.snap.new").rename(self.path / "greeting.snap")
+        self.assertEqual({self.path / "greeting.snap"}, self.watcher.wait(5))
+
+    def test_ignores_other_files(self) -> None:
+        (self.path / "greeting.snap.new").write_text("hello")
+        (self.path / "notes.txt").write_text("hello")
+        self.assertEqual(set(), self.watcher.wait(0.5))
+
+    def tearDown(self) -> None:
+        self.watcher.close()
+        rmtree(self.path)
+
+
+class TestInotifyWatcher(WatcherTests, TestCase):
+
+    def make_watcher(self) -> Watcher:
+        try:
+            return InotifyWatcher()
+        except OSError:
+            self.skipTest("inotify isn't available")
+
+    def test_sees_new_directories(self) -> None:
+        (self.path / "new").mkdir()
+        (self.path / "new" / "module.py").write_text("x = 1")
+        self.watcher.wait(5)
+
+        (self.path / "new" / "module.py").write_text("x = 22")
+        self.assertEqual({self.path / "new" / "module.py"}, self.watcher.wait(5))
+
+
+class TestPollingWatcher(WatcherTests, TestCase):
+
+    def make_watcher(self) -> Watcher:
+        return PollingWatcher(interval=0.01)
+
+
+class TestWatchSession(TestCase):
+
+    def setUp(self) -> None:
+        self.path = Path(mkdtemp()) / "tests"
+        self.path.mkdir()
+
+        # Module names are unique to each test, as they stay imported between them
+        self.helper = f"helper_{uuid4().hex}"
+        self.write_helper("hello, world!")
+        for name in ("first", "second"):
+            module = SUITE_MODULE.format(helper=self.helper, name=name)
+            (self.path / f"test_{name}.py").write_text(module)
+
+        self.session = WatchSession(self.path)
+        self.first, self.second = self.session.start()
+
+    def write_helper(self, greeting: str) -> Path:
+        path = self.path / f"{self.helper}.py"
+        path.write_text(HELPER_MODULE.format(greeting=greeting))
+        return path
+
+    def test_changed_test_module(self) -> None:
+        path = self.path / "test_first.py"
+        path.write_text(path.read_text() + "\n")
+
+        suites = self.session.affected({path}, discard)
+        self.assertEqual(1, len(suites))
+        self.assertIsNot(self.first, suites[0])
+        self.assertEqual(self.first._snaps_dir, suites[0]._snaps_dir)
+
+    def test_changed_source_reloads_users(self) -> None:
+        path = self.write_helper("goodbye, world!")
+
+        suites = self.session.affected({path}, discard)
+        self.assertEqual(2, len(suites))
+
+        suites[0].run_tests(display_func=discard)
+        snap = suites[0]._snaps_dir / "greets" / "greeting.snap.new"
+        self.assertIn("goodbye, world!", snap.read_text())
+
+    def test_accepted_snaps(self) -> None:
+        snap = self.second._snaps_dir / "greets" / "greeting.snap"
+        snap.parent.mkdir(parents=True)
+        snap.write_text("")
+
+        self.assertEqual([self.second], self.session.affected({snap}, discard))
+
+    def test_new_test_module(self) -> None:
+        path = self.path / "test_third.py"
+        path.write_text(SUITE_MODULE.format(helper=self.helper, name="third"))
+        self.assertEqual(1, len(self.session.affected({path}, discard)))
+
+    def test_broken_module_is_reported(self) -> None:
+        path = self.path / "test_first.py"
+        path.write_text("raise RuntimeError('broken')")
+
+        errors = []
+        self.assertEqual([], self.session.affected({path}, errors.append))
+        self.assertIn("broken", errors[0])
+
+    def test_watches_sources(self) -> None:
+        directories = self.session.directories()
+        self.assertIn((self.path.resolve(), True), directories)
+
+    def tearDown(self) -> None:
+        for name, module in list(sys.modules.items()):
+            if str(getattr(module, "__file__", None)).startswith(str(self.path.parent)):
+                del sys.modules[name]
+        rmtree(self.path.parent)
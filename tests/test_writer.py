@@ -0,0 +1,82 @@
+from unittest import TestCase
+from tempfile import mkdtemp
+from shutil import rmtree
+from pathlib import Path
+
+from snappy.snapshot import Snapshot
+from snappy.storage import DirectoryStorage
+from snappy.test import Test
+from snappy.writer import SnapshotWriter, write_atomically
+
+
+def tester(test: Test) -> None:
+    _ = test
+
+
+class TestAtomicWrites(TestCase):
+
+    def setUp(self) -> None:
+        self.path = Path(mkdtemp())
+
+    def test_replaces_file(self) -> None:
+        (self.path / "snap.snap").write_text("old")
+        snap = Snapshot.new("test", "snap", "hello, world!")
+        write_atomically(snap, self.path / "snap.snap", fsync=True)
+        self.assertTrue(snap == Snapshot.load_from(self.path / "snap.snap"))
+        self.assertEqual(["snap.snap"], [path.name for path in self.path.iterdir()])
+
+    def tearDown(self) -> None:
+        rmtree(self.path)
+
+
+class TestBackgroundWriter(TestCase):
+
+    def setUp(self) -> None:
+        self.path = Path(mkdtemp())
+
+    def test_writes_on_flush(self) -> None:
+        writer = SnapshotWriter(batch_size=3)
+        snaps = [Snapshot.new("test", f"snap{i}", f"content {i}") for i in range(10)]
+        for snap in snaps:
+            writer.submit(snap, self.path / "test" / f"{snap._snap}.snap")
+        writer.flush()
+
+        for snap in snaps:
+            self.assertTrue(snap == Snapshot.load_from(self.path / "test" / f"{snap._snap}.snap"))
+        self.assertEqual([], list(self.path.rglob("*.tmp")))
+
+    def test_bounds_queued_content(self) -> None:
+        writer = SnapshotWriter(max_bytes=16, fsync=False)
+        for i in range(20):
+            writer.submit(Snapshot.new("test", f"snap{i}", "x" * 10), self.path / f"snap{i}.snap")
+            self.assertLessEqual(writer._queued_bytes, 20)
+        writer.flush()
+        self.assertEqual(20, len(list(self.path.glob("*.snap"))))
+
+    def test_closes_streamed_snapshots(self) -> None:
+        snap = Snapshot.stream("test", "snap", [b"streamed"])
+        writer = SnapshotWriter()
+        writer.submit(snap, self.path / "snap.snap")
+        writer.flush()
+        self.assertIsNone(snap._spool)
+
+    def test_raises_on_flush(self) -> None:
+        (self.path / "blocked").write_text("not a directory")
+        writer = SnapshotWriter()
+        writer.submit(Snapshot.new("test", "snap", "content"), self.path / "blocked" / "snap.snap")
+        self.assertRaises(OSError, writer.flush)
+
+        # The error is only raised once, and the writer carries on working afterwards
+        writer.submit(Snapshot.new("test", "snap", "content"), self.path / "snap.snap")
+        writer.flush()
+        self.assertTrue((self.path / "snap.snap").exists())
+
+    def test_storage_defers_writes(self) -> None:
+        storage = DirectoryStorage(self.path, writer=SnapshotWriter())
+        test = Test("deferred", tester, storage)
+        test.snap("hello, world!", "snap")
+        storage.flush()
+        self.assertTrue((self.path / "deferred" / "snap.snap.new").exists())
+
+    def tearDown(self) -> None:
+        rmtree(self.path)